@@ -0,0 +1,231 @@
+"""Product affinity from co-purchases: co-occurrence, lift and cosine similarity.
+
+Orders are folded chunk by chunk into a sparse binary customer x product
+incidence matrix A (a customer bought a product or not), and the
+co-occurrence C = A'A is accumulated over blocks of customers, so neither
+matrix is ever dense. With support[i] = C[i, i], the customers who bought
+product i, and N the customers with any purchase:
+
+    confidence[i, j]  C[i, j] / support[i]                  P(bought j | bought i)
+    lift[i, j]        C[i, j] * N / (support[i] * support[j])
+    cosine[i, j]      C[i, j] / sqrt(support[i] * support[j])
+
+are diagonal scalings of C, i.e. sparse matrix products. `top_neighbours`
+keeps the best N products per product in two (products x N) arrays, the
+index behind "customers also bought". `category_affinity` applies the
+same measures to the customer x category incidence A @ P, P mapping
+products to the categories of datagen.CATEGORIES.
+
+Product and customer ids are dense, so they are the row and column
+numbers of the matrices.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from datagen import CATEGORIES
+from tracing import traced
+
+CUSTOMER_BLOCK = 1_000_000
+TOP_N = 10
+# Product pairs bought together by fewer customers are dropped from every measure
+MIN_CO_CUSTOMERS = 2
+MEASURES = ("co_occurrence", "confidence", "lift", "cosine")
+
+
+class SparseSum:
+    """Running sum of sparse matrices of growing shape.
+
+    Added matrices wait in a list and are summed into the total once they
+    hold as many entries as it does, so every entry is re-added about
+    log(chunks) times instead of once per chunk.
+    """
+
+    def __init__(self, binary=False):
+        self.binary = binary
+        self._total = None
+        self._pending = []
+        self._pending_nnz = 0
+
+    def add(self, matrix):
+        self._pending.append(matrix.tocsr())
+        self._pending_nnz += matrix.nnz
+        if self._total is None or self._pending_nnz >= self._total.nnz:
+            self._collapse()
+        return self
+
+    def _collapse(self):
+        parts = self._pending if self._total is None else [self._total] + self._pending
+        if not parts:
+            return
+        shape = tuple(max(part.shape[axis] for part in parts) for axis in (0, 1))
+        total = sparse.csr_matrix(shape, dtype=parts[0].dtype)
+        for part in parts:
+            if part.shape != shape:
+                part = part.copy()
+                part.resize(shape)
+            total = total + part
+        if self.binary:
+            total.data[:] = 1
+        self._total, self._pending, self._pending_nnz = total, [], 0
+
+    def total(self, shape=None):
+        self._collapse()
+        total = self._total if self._total is not None else sparse.csr_matrix((0, 0), dtype=np.int32)
+        if shape is not None and total.shape != shape:
+            total = total.copy()
+            total.resize(shape)
+        return total
+
+
+# ------------------------
+# Building
+# ------------------------
+@traced()
+def incidence(order_chunks, n_customers=0, n_products=0):
+    """Binary customer x product CSR matrix (int32) of who bought what."""
+    bought = SparseSum(binary=True)
+    for chunk in order_chunks:
+        chunk = chunk.dropna(subset=["customer_id", "product_id"])
+        if len(chunk) == 0:
+            continue
+        rows = chunk["customer_id"].to_numpy(dtype=np.int64)
+        cols = chunk["product_id"].to_numpy(dtype=np.int64)
+        matrix = sparse.coo_matrix((np.ones(len(rows), dtype=np.int32), (rows, cols)),
+                                   shape=(int(rows.max()) + 1, int(cols.max()) + 1)).tocsr()
+        matrix.data[:] = 1
+        bought.add(matrix)
+    total = bought.total()
+    return bought.total((max(total.shape[0], n_customers), max(total.shape[1], n_products)))
+
+
+@traced()
+def co_occurrence(bought, block_rows=CUSTOMER_BLOCK):
+    """Product x product CSR matrix of customers who bought both (support on the diagonal)."""
+    pairs = SparseSum()
+    for lo in range(0, bought.shape[0], block_rows):
+        block = bought[lo:lo + block_rows]
+        pairs.add(block.T.tocsr() @ block)
+    return pairs.total((bought.shape[1], bought.shape[1]))
+
+
+def _inverse(values):
+    values = np.asarray(values, dtype=np.float64)
+    return np.divide(1.0, values, out=np.zeros_like(values), where=values > 0)
+
+
+@traced()
+def affinity(pairs, customers, min_count=MIN_CO_CUSTOMERS):
+    """Co-occurrence, confidence, lift and cosine as CSR matrices (diagonal removed).
+
+    `customers` is N, the number of customers with any purchase; pairs
+    bought together by fewer than `min_count` customers are dropped.
+    """
+    support = pairs.diagonal().astype(np.float64)
+    counts = pairs.tocsr(copy=True).astype(np.float64)
+    counts.setdiag(0)
+    if min_count > 1:
+        counts.data[counts.data < min_count] = 0
+    counts.eliminate_zeros()
+
+    inverse = sparse.diags(_inverse(support))
+    inverse_sqrt = sparse.diags(np.sqrt(_inverse(support)))
+    return {
+        "co_occurrence": counts,
+        "confidence": (inverse @ counts).tocsr(),
+        "lift": (customers * (inverse @ counts @ inverse)).tocsr(),
+        "cosine": (inverse_sqrt @ counts @ inverse_sqrt).tocsr(),
+    }
+
+
+# ------------------------
+# Neighbours
+# ------------------------
+def top_neighbours(scores, n=TOP_N, block_rows=10_000):
+    """Best `n` columns per row of a sparse score matrix, best first.
+
+    Returns (neighbours, values): int32 and float32 arrays of shape
+    (rows, n), padded with -1 and NaN; ties go to the lower column.
+    """
+    scores = scores.tocsr()
+    rows = scores.shape[0]
+    neighbours = np.full((rows, n), -1, dtype=np.int32)
+    values = np.full((rows, n), np.nan, dtype=np.float32)
+    indptr = scores.indptr
+    for lo in range(0, rows, block_rows):
+        hi = min(lo + block_rows, rows)
+        start, stop = indptr[lo], indptr[hi]
+        if start == stop:
+            continue
+        data = scores.data[start:stop]
+        cols = scores.indices[start:stop]
+        row = np.repeat(np.arange(lo, hi), np.diff(indptr[lo:hi + 1]))
+        order = np.lexsort((cols, -data, row))
+        row = row[order]
+        rank = np.arange(len(order)) - (indptr[row] - start)
+        keep = rank < n
+        neighbours[row[keep], rank[keep]] = cols[order][keep]
+        values[row[keep], rank[keep]] = data[order][keep]
+    return neighbours, values
+
+
+def neighbours_of(neighbours, values, product_id):
+    """One product's neighbours as a Series (product_id -> score)."""
+    known = neighbours[product_id] >= 0
+    return pd.Series(values[product_id][known], index=pd.Index(neighbours[product_id][known], name="product_id"))
+
+
+def save_neighbours(path, neighbours, values, metric):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = path + ".tmp.npz"
+    np.savez(tmp, neighbours=neighbours, values=values, metric=np.array(metric))
+    os.replace(tmp, path)
+
+
+def load_neighbours(path):
+    """(neighbours, values, metric) saved by save_neighbours."""
+    with np.load(path) as data:
+        return data["neighbours"], data["values"], str(data["metric"])
+
+
+def top_pairs(measures, metric, n=TOP_N):
+    """The `n` best product pairs (i < j) by `metric`, with all the measures of each pair."""
+    upper = sparse.triu(measures[metric], k=1).tocoo()
+    best = np.lexsort((upper.col, upper.row, -upper.data))[:n]
+    first, second = upper.row[best], upper.col[best]
+    table = pd.DataFrame({"product_id": first, "other_product_id": second})
+    for name in MEASURES:
+        table[name] = np.asarray(measures[name][first, second]).ravel()
+    return table
+
+
+# ------------------------
+# Category rollups
+# ------------------------
+def category_matrix(products, categories=tuple(CATEGORIES)):
+    """Sparse product x category one-hot matrix; products of other categories map nowhere."""
+    codes = pd.Categorical(products["category"], categories=list(categories)).codes
+    ids = products["product_id"].to_numpy(dtype=np.int64)
+    known = codes >= 0
+    shape = (int(ids.max()) + 1 if len(ids) else 0, len(categories))
+    return sparse.csr_matrix((np.ones(int(known.sum()), dtype=np.int32), (ids[known], codes[known])), shape=shape)
+
+
+@traced()
+def category_affinity(bought, products, categories=tuple(CATEGORIES), block_rows=CUSTOMER_BLOCK):
+    """Category x category DataFrames of each measure, plus the customers per category."""
+    to_category = category_matrix(products, categories)
+    if to_category.shape[0] < bought.shape[1]:
+        to_category.resize((bought.shape[1], len(categories)))
+    # At most one entry per customer and category, so this product stays small
+    category_bought = (bought @ to_category[:bought.shape[1]]).tocsr()
+    category_bought.data[:] = 1
+    customers = int(np.count_nonzero(np.diff(bought.indptr)))
+    pairs = co_occurrence(category_bought, block_rows)
+    measures = affinity(pairs, customers, min_count=1)
+    names = pd.Index(list(categories), name="category")
+    tables = {name: pd.DataFrame(matrix.toarray(), index=names, columns=names) for name, matrix in measures.items()}
+    tables["customers"] = pd.Series(pairs.diagonal(), index=names, name="customers")
+    return tables
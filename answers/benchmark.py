@@ -0,0 +1,343 @@
+"""Benchmark the pipeline stages across data sizes.
+
+    python answers/benchmark.py --orders 1e4 1e5 1e6
+    python answers/benchmark.py --orders 1e6 --save-baseline
+    python answers/benchmark.py --orders 1e6 --baseline data/benchmarks/baseline.json
+
+For every size the project's own generator writes a fresh dataset to a
+scratch directory, then each stage (generation, Parquet/CSV I/O, cleaning,
+the memory-mapped column cache, the star-schema merge, the business
+roll-ups, the streaming heavy-hitter sketches, RFM scoring, the
+hash-partitioned parallel aggregations and plotting)
+is timed on it; file reads bypass the column cache so they measure
+decoding. Results hold seconds, rows/s and
+peak RSS per stage and are saved as JSON; with a baseline, stages slower
+than `--tolerance` are reported as regressions and the exit status is 1. Sizes of 10^8 orders
+need tens of GB of RAM for the in-memory stages.
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import resource
+import shutil
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+import cleaning
+import column_cache
+import cube as revenue_cube
+import loader
+import parallel
+import storage
+from datagen import ACTIVE_SHARE, CATEGORIES, ORDERS_PER_CUSTOMER, generate_sharded
+from plotting import RENDER_CACHE, ChartSpec, histogram, render_charts
+from rfm_engine import RFMState, score_rfm
+from topk import HeavyHitters
+
+BENCH_DIR = os.path.join(storage.DATA_DIR, "benchmarks")
+BASELINE_PATH = os.path.join(BENCH_DIR, "baseline.json")
+DEFAULT_ORDERS = [10 ** 4, 10 ** 5, 10 ** 6]
+DEFAULT_TOLERANCE = 0.2
+SEED = 42
+STREAM_CHUNK = 1_000_000
+# None: one worker per CPU
+PARALLEL_WORKERS = None
+
+
+# ------------------------
+# Memory
+# ------------------------
+def _proc_status_mb(field):
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def reset_peak_rss():
+    """Reset the kernel's RSS high-water mark (Linux); no-op where unsupported."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def peak_rss_mb():
+    peak = _proc_status_mb("VmHWM")
+    if peak is None:
+        # Not resettable: the peak of the whole process so far
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return peak
+
+
+# ------------------------
+# Data sizes
+# ------------------------
+def plan_size(n_orders):
+    """Customers and products for `n_orders`, in the proportions of ticket-0."""
+    n_customers = math.ceil(n_orders / (ACTIVE_SHARE * ORDERS_PER_CUSTOMER) * 1.25)
+    n_products = int(min(max(300, n_orders // 1000), 100_000))
+    return {"n_orders": int(n_orders), "n_customers": n_customers, "n_products": n_products}
+
+
+def make_products(n_products, seed=SEED):
+    """Products like ticket-0's, drawn in bulk."""
+    rng = np.random.default_rng(seed)
+    names = list(CATEGORIES)
+    category = rng.integers(0, len(names), n_products)
+    item = rng.integers(0, 5, n_products)
+    suffix = rng.integers(1, 1000, n_products)
+    return pd.DataFrame({
+        "product_id": np.arange(1, n_products + 1),
+        "category": np.array(names, dtype=object)[category],
+        "product_name": [f"{CATEGORIES[names[c]][i]} {s}" for c, i, s in zip(category, item, suffix)],
+        "price": np.round(rng.uniform(5, 2000, n_products), 2),
+    })
+
+
+# ------------------------
+# Stages
+# ------------------------
+# Each stage takes the shared context dict, may add to it and returns the
+# number of rows it processed. They run in this order on the scratch data.
+def stage_generate(ctx):
+    storage.write_table(make_products(ctx["n_products"]), "products", "raw")
+    manifest = generate_sharded(ctx["n_customers"], storage.read_table("products", "raw"), ctx["n_orders"],
+                                os.path.join(storage.DATA_DIR, "raw"), SEED, cache_dir=ctx["pool_cache"])
+    return manifest["orders"]
+
+
+def stage_parquet_read(ctx):
+    ctx["orders"] = storage.read_table("orders", "raw")
+    return len(ctx["orders"])
+
+
+def stage_parquet_write(ctx):
+    storage.write_table(ctx["orders"], "orders", "raw",
+                        path=os.path.join(storage.DATA_DIR, "raw", "orders_copy.parquet"))
+    return len(ctx["orders"])
+
+
+def stage_mmap_write(ctx):
+    ctx["mmap_dir"] = os.path.join(storage.COLUMN_CACHE_DIR, "bench_orders")
+    column_cache.save(ctx["orders"], ctx["mmap_dir"], "orders")
+    return len(ctx["orders"])
+
+
+def stage_mmap_read(ctx):
+    # What a script pays at startup when the column cache is warm
+    return len(column_cache.load(ctx["mmap_dir"], "orders"))
+
+
+def stage_csv_write(ctx):
+    storage.export_csv("orders", "raw")
+    return len(ctx["orders"])
+
+
+def stage_csv_read(ctx):
+    return len(pd.read_csv(storage.table_path("orders", "raw", fmt="csv"), parse_dates=["order_date"]))
+
+
+def stage_csv_parallel(ctx):
+    return len(storage.read_csv_parallel(storage.table_path("orders", "raw", fmt="csv"), "orders"))
+
+
+def stage_clean(ctx):
+    ctx["clean"] = cleaning.clean_orders(ctx["orders"]).drop_duplicates(subset="order_id")
+    return len(ctx["orders"])
+
+
+def stage_merge(ctx):
+    ctx["star"] = loader.build_star("raw")
+    return len(ctx["star"])
+
+
+def stage_business(ctx):
+    cube = revenue_cube.build_cube(ctx["star"][revenue_cube.STAR_COLUMNS])
+    names = storage.read_table("customers", "raw", columns=["customer_id", "name"])
+    revenue_cube.top_customers(cube, names, n=10)
+    revenue_cube.revenue_by(cube, "category")
+    revenue_cube.top_by(cube, "location", n=10)
+    revenue_cube.repeat_rate(cube)
+    revenue_cube.aov_trend(cube)
+    ctx["cube"] = cube
+    return len(ctx["star"])
+
+
+def stage_heavy_hitters(ctx):
+    star = ctx["star"]
+    hitters = HeavyHitters()
+    for start in range(0, len(star), STREAM_CHUNK):
+        hitters.update(star.iloc[start:start + STREAM_CHUNK])
+    for dim in hitters.space_saving:
+        hitters.top(dim)
+    return len(star)
+
+
+def stage_rfm(ctx):
+    ctx["rfm"] = score_rfm(RFMState.from_orders(ctx["clean"]).table())
+    return len(ctx["clean"])
+
+
+def stage_parallel(ctx):
+    parallel.aggregate(ctx["star"], list(parallel.AGGREGATIONS), workers=PARALLEL_WORKERS)
+    return len(ctx["star"])
+
+
+def stage_plotting(ctx):
+    plot_dir = os.path.join(storage.DATA_DIR, "plots")
+    # Always render: the benchmark measures drawing, not the render cache
+    shutil.rmtree(os.path.join(plot_dir, RENDER_CACHE), ignore_errors=True)
+    render_charts([
+        ChartSpec("order_amount_distribution", lambda: histogram(ctx["orders"]["total_amount"], bins=50),
+                  "hist", "Distribution of Order Amounts"),
+        ChartSpec("category_revenue", lambda: revenue_cube.revenue_by(ctx["cube"], "category"),
+                  "bar", "Total Revenue by Product Category"),
+        ChartSpec("monthly_revenue_trend", lambda: revenue_cube.monthly_revenue(ctx["cube"]),
+                  "line", "Monthly Revenue Trend", figsize=(10, 5)),
+        ChartSpec("rfm_segments_distribution", lambda: ctx["rfm"]["Segment"].value_counts(),
+                  "bar", "Customer Segments Distribution"),
+    ], plot_dir)
+    return len(ctx["orders"])
+
+
+STAGES = {
+    "generate": stage_generate,
+    "parquet_read": stage_parquet_read,
+    "parquet_write": stage_parquet_write,
+    "mmap_write": stage_mmap_write,
+    "mmap_read": stage_mmap_read,
+    "csv_write": stage_csv_write,
+    "csv_read": stage_csv_read,
+    "csv_parallel": stage_csv_parallel,
+    "clean": stage_clean,
+    "merge": stage_merge,
+    "business": stage_business,
+    "heavy_hitters": stage_heavy_hitters,
+    "rfm": stage_rfm,
+    "parallel": stage_parallel,
+    "plotting": stage_plotting,
+}
+
+
+# ------------------------
+# Running
+# ------------------------
+def time_stage(fn, ctx, repeat=1):
+    """Best-of-`repeat` seconds, rows and peak RSS (of the first run) of one stage."""
+    best = None
+    for attempt in range(repeat):
+        reset_peak_rss()
+        start = time.perf_counter()
+        rows = fn(ctx)
+        seconds = time.perf_counter() - start
+        if attempt == 0:
+            peak = peak_rss_mb()
+        best = seconds if best is None else min(best, seconds)
+    return {"rows": int(rows), "seconds": round(best, 4), "rows_per_s": round(rows / best) if best else None,
+            "peak_rss_mb": round(peak, 1)}
+
+
+def run_size(n_orders, workdir, stages=STAGES, repeat=1):
+    """Generate a dataset of `n_orders` in `workdir` and time every stage on it."""
+    ctx = plan_size(n_orders)
+    ctx["pool_cache"] = os.path.abspath(loader.CACHE_DIR)
+    shutil.rmtree(workdir, ignore_errors=True)
+    os.makedirs(workdir)
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    mmap_cache, storage.MMAP_CACHE = storage.MMAP_CACHE, False
+    results = []
+    try:
+        for name, fn in stages.items():
+            record = {"n_orders": ctx["n_orders"], "stage": name, **time_stage(fn, ctx, repeat)}
+            print(f"  {name:<14} {record['seconds']:>9.3f}s {record['rows_per_s'] or 0:>14,} rows/s "
+                  f"{record['peak_rss_mb']:>9.1f} MB")
+            results.append(record)
+    finally:
+        storage.MMAP_CACHE = mmap_cache
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+
+def environment():
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "pyarrow": pa.__version__,
+        "seed": SEED,
+    }
+
+
+# ------------------------
+# Baseline comparison
+# ------------------------
+def compare(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """Join results with the baseline on (n_orders, stage); flag stages slower than 1 + tolerance."""
+    current = pd.DataFrame(results).set_index(["n_orders", "stage"])
+    base = pd.DataFrame(baseline["results"]).set_index(["n_orders", "stage"])
+    report = current[["seconds", "peak_rss_mb"]].join(
+        base[["seconds", "peak_rss_mb"]], rsuffix="_baseline", how="inner")
+    report["ratio"] = (report["seconds"] / report["seconds_baseline"]).round(3)
+    report["regression"] = report["ratio"] > 1 + tolerance
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark generation, I/O, cleaning, aggregation, RFM and plotting.")
+    parser.add_argument("--orders", nargs="+", type=float, default=DEFAULT_ORDERS,
+                        help="order counts to benchmark, e.g. 1e4 1e6 1e8")
+    parser.add_argument("--stages", nargs="+", choices=list(STAGES), default=list(STAGES),
+                        help="subset of stages (later stages need the earlier ones' data)")
+    parser.add_argument("--repeat", type=int, default=1, help="runs per stage; the fastest is kept")
+    parser.add_argument("--output", help="results file (default data/benchmarks/results_<time>.json)")
+    parser.add_argument("--baseline", help="compare with this results file")
+    parser.add_argument("--save-baseline", action="store_true", help=f"also save the results as {BASELINE_PATH}")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="allowed slowdown vs the baseline before a stage counts as a regression")
+    args = parser.parse_args(argv)
+
+    stages = {name: fn for name, fn in STAGES.items() if name in args.stages}
+    workdir = os.path.abspath(os.path.join(BENCH_DIR, "work"))
+    results = []
+    for n_orders in args.orders:
+        print(f"--- {int(n_orders):,} orders ---")
+        results += run_size(int(n_orders), workdir, stages, args.repeat)
+
+    run = {"created_at": time.strftime("%Y-%m-%dT%H:%M:%S"), "environment": environment(), "results": results}
+    output = args.output or os.path.join(BENCH_DIR, f"results_{time.strftime('%Y%m%d-%H%M%S')}.json")
+    paths = [output] + ([BASELINE_PATH] if args.save_baseline else [])
+    for path in paths:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(run, f, indent=2)
+    print(f"Results saved to {', '.join(paths)}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            report = compare(results, json.load(f), args.tolerance)
+        print(report.to_string())
+        if report["regression"].any():
+            print(f"Regressions (> {args.tolerance:.0%} slower): "
+                  f"{', '.join(f'{s} @ {n:,}' for n, s in report.index[report['regression']])}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
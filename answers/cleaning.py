@@ -0,0 +1,233 @@
+"""Cleaning rules for orders and a streaming (out-of-core) cleaning pass.
+
+`clean_orders` holds the per-row rules used by the cleaning ticket. The
+streaming pass applies them batch by batch, drops repeated order_ids with
+a bitmap of ids already written, appends each batch to the clean Parquet
+file and folds the batch into mergeable summary statistics, so peak
+memory is one batch plus one bit per order_id.
+"""
+import numpy as np
+import pandas as pd
+
+import schema
+import storage
+from tracing import traced
+
+CRITICAL_ORDER_COLUMNS = ["customer_id", "product_id", "order_date"]
+
+
+# ------------------------
+# Rules
+# ------------------------
+@traced()
+def clean_orders(orders, money=None):
+    """Drop rows missing critical fields and coerce numeric columns (`money` as in schema.apply)."""
+    orders = orders.dropna(subset=CRITICAL_ORDER_COLUMNS).copy()
+    orders["quantity"] = pd.to_numeric(orders["quantity"], errors="coerce").fillna(1)
+    orders["total_amount"] = pd.to_numeric(orders["total_amount"], errors="coerce")
+    return schema.apply(orders, "orders", money)
+
+
+def fill_category(col, value):
+    """fillna that also works on categoricals missing `value` as a category."""
+    if isinstance(col.dtype, pd.CategoricalDtype) and value not in col.cat.categories:
+        col = col.cat.add_categories([value])
+    return col.fillna(value)
+
+
+def map_categories(col, fn):
+    """Apply `fn` (Series -> Series of strings) to the distinct values of `col` only.
+
+    On a categorical this touches each category once instead of every row;
+    categories mapped to the same value are merged.
+    """
+    if not isinstance(col.dtype, pd.CategoricalDtype):
+        return fn(col)
+    mapped = fn(pd.Series(col.cat.categories, dtype=object)).to_numpy()
+    categories, inverse = np.unique(mapped.astype(str), return_inverse=True)
+    codes = col.cat.codes.to_numpy()
+    new_codes = np.where(codes >= 0, inverse[codes], -1)
+    return pd.Series(pd.Categorical.from_codes(new_codes, categories), index=col.index, name=col.name)
+
+
+# ------------------------
+# Deduplication
+# ------------------------
+class SeenIds:
+    """Set of non-negative integer ids stored as a bitmap (one bit per id)."""
+
+    def __init__(self, capacity=1 << 20):
+        self.bits = np.zeros((capacity + 7) // 8, dtype=np.uint8)
+        self.seen_null = False
+
+    def _grow(self, max_id):
+        needed = int(max_id) // 8 + 1
+        if needed > len(self.bits):
+            bits = np.zeros(max(needed, 2 * len(self.bits)), dtype=np.uint8)
+            bits[:len(self.bits)] = self.bits
+            self.bits = bits
+
+    def first_seen(self, ids):
+        """Mask of ids not seen in earlier calls nor earlier in `ids`; marks them as seen.
+
+        Missing ids behave like drop_duplicates: only the first one is kept.
+        """
+        ids = pd.Series(ids)
+        null = ids.isna().to_numpy()
+        keep = np.zeros(len(ids), dtype=bool)
+
+        if null.any() and not self.seen_null:
+            keep[np.flatnonzero(null)[0]] = True
+            self.seen_null = True
+
+        valid = np.flatnonzero(~null)
+        values = ids.to_numpy()[valid].astype(np.int64)
+        if len(values) == 0:
+            return keep
+        if values.min() < 0:
+            raise ValueError("SeenIds only supports non-negative ids")
+        self._grow(values.max())
+
+        first = np.zeros(len(values), dtype=bool)
+        first[np.unique(values, return_index=True)[1]] = True
+        already = (self.bits[values >> 3] >> (values & 7).astype(np.uint8)) & 1
+        new = first & (already == 0)
+
+        fresh = values[new]
+        np.bitwise_or.at(self.bits, fresh >> 3, (1 << (fresh & 7)).astype(np.uint8))
+        keep[valid[new]] = True
+        return keep
+
+    def contains(self, ids):
+        """Mask of the integer `ids` that are in the set."""
+        ids = np.asarray(ids, dtype=np.int64)
+        inside = (ids >= 0) & (ids < len(self.bits) * 8)
+        values = ids[inside]
+        found = np.zeros(len(ids), dtype=bool)
+        found[inside] = (self.bits[values >> 3] >> (values & 7).astype(np.uint8)) & 1
+        return found
+
+
+# ------------------------
+# Mergeable summary statistics
+# ------------------------
+def _timestamp(value):
+    return pd.Timestamp(int(value)) if value is not None else None
+
+
+class SummaryAccumulator:
+    """Null counts and describe()-style statistics built from chunks.
+
+    Numeric and datetime columns keep count/mean/M2/min/max (merged with
+    Chan's parallel update), other columns keep value counts. Percentiles
+    need the full column and are not reported.
+    """
+
+    def __init__(self):
+        self.rows = 0
+        self.columns = None
+        self.stats = {}
+
+    def update(self, df):
+        if self.columns is None:
+            self.columns = list(df.columns)
+        self.rows += len(df)
+        for name in df.columns:
+            self._merge_column(name, self._column_stats(df[name]))
+        return self
+
+    def merge(self, other):
+        if self.columns is None:
+            self.columns = other.columns
+        self.rows += other.rows
+        for name, stats in other.stats.items():
+            self._merge_column(name, stats)
+        return self
+
+    @staticmethod
+    def _column_stats(col):
+        nulls = int(col.isna().sum())
+        present = col.dropna()
+        if pd.api.types.is_datetime64_any_dtype(col) or pd.api.types.is_numeric_dtype(col):
+            kind = "datetime" if pd.api.types.is_datetime64_any_dtype(col) else "numeric"
+            values = present.to_numpy(dtype="datetime64[ns]").astype(np.int64) if kind == "datetime" \
+                else present.to_numpy(dtype=float)
+            n = len(values)
+            mean = float(values.mean()) if n else 0.0
+            return {
+                "kind": kind, "count": n, "nulls": nulls, "mean": mean,
+                "m2": float(((values - mean) ** 2).sum()) if n else 0.0,
+                "min": values.min() if n else None, "max": values.max() if n else None,
+            }
+        return {"kind": "other", "count": len(present), "nulls": nulls,
+                "values": present.value_counts().to_dict()}
+
+    def _merge_column(self, name, new):
+        old = self.stats.get(name)
+        if old is None:
+            self.stats[name] = new
+            return
+        if new["kind"] == "other":
+            for value, freq in new["values"].items():
+                old["values"][value] = old["values"].get(value, 0) + freq
+        elif new["count"]:
+            n = old["count"] + new["count"]
+            delta = new["mean"] - old["mean"]
+            old["mean"] += delta * new["count"] / n
+            old["m2"] += new["m2"] + delta ** 2 * old["count"] * new["count"] / n
+            old["min"] = new["min"] if old["min"] is None else min(old["min"], new["min"])
+            old["max"] = new["max"] if old["max"] is None else max(old["max"], new["max"])
+        old["count"] += new["count"]
+        old["nulls"] += new["nulls"]
+
+    def null_counts(self):
+        return pd.Series({name: self.stats[name]["nulls"] for name in self.columns or []}, dtype=int)
+
+    def describe(self):
+        out = {}
+        for name in self.columns or []:
+            s = self.stats[name]
+            if s["kind"] == "other":
+                top = max(s["values"], key=s["values"].get) if s["values"] else None
+                out[name] = {"count": s["count"], "unique": len(s["values"]),
+                             "top": top, "freq": s["values"].get(top)}
+            elif s["kind"] == "datetime":
+                out[name] = {"count": s["count"], "mean": _timestamp(s["mean"]),
+                             "min": _timestamp(s["min"]), "max": _timestamp(s["max"])}
+            else:
+                std = (s["m2"] / (s["count"] - 1)) ** 0.5 if s["count"] > 1 else np.nan
+                out[name] = {"count": s["count"], "mean": s["mean"], "std": std,
+                             "min": s["min"], "max": s["max"]}
+        index = ["count", "unique", "top", "freq", "mean", "std", "min", "max"]
+        return pd.DataFrame(out).reindex(index).dropna(how="all")
+
+    def report(self, name):
+        print(f"\n--- {name.upper()} SUMMARY ---")
+        print(f"Shape: ({self.rows}, {len(self.columns or [])})")
+        print(self.null_counts())
+        print(self.describe())
+
+
+# ------------------------
+# Streaming pass
+# ------------------------
+@traced()
+def stream_clean_orders(layer_in="raw", layer_out="clean", batch_size=1_000_000):
+    """Clean orders batch by batch into data/<layer_out>/.
+
+    Returns (rows_read, SummaryAccumulator of the cleaned rows).
+    """
+    seen = SeenIds()
+    summary = SummaryAccumulator()
+    rows_read = 0
+    # One money dtype for every batch, as the reader chose it for the whole file
+    money = storage.money_dtypes(storage.source_path("orders", layer_in), "orders")
+    with storage.open_writer(storage.table_path("orders", layer_out), "orders") as writer:
+        for chunk in storage.iter_table("orders", layer_in, batch_size=batch_size):
+            rows_read += len(chunk)
+            chunk = clean_orders(chunk, money)
+            chunk = chunk[seen.first_seen(chunk["order_id"])]
+            writer.write_table(storage.to_arrow(chunk, "orders"))
+            # Statistics of the float64 amounts, not of their float32 approximations
+            summary.update(schema.widen(chunk, "orders"))
+    return rows_read, summary
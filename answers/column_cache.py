@@ -0,0 +1,134 @@
+"""Memory-mapped NumPy column cache.
+
+A frame is stored as one .npy file per column plus a small header.json
+(key, row count, column kinds) in a directory named after the key.
+Reopening maps the files with np.load(mmap_mode="c") and wraps them in a
+DataFrame without copying, so a reload costs a few system calls whatever
+the table size, only the pages that are actually touched are read, and
+every process opening the same cache shares the page cache instead of
+holding its own copy. Pages written to (in-place edits) become private to
+that process; the files themselves are never modified.
+
+Categoricals and string columns are stored as integer codes plus a
+categories file (string columns come back as categoricals), dates as
+int64 views.
+
+`save` never removes other keys, since another process may be opening
+them; `prune` drops superseded keys when nothing else is running (e.g. at
+the start of a pipeline run).
+"""
+import hashlib
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+HEADER = "header.json"
+MMAP_MODE = "c"
+
+
+def source_key(path, *parts):
+    """Key of a cache built from the file at `path` (by size and mtime) and `parts`."""
+    stat = os.stat(path)
+    digest = hashlib.sha256(f"{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime_ns}".encode())
+    for part in parts:
+        digest.update(str(part).encode())
+    return digest.hexdigest()[:16]
+
+
+# ------------------------
+# Writing
+# ------------------------
+def _codes_dtype(n):
+    for dtype in (np.int8, np.int16, np.int32):
+        if n < np.iinfo(dtype).max:
+            return dtype
+    return np.int64
+
+
+def _write_column(directory, i, col):
+    values = f"c{i}.npy"
+    if isinstance(col.dtype, pd.CategoricalDtype) or col.dtype == object:
+        cat = col.array if isinstance(col.dtype, pd.CategoricalDtype) else pd.Categorical(col)
+        categories = f"c{i}_categories.npy"
+        np.save(os.path.join(directory, values), cat.codes.astype(_codes_dtype(len(cat.categories))))
+        np.save(os.path.join(directory, categories), np.asarray(cat.categories, dtype=str))
+        return {"name": col.name, "kind": "category", "values": values, "categories": categories}
+    if pd.api.types.is_datetime64_any_dtype(col):
+        np.save(os.path.join(directory, values), col.to_numpy().view(np.int64))
+        return {"name": col.name, "kind": "datetime", "dtype": str(col.dtype), "values": values}
+    np.save(os.path.join(directory, values), col.to_numpy())
+    return {"name": col.name, "kind": "numeric", "values": values}
+
+
+def save(df, base_dir, key):
+    """Write `df` to <base_dir>/<key>/; caches with other keys are left to `prune`."""
+    target = os.path.join(base_dir, key)
+    tmp = f"{target}.{os.getpid()}.tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    columns = [_write_column(tmp, i, df[name]) for i, name in enumerate(df.columns)]
+    with open(os.path.join(tmp, HEADER), "w") as f:
+        json.dump({"key": key, "rows": len(df), "columns": columns}, f, indent=1)
+    try:
+        os.rename(tmp, target)
+    except OSError:
+        # Another process published the same key first
+        shutil.rmtree(tmp, ignore_errors=True)
+    return target
+
+
+def prune(root):
+    """Under `root`, keep only the newest key of every cache and drop unfinished writes.
+
+    Not safe while other processes read or write the caches under `root`.
+    """
+    removed = 0
+    for base_dir, subdirs, _ in os.walk(root):
+        keys = [os.path.join(base_dir, d) for d in subdirs if os.path.exists(os.path.join(base_dir, d, HEADER))]
+        stale = [os.path.join(base_dir, d) for d in subdirs if d.endswith(".tmp")]
+        if keys:
+            newest = max(keys, key=lambda d: os.path.getmtime(os.path.join(d, HEADER)))
+            stale += [d for d in keys if d != newest]
+        for directory in stale:
+            shutil.rmtree(directory, ignore_errors=True)
+            removed += 1
+        subdirs[:] = [d for d in subdirs if os.path.join(base_dir, d) not in stale]
+    return removed
+
+
+# ------------------------
+# Reading
+# ------------------------
+def _open_column(directory, meta):
+    # A plain ndarray view of the map, so pandas never sees the memmap subclass
+    values = np.asarray(np.load(os.path.join(directory, meta["values"]), mmap_mode=MMAP_MODE))
+    if meta["kind"] == "category":
+        categories = np.load(os.path.join(directory, meta["categories"]))
+        # The codes were valid when written; skipping validation keeps the open O(1)
+        return pd.Categorical.from_codes(values, categories=pd.Index(categories, dtype=object), validate=False)
+    if meta["kind"] == "datetime":
+        return values.view(meta["dtype"])
+    return values
+
+
+def load(base_dir, key, columns=None):
+    """The cached frame for `key` (only `columns`, memory-mapped), or None if not cached."""
+    directory = os.path.join(base_dir, key)
+    try:
+        with open(os.path.join(directory, HEADER)) as f:
+            header = json.load(f)
+    except (OSError, ValueError):
+        return None
+    metas = {meta["name"]: meta for meta in header["columns"]}
+    names = list(metas) if columns is None else list(columns)
+    if any(name not in metas for name in names):
+        return None
+    try:
+        columns = {name: _open_column(directory, metas[name]) for name in names}
+    except FileNotFoundError:
+        # Pruned between reading the header and mapping the columns
+        return None
+    return pd.DataFrame(columns, index=pd.RangeIndex(header["rows"]), copy=False)
@@ -0,0 +1,188 @@
+"""Materialized revenue cube for the dashboard questions of tickets 2-3 and 4.
+
+The cube holds sum/count of total_amount and sum of quantity per
+(year_month, category, location, customer_id). Every chart and metric in
+those tickets (category and region revenue, monthly revenue, AOV, top
+customers, orders per customer, repeat rate) is a roll-up of it, so they
+scan the cube instead of the order table. When the orders file only
+gained new orders, i.e. the rows the previous cube was built from are
+still the start of the file, `load_cube` merges the new orders into that
+cube with `update_cube` instead of rebuilding it.
+"""
+import glob
+import hashlib
+import json
+import os
+
+import pandas as pd
+
+import loader
+import schema
+import storage
+import topk
+from tracing import traced
+
+CUBE_KEYS = ["year_month", "category", "location", "customer_id"]
+CUBE_COLUMNS = CUBE_KEYS + ["revenue", "orders", "quantity"]
+STAR_COLUMNS = ["order_date", "category", "location", "customer_id", "total_amount", "quantity"]
+# Order columns the cube is built from; their digest tells appended orders from regenerated ones
+ORDER_COLUMNS = ["order_id", "customer_id", "product_id", "order_date", "total_amount", "quantity"]
+
+
+# ------------------------
+# Building
+# ------------------------
+@traced()
+def build_cube(orders):
+    """Aggregate order rows (with category and location attached) into the cube."""
+    keyed = schema.widen(orders, "orders")
+    keyed = keyed.assign(year_month=keyed["order_date"].dt.to_period("M").dt.to_timestamp())
+    cube = keyed.groupby(CUBE_KEYS, dropna=False, sort=False, observed=True).agg(
+        revenue=("total_amount", "sum"),
+        orders=("total_amount", "size"),
+        quantity=("quantity", "sum"),
+    )
+    return cube.reset_index()[CUBE_COLUMNS]
+
+
+@traced()
+def update_cube(cube, new_orders):
+    """Fold a batch of new orders into an existing cube."""
+    combined = pd.concat([cube, build_cube(new_orders)], ignore_index=True)
+    merged = combined.groupby(CUBE_KEYS, dropna=False, sort=False, observed=True)[["revenue", "orders", "quantity"]].sum()
+    return merged.reset_index()[CUBE_COLUMNS]
+
+
+def _cube_path(layer, key, ext="parquet"):
+    return os.path.join(loader.CACHE_DIR, f"cube_{layer}_{key}.{ext}")
+
+
+def _dimensions_key(layer):
+    """Key of the customer and product files the cube's category and location come from."""
+    digest = hashlib.sha256(schema.fingerprint().encode())
+    for table in ("customers", "products"):
+        path = storage.source_path(table, layer)
+        digest.update(os.path.basename(path).encode())
+        digest.update(loader.file_digest(path).encode())
+    return digest.hexdigest()[:16]
+
+
+def _appended(layer, dimensions):
+    """(previous cube, orders appended since, max order id, digests) when the orders file only grew, else None.
+
+    Applies when a cube of `layer` was built with the same dimensions from
+    order rows that are still the first rows of the orders file (checked by
+    their digest), and every later row has a higher order id (checked by the
+    row count). `digests` are the loader.row_digests of the current file.
+    """
+    for state_path in glob.glob(_cube_path(layer, "*", "json")):
+        try:
+            with open(state_path) as f:
+                state = json.load(f)
+            if state["dimensions"] != dimensions:
+                continue
+            rows, digests = loader.row_digests("orders", layer, at=[state["orders"]], columns=ORDER_COLUMNS)
+            if digests[state["orders"]] != state["orders_digest"]:
+                continue
+            new_orders = storage.read_table("orders", layer, columns=ORDER_COLUMNS,
+                                            filters=[("order_id", ">", state["max_order_id"])])
+            if state["orders"] + len(new_orders) != rows:
+                continue
+            max_order_id = max(state["max_order_id"], _max_order_id(new_orders))
+            return pd.read_parquet(state_path[:-len("json")] + "parquet"), new_orders, max_order_id, (rows, digests)
+        except (OSError, ValueError, KeyError):
+            # Removed by a concurrent rebuild, or unreadable: rebuild instead
+            continue
+    return None
+
+
+def _max_order_id(orders):
+    ids = orders["order_id"].dropna()
+    return int(ids.max()) if len(ids) else 0
+
+
+def _with_dimensions(orders, layer):
+    customers = storage.read_table("customers", layer, columns=["customer_id", "location"])
+    products = storage.read_table("products", layer, columns=["product_id", "category"])
+    star = loader.attach(orders, customers.drop_duplicates(subset="customer_id"), "customer_id")
+    return loader.attach(star, products.drop_duplicates(subset="product_id"), "product_id")
+
+
+@traced()
+def load_cube(layer="raw"):
+    """The cube for `layer`, cached next to the star schema it was built from.
+
+    When the orders file only gained rows with new order ids since the last
+    cached cube, those rows are folded in with `update_cube` instead of
+    rebuilding from the whole star schema.
+    """
+    key = loader.star_key(layer)
+    path = _cube_path(layer, key)
+    if os.path.exists(path):
+        return pd.read_parquet(path)
+
+    dimensions = _dimensions_key(layer)
+    previous = _appended(layer, dimensions)
+    if previous is not None:
+        cube, new_orders, max_order_id, (rows, digests) = previous
+        cube = update_cube(cube, _with_dimensions(new_orders, layer)[STAR_COLUMNS])
+    else:
+        star = loader.load_star(layer, columns=STAR_COLUMNS + ["order_id"])
+        cube = build_cube(star[STAR_COLUMNS])
+        max_order_id = _max_order_id(star)
+        rows, digests = loader.row_digests("orders", layer, columns=ORDER_COLUMNS)
+
+    for stale in glob.glob(_cube_path(layer, "*")) + glob.glob(_cube_path(layer, "*", "json")):
+        if stale not in (path, _cube_path(layer, key, "json")):
+            loader.remove_stale(stale)
+    os.makedirs(loader.CACHE_DIR, exist_ok=True)
+    with storage.replace_atomically(path) as tmp:
+        cube.to_parquet(tmp, index=False)
+    with storage.replace_atomically(_cube_path(layer, key, "json")) as tmp, open(tmp, "w") as f:
+        json.dump({"dimensions": dimensions, "max_order_id": max_order_id, "orders": rows,
+                   "orders_digest": digests[rows]}, f)
+    return cube
+
+
+# ------------------------
+# Queries
+# ------------------------
+def revenue_by(cube, key):
+    return cube.groupby(key, observed=True)["revenue"].sum().sort_values(ascending=False)
+
+
+def top_by(cube, key, n=10):
+    """Top `n` values of `key` by revenue, like revenue_by(cube, key).head(n) without sorting every key."""
+    return topk.top_k_by(cube[key], cube["revenue"], n)
+
+
+def monthly_revenue(cube):
+    monthly = cube.groupby("year_month")["revenue"].sum()
+    monthly.index = monthly.index.to_period("M")
+    return monthly
+
+
+def aov_trend(cube):
+    """Average order value per month: revenue / number of orders."""
+    monthly = cube.groupby("year_month")[["revenue", "orders"]].sum()
+    aov = monthly["revenue"] / monthly["orders"]
+    aov.index = aov.index.to_period("M")
+    return aov
+
+
+def orders_per_customer(cube):
+    return cube.groupby("customer_id")["orders"].sum()
+
+
+def repeat_rate(cube):
+    counts = orders_per_customer(cube)
+    return (counts > 1).sum() / len(counts)
+
+
+def top_customers(cube, names, n=10):
+    """Top `n` customers by revenue, indexed by (customer_id, name) like the pandas query."""
+    top = top_by(cube, "customer_id", n)
+    names = names.drop_duplicates(subset="customer_id").set_index("customer_id")["name"]
+    top.index = pd.MultiIndex.from_arrays([top.index, names.reindex(top.index).to_numpy()],
+                                          names=["customer_id", "name"])
+    return top
@@ -0,0 +1,389 @@
+"""Vectorized synthetic order generation used by ticket-0.
+
+Every order attribute is drawn in bulk NumPy arrays and emitted in
+fixed-size chunks, so generating 10^8 orders only ever holds one chunk
+in memory. Customers are split into shards that can be generated in a
+process pool; each shard has its own seed spawned from the run seed, so
+the output does not depend on the number of workers. Customer names and
+cities are index-sampled from Faker vocabularies drawn once per seed and
+locale instead of calling Faker per row.
+
+Order dates can follow a timeline.Seasonality, and `iter_order_events`
+generates the same orders as an open-ended, time-ordered stream for
+replaying into downstream ingestion.
+"""
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+
+import numpy as np
+import pandas as pd
+from faker import Faker
+
+import storage
+from tracing import traced
+
+# ------------------------
+# Generation rules
+# ------------------------
+CATEGORIES = {
+    "Electronics": ["Smartphone", "Laptop", "Headphones", "Smartwatch", "Camera"],
+    "Fashion": ["T-shirt", "Jeans", "Sneakers", "Jacket", "Dress"],
+    "Home": ["Sofa", "Dining Table", "Bed Frame", "Chair", "Cookware"],
+    "Books": ["Novel", "Biography", "Textbook", "Comics", "Cookbook"],
+    "Beauty": ["Lipstick", "Perfume", "Shampoo", "Skincare Cream", "Makeup Kit"]
+}
+
+# Category preference by age: buckets are age < 30, 30 <= age < 50, age >= 50
+AGE_BUCKET_EDGES = np.array([30, 50])
+CATEGORY_ORDER = ["Fashion", "Electronics", "Home", "Books", "Beauty"]
+AGE_CATEGORY_WEIGHTS = np.array([
+    [0.4, 0.3, 0.1, 0.1, 0.1],
+    [0.2, 0.3, 0.2, 0.2, 0.1],
+    [0.1, 0.2, 0.4, 0.2, 0.1],
+])
+
+QUANTITIES = np.array([1, 2, 3, 4, 5])
+QUANTITY_WEIGHTS = np.array([0.7, 0.15, 0.1, 0.04, 0.01])
+
+# Without a seasonality, orders skew toward recent years; anything older than the
+# window is redrawn uniformly
+DATE_WINDOW_DAYS = 5 * 365
+DATE_DECAY_SCALE = 500
+
+# Customer vocabularies are drawn from Faker once and then index-sampled
+DEFAULT_LOCALE = "en_US"
+POOL_SIZE = 5000
+
+ACTIVE_SHARE = 0.8
+ORDERS_PER_CUSTOMER = 25
+DEFAULT_CHUNK_SIZE = 1_000_000
+
+CUSTOMER_COLUMNS = ["customer_id", "name", "age", "gender", "location", "signup_date"]
+ORDER_COLUMNS = ["order_id", "customer_id", "product_id", "order_date", "quantity", "total_amount"]
+
+
+# ------------------------
+# Customers
+# ------------------------
+@traced()
+def build_faker_pools(seed, locale=DEFAULT_LOCALE, size=POOL_SIZE, cache_dir=None):
+    """Draw first name, last name and city vocabularies from Faker once.
+
+    Pools are cached as JSON in `cache_dir`, keyed by seed, locale and size,
+    so repeated runs skip Faker entirely.
+    """
+    cache_path = None
+    if cache_dir:
+        cache_path = os.path.join(cache_dir, f"faker_pools_{locale}_{seed}_{size}.json")
+        if os.path.exists(cache_path):
+            with open(cache_path) as f:
+                return {key: np.array(values) for key, values in json.load(f).items()}
+
+    fake = Faker(locale)
+    fake.seed_instance(seed)
+    pools = {
+        "first_names": sorted({fake.first_name() for _ in range(size)}),
+        "last_names": sorted({fake.last_name() for _ in range(size)}),
+        "cities": sorted({fake.city() for _ in range(size)}),
+    }
+    # Shuffle cities so the Zipf head is not alphabetical
+    rng = np.random.default_rng(seed)
+    pools["cities"] = [pools["cities"][i] for i in rng.permutation(len(pools["cities"]))]
+
+    if cache_path:
+        os.makedirs(cache_dir, exist_ok=True)
+        with open(cache_path, "w") as f:
+            json.dump(pools, f)
+    return {key: np.array(values) for key, values in pools.items()}
+
+
+def zipf_weights(n, skew):
+    """Probabilities proportional to 1 / rank**skew; skew=0 is uniform."""
+    weights = 1.0 / np.arange(1, n + 1) ** skew
+    return weights / weights.sum()
+
+
+def generate_customers(customer_ids, rng, pools, city_skew=None, today=None):
+    """Build the customers table for `customer_ids` by index sampling into `pools`."""
+    customer_ids = np.asarray(customer_ids)
+    n = len(customer_ids)
+    today = np.datetime64(today or date.today(), "D")
+
+    first = pools["first_names"][rng.integers(0, len(pools["first_names"]), size=n)]
+    last = pools["last_names"][rng.integers(0, len(pools["last_names"]), size=n)]
+    cities = pools["cities"]
+    city_p = zipf_weights(len(cities), city_skew) if city_skew else None
+
+    return pd.DataFrame({
+        "customer_id": customer_ids,
+        "name": np.char.add(np.char.add(first, " "), last),
+        "age": rng.integers(18, 76, size=n),
+        "gender": rng.choice(["Male", "Female", "Other"], size=n),
+        "location": cities[rng.choice(len(cities), size=n, p=city_p)],
+        "signup_date": today - rng.integers(0, DATE_WINDOW_DAYS + 1, size=n),
+    }, columns=CUSTOMER_COLUMNS)
+
+
+# ------------------------
+# Order plan
+# ------------------------
+def draw_order_counts(customer_ids, rng, active_share=ACTIVE_SHARE, lam=ORDERS_PER_CUSTOMER):
+    """Pick the active customers and a Poisson order count for each of them."""
+    customer_ids = np.asarray(customer_ids)
+    active = rng.choice(customer_ids, size=int(active_share * len(customer_ids)), replace=False)
+    counts = rng.poisson(lam=lam, size=len(active))
+    return active, counts
+
+
+def build_product_index(products):
+    """Group product rows by CATEGORY_ORDER position.
+
+    Returns (product_ids, prices, starts, sizes): products sorted by category
+    plus the slice of each category inside them. An empty category falls back
+    to the whole product table.
+    """
+    codes = pd.Categorical(products["category"], categories=CATEGORY_ORDER).codes
+    order = np.argsort(codes, kind="stable")
+    product_ids = products["product_id"].to_numpy()[order]
+    prices = products["price"].to_numpy(dtype=float)[order]
+
+    sizes = np.bincount(codes[codes >= 0], minlength=len(CATEGORY_ORDER))
+    starts = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+    empty = sizes == 0
+    starts[empty] = 0
+    sizes[empty] = len(product_ids)
+    return product_ids, prices, starts, sizes
+
+
+# ------------------------
+# Chunked generation
+# ------------------------
+class OrderDraws:
+    """Lookup tables for drawing the product and quantity of orders by their owners.
+
+    `owner` arguments index into `active`; the category comes from the
+    owner's age bucket.
+    """
+
+    def __init__(self, customers, products, active):
+        # Dense customer_id -> age lookup instead of a per-customer .loc scan
+        customer_ids = customers["customer_id"].to_numpy()
+        age_by_id = np.zeros(int(customer_ids.max()) + 1, dtype=np.int16)
+        age_by_id[customer_ids] = customers["age"].to_numpy()
+        self.active = np.asarray(active)
+        self.bucket = np.digitize(age_by_id[self.active], AGE_BUCKET_EDGES)
+        self.category_cdf = np.cumsum(AGE_CATEGORY_WEIGHTS, axis=1)
+        self.category_cdf[:, -1] = 1.0
+
+        self.product_ids, self.prices, self.starts, self.sizes = build_product_index(products)
+        self.quantity_cdf = np.cumsum(QUANTITY_WEIGHTS)
+        self.quantity_cdf[-1] = 1.0
+
+    def products(self, owner, rng):
+        """Positions into product_ids/prices of one product per order."""
+        n = len(owner)
+        category = (rng.random(n)[:, None] >= self.category_cdf[self.bucket[owner]]).sum(axis=1)
+        return self.starts[category] + (rng.random(n) * self.sizes[category]).astype(np.int64)
+
+    def quantities(self, n, rng):
+        return QUANTITIES[np.searchsorted(self.quantity_cdf, rng.random(n), side="right")]
+
+    def frame(self, order_ids, owner, pick, order_date, quantity):
+        return pd.DataFrame({
+            "order_id": order_ids,
+            "customer_id": self.active[owner],
+            "product_id": self.product_ids[pick],
+            "order_date": order_date,
+            "quantity": quantity,
+            "total_amount": np.round(self.prices[pick] * quantity, 2),
+        }, columns=ORDER_COLUMNS)
+
+
+def iter_orders(customers, products, active, counts, rng, n_orders=None,
+                chunk_size=DEFAULT_CHUNK_SIZE, start_order_id=1, today=None, seasonality=None):
+    """Yield the orders for `active` customers as DataFrames of at most `chunk_size` rows.
+
+    Customers are expanded in the order of `active`, each contributing
+    `counts[i]` orders, and the total is truncated to `n_orders`. Order
+    dates follow `seasonality` (a timeline.Seasonality) over the last
+    DATE_WINDOW_DAYS, or the plain exponential decay without one. With the
+    same rng state and chunk size the output is identical across runs.
+    """
+    today = np.datetime64(today or date.today(), "D")
+    draws = OrderDraws(customers, products, active)
+
+    ends = np.cumsum(counts)
+    total = int(ends[-1]) if len(ends) else 0
+    if n_orders is not None:
+        total = min(total, n_orders)
+
+    for lo in range(0, total, chunk_size):
+        hi = min(lo + chunk_size, total)
+        n = hi - lo
+        owner = np.searchsorted(ends, np.arange(lo, hi), side="right")
+        pick = draws.products(owner, rng)
+
+        if seasonality is not None:
+            order_date = seasonality.sample(n, rng, today - DATE_WINDOW_DAYS, today,
+                                            today=today).astype("datetime64[D]")
+        else:
+            days_offset = rng.exponential(scale=DATE_DECAY_SCALE, size=n).astype(np.int64)
+            too_old = days_offset > DATE_WINDOW_DAYS
+            days_offset[too_old] = rng.integers(0, DATE_WINDOW_DAYS + 1, size=int(too_old.sum()))
+            order_date = today - days_offset
+
+        yield draws.frame(np.arange(start_order_id + lo, start_order_id + hi), owner, pick,
+                          order_date, draws.quantities(n, rng))
+
+
+def iter_order_events(customers, products, active, counts, rng, seasonality, orders_per_day,
+                      start=None, days=None, start_order_id=1):
+    """Yield orders in timestamp order, one DataFrame per day, from `start` (default today).
+
+    Each day's order count is Poisson with mean `orders_per_day` times the
+    seasonal intensity of that day; customers are picked in proportion to
+    their planned order `counts`. Frames carry an `order_ts` column
+    (datetime64[s]) next to `order_date`. Runs forever unless `days` is given.
+    """
+    draws = OrderDraws(customers, products, active)
+    weights = np.cumsum(counts, dtype=float)
+    day = np.datetime64(start or date.today(), "D")
+    stop = day + days if days is not None else None
+    next_order_id = start_order_id
+
+    while stop is None or day < stop:
+        n = int(rng.poisson(orders_per_day * seasonality.intensity([day])[0]))
+        owner = np.searchsorted(weights, rng.random(n) * weights[-1], side="right")
+        pick = draws.products(owner, rng)
+        order_ts = np.sort(day.astype("datetime64[s]") + seasonality.seconds_of_day(n, rng))
+
+        frame = draws.frame(np.arange(next_order_id, next_order_id + n), owner, pick,
+                            np.full(n, day), draws.quantities(n, rng))
+        frame.insert(3, "order_ts", order_ts)
+        yield frame
+        next_order_id += n
+        day += 1
+
+
+# ------------------------
+# Sharded generation
+# ------------------------
+def plan_shards(n_customers, n_shards, seed):
+    """Split customer ids 1..n_customers into contiguous shards with spawned seeds."""
+    bounds = np.linspace(0, n_customers, n_shards + 1).astype(int)
+    children = np.random.SeedSequence(seed).spawn(n_shards)
+    shards = []
+    for i, child in enumerate(children):
+        customers_seed, orders_seed = child.spawn(2)
+        shards.append({
+            "shard": i,
+            "first_customer_id": int(bounds[i]) + 1,
+            "n_customers": int(bounds[i + 1] - bounds[i]),
+            "customers_seed": customers_seed,
+            "orders_seed": orders_seed,
+        })
+    return shards
+
+
+def _shard_customer_ids(spec):
+    return np.arange(spec["first_customer_id"], spec["first_customer_id"] + spec["n_customers"])
+
+
+def _shard_order_plan(spec):
+    rng = np.random.default_rng(spec["orders_seed"])
+    active, counts = draw_order_counts(_shard_customer_ids(spec), rng)
+    return rng, active, counts
+
+
+def shard_order_total(spec):
+    """Number of orders a shard would generate before the global n_orders cap."""
+    _, _, counts = _shard_order_plan(spec)
+    return int(counts.sum())
+
+
+@traced()
+def generate_shard(spec, products, pools, parts_dir, city_skew=None,
+                   chunk_size=DEFAULT_CHUNK_SIZE, today=None, seasonality=None):
+    """Generate one shard and write its customers/orders part files."""
+    customer_rng = np.random.default_rng(spec["customers_seed"])
+    df_customers = generate_customers(_shard_customer_ids(spec), customer_rng, pools,
+                                      city_skew=city_skew, today=today)
+
+    name = f"{spec['shard']:05d}.parquet"
+    customers_path = os.path.join(parts_dir, "customers-" + name)
+    orders_path = os.path.join(parts_dir, "orders-" + name)
+    storage.write_table(df_customers, "customers", path=customers_path)
+
+    rng, active, counts = _shard_order_plan(spec)
+    with storage.open_writer(orders_path, "orders") as writer:
+        if spec["n_orders"] > 0:
+            for chunk in iter_orders(df_customers, products, active, counts, rng,
+                                     n_orders=spec["n_orders"], chunk_size=chunk_size,
+                                     start_order_id=spec["first_order_id"], today=today,
+                                     seasonality=seasonality):
+                writer.write_table(storage.to_arrow(chunk, "orders"))
+
+    return {
+        "shard": spec["shard"],
+        "customers_file": os.path.basename(customers_path),
+        "orders_file": os.path.basename(orders_path),
+        "customer_id_range": [spec["first_customer_id"], spec["first_customer_id"] + spec["n_customers"] - 1],
+        "order_id_range": [spec["first_order_id"], spec["first_order_id"] + spec["n_orders"] - 1],
+        "customers": spec["n_customers"],
+        "orders": spec["n_orders"],
+    }
+
+
+@traced()
+def generate_sharded(n_customers, products, n_orders, output_dir, seed, n_shards=1,
+                     n_workers=1, chunk_size=DEFAULT_CHUNK_SIZE, combine=True,
+                     locale=DEFAULT_LOCALE, city_skew=None, cache_dir=None, seasonality=None):
+    """Generate customers and orders shard by shard and write a manifest.
+
+    Order ids are assigned from the prefix sum of per-shard order totals, so
+    they are globally unique and contiguous, and the n_orders cap truncates
+    the last shards exactly like the single-process generator does. Parts
+    are typed Parquet files; with `combine` they are also concatenated into
+    customers.parquet and orders.parquet in `output_dir`. Faker pools are built (or loaded from
+    `cache_dir`) once and shared by every shard. Order dates follow `seasonality` when given.
+    """
+    pools = build_faker_pools(seed, locale=locale, cache_dir=cache_dir)
+    parts_dir = os.path.join(output_dir, "parts")
+    os.makedirs(parts_dir, exist_ok=True)
+    shards = plan_shards(n_customers, n_shards, seed)
+    today = date.today()
+
+    pool = ProcessPoolExecutor(max_workers=n_workers) if n_workers > 1 else None
+    run = pool.map if pool else map
+    try:
+        totals = list(run(shard_order_total, shards))
+        next_order_id = 1
+        for spec, total in zip(shards, totals):
+            spec["first_order_id"] = next_order_id
+            spec["n_orders"] = max(0, min(total, n_orders - (next_order_id - 1)))
+            next_order_id += spec["n_orders"]
+
+        n = len(shards)
+        results = list(run(generate_shard, shards, [products] * n, [pools] * n, [parts_dir] * n,
+                           [city_skew] * n, [chunk_size] * n, [today] * n, [seasonality] * n))
+    finally:
+        if pool:
+            pool.shutdown()
+
+    manifest = {
+        "seed": seed,
+        "n_shards": n_shards,
+        "customers": n_customers,
+        "orders": int(sum(r["orders"] for r in results)),
+        "shards": results,
+    }
+    with open(os.path.join(parts_dir, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+
+    if combine:
+        for table in ("customers", "orders"):
+            storage.concat_parquet([os.path.join(parts_dir, r[table + "_file"]) for r in results],
+                                   os.path.join(output_dir, table + ".parquet"), table)
+    return manifest
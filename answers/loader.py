@@ -0,0 +1,153 @@
+"""Shared star-schema loader for the ticket scripts.
+
+`load_star` returns the orders fact table with the customer and product
+dimensions attached. The join is a dense-id lookup (customer_id and
+product_id index straight into position arrays) instead of two hash
+merges, and the joined frame is memoized in the memory-mapped column
+cache under data/cache/, keyed by the content hashes of the source
+files. A full run of the tickets therefore parses and joins each layer
+once.
+"""
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+from pandas.api.extensions import take
+
+import column_cache
+import schema
+import storage
+from tracing import traced
+
+CACHE_DIR = os.path.join(storage.DATA_DIR, "cache")
+# One small JSON entry per source file, so concurrent stages never overwrite each other's digests
+HASH_DIR = os.path.join(CACHE_DIR, "file_hashes")
+
+STAR_TABLES = ("orders", "customers", "products")
+
+
+# ------------------------
+# Source fingerprints
+# ------------------------
+def file_digest(path, block_size=1 << 20):
+    """sha256 of a file, reusing the cached digest while size and mtime are unchanged."""
+    stat = os.stat(path)
+    stamp = [stat.st_size, stat.st_mtime_ns]
+    source = os.path.abspath(path)
+    entry_path = os.path.join(HASH_DIR, hashlib.sha256(source.encode()).hexdigest()[:16] + ".json")
+    try:
+        with open(entry_path) as f:
+            entry = json.load(f)
+        if entry["path"] == source and entry["stamp"] == stamp:
+            return entry["sha256"]
+    except (OSError, ValueError, KeyError):
+        pass
+
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    os.makedirs(HASH_DIR, exist_ok=True)
+    with storage.replace_atomically(entry_path) as tmp, open(tmp, "w") as f:
+        json.dump({"path": source, "stamp": stamp, "sha256": digest.hexdigest()}, f)
+    return digest.hexdigest()
+
+
+def row_digests(table, layer="raw", at=(), columns=None, batch_size=1_000_000):
+    """(rows, {n: sha256 of the values of the first n rows}) of `table`, for each n in `at` and n = rows.
+
+    Appending rows leaves the digest of the earlier rows unchanged, so state
+    folded from a file can tell an append from a rewrite. Cuts beyond the
+    end of the file map to None.
+    """
+    cuts = sorted(set(at))
+    digests, digest, offset = {}, hashlib.sha256(), 0
+    for chunk in storage.iter_table(table, layer, columns=columns, batch_size=batch_size):
+        hashes = pd.util.hash_pandas_object(schema.widen(chunk, table), index=False).to_numpy()
+        start = 0
+        while cuts and cuts[0] <= offset + len(hashes):
+            stop = cuts.pop(0) - offset
+            digest.update(hashes[start:stop].tobytes())
+            digests[offset + stop], start = digest.hexdigest(), stop
+        digest.update(hashes[start:].tobytes())
+        offset += len(hashes)
+    for n in cuts:
+        digests[n] = digest.hexdigest() if n == offset else None
+    digests[offset] = digest.hexdigest()
+    return offset, digests
+
+
+def star_key(layer="raw"):
+    digest = hashlib.sha256(layer.encode())
+    digest.update(schema.fingerprint().encode())
+    for table in STAR_TABLES:
+        path = storage.source_path(table, layer)
+        digest.update(os.path.basename(path).encode())
+        digest.update(file_digest(path).encode())
+    return digest.hexdigest()[:16]
+
+
+# ------------------------
+# Dense-id join
+# ------------------------
+def dense_positions(ids, keys):
+    """Row position in `ids` for every key, or -1 when the key is not present."""
+    ids = np.asarray(ids, dtype=np.int64)
+    keys = np.asarray(keys, dtype=np.int64)
+    size = int(max(ids.max(initial=0), keys.max(initial=0))) + 1
+    lookup = np.full(size, -1, dtype=np.int64)
+    lookup[ids] = np.arange(len(ids))
+    positions = np.full(len(keys), -1, dtype=np.int64)
+    valid = keys >= 0
+    positions[valid] = lookup[keys[valid]]
+    return positions
+
+
+def attach(facts, dim, key):
+    """Left-join `dim` onto `facts` on `key` by positional take."""
+    positions = dense_positions(dim[key].to_numpy(), facts[key].to_numpy())
+    for name in dim.columns.drop(key):
+        # .values keeps categoricals as codes instead of expanding them to strings
+        facts[name] = take(dim[name].values, positions, allow_fill=True)
+    return facts
+
+
+@traced()
+def build_star(layer="raw"):
+    tables = storage.read_tables(["orders", "customers", "products"], layer)
+    orders = tables["orders"]
+    customers = tables["customers"].drop_duplicates(subset="customer_id")
+    products = tables["products"].drop_duplicates(subset="product_id")
+    star = attach(orders, customers, "customer_id")
+    return attach(star, products, "product_id")
+
+
+# ------------------------
+# Cached loader
+# ------------------------
+def remove_stale(path):
+    # Another process may have removed it first
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+@traced()
+def load_star(layer="raw", columns=None):
+    """Orders joined with customers and products for `layer`, reading only `columns`.
+
+    The joined frame is kept in the memory-mapped column cache, so reloads
+    map only the requested columns.
+    """
+    base = os.path.join(storage.COLUMN_CACHE_DIR, f"star_{layer}")
+    key = star_key(layer)
+    star = column_cache.load(base, key, columns)
+    if star is not None:
+        return star
+
+    star = build_star(layer)
+    column_cache.save(star, base, key)
+    return star[columns] if columns is not None else star
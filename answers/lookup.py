@@ -0,0 +1,338 @@
+"""Point and range lookups on the clean layer: customers, products and their orders.
+
+    python answers/lookup.py customer 697
+    python answers/lookup.py product 42 --start 2025-01-01
+    python answers/lookup.py serve --port 8765
+
+The index keeps the clean orders sorted by (customer_id, order_date), so
+the orders of a customer are one contiguous slice, and CSR-style offsets
+per dense id: customer_index[c] holds the customer's row and the
+start/stop of its slice, product_index[p] the same into a list of order
+rows sorted by (product_id, order_date). Customers carry their RFM
+metrics, scores and segment as persisted by ticket-5 (rfm_engine.save_scores),
+products their order count, units and revenue.
+
+Everything is saved with column_cache under data/cache/lookup/ and keyed
+by the clean files and the RFM scores, so reopening memory-maps the arrays instead of
+rebuilding; a lookup is an array index plus a slice. `profile` answers
+"segment, order history and lifetime spend of customer c" and keeps hot
+customers in an LRU cache. `serve` exposes the same queries as JSON over
+the standard library's http.server:
+
+    /customers/<id>                     profile (record, orders, lifetime spend)
+    /customers/<id>/orders?start=&end=  orders in a date range
+    /customers?from=&to=                customers with ids in a range
+    /products/<id>, /products/<id>/orders, /products?from=&to=
+"""
+import argparse
+import functools
+import json
+import os
+import re
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import pandas as pd
+
+import column_cache
+import loader
+import schema
+import storage
+from rfm_engine import load_scores, scores_path
+from timeline import iter_records
+from tracing import traced
+
+LOOKUP_DIR = os.path.join(storage.DATA_DIR, "cache", "lookup")
+FRAMES = ("orders", "customers", "products", "customer_index", "product_index", "product_orders")
+CACHE_SIZE = 4096
+HOST = "127.0.0.1"
+PORT = 8765
+# RFM fields that are integers; customers without orders have none, so they are stored as floats
+RFM_INTEGER_COLUMNS = ("Recency", "Frequency", "R_Score", "F_Score", "M_Score", "RFM_Segment", "RFM_Score")
+
+
+def index_key(layer="clean"):
+    """Key of the index built from the current files of `layer`."""
+    parts = [column_cache.source_key(storage.source_path(table, layer)) for table in ("customers", "products")]
+    parts.append(column_cache.source_key(scores_path()))
+    return column_cache.source_key(storage.source_path("orders", layer), *parts, schema.fingerprint())
+
+
+def _offsets(sorted_ids, table_ids, size):
+    """Dense id -> row in its table (-1 if absent) and start/stop of its run in `sorted_ids`."""
+    counts = np.bincount(sorted_ids, minlength=size)
+    stop = np.cumsum(counts)
+    row = np.full(size, -1, dtype=np.int64)
+    row[table_ids] = np.arange(len(table_ids))
+    return pd.DataFrame({"row": row, "start": stop - counts, "stop": stop})
+
+
+# ------------------------
+# Building
+# ------------------------
+@traced()
+def build(layer="clean"):
+    """The index frames of `layer`, from the order, customer and product tables and the RFM scores."""
+    tables = storage.read_tables(["orders", "customers", "products"], layer)
+    orders = tables["orders"]
+    days = orders["order_date"].to_numpy(dtype="datetime64[s]").view(np.int64)
+    by_customer = np.lexsort((orders["order_id"].to_numpy(), days, orders["customer_id"].to_numpy()))
+    orders = orders.take(by_customer).reset_index(drop=True)
+    customer_ids = orders["customer_id"].to_numpy(dtype=np.int64)
+    product_ids = orders["product_id"].to_numpy(dtype=np.int64)
+
+    customers = tables["customers"].drop_duplicates(subset="customer_id").sort_values("customer_id", ignore_index=True)
+    rfm = load_scores()
+    rfm["Segment"] = rfm["Segment"].astype("category")
+    customers = loader.attach(customers, rfm, "customer_id")
+
+    products = tables["products"].drop_duplicates(subset="product_id").sort_values("product_id", ignore_index=True)
+    products = schema.widen(products, "products")
+    size = int(max(products["product_id"].max(), product_ids.max(initial=-1))) + 1
+    totals = {"orders": np.bincount(product_ids, minlength=size),
+              "units": np.bincount(product_ids, weights=orders["quantity"].to_numpy(dtype=float),
+                                   minlength=size).astype(np.int64),
+              "revenue": np.bincount(product_ids, weights=orders["total_amount"].to_numpy(dtype=float), minlength=size)}
+    positions = products["product_id"].to_numpy(dtype=np.int64)
+    for name, values in totals.items():
+        products[name] = values[positions]
+    products["revenue"] = products["revenue"].round(2)
+
+    # Rows of each product's orders, in date order (the orders are already in date order per customer)
+    product_orders = np.lexsort((days[by_customer], product_ids))
+    customer_size = int(max(customers["customer_id"].max(), customer_ids.max(initial=-1))) + 1
+    return {
+        "orders": orders,
+        "customers": customers,
+        "products": products,
+        "customer_index": _offsets(customer_ids, customers["customer_id"].to_numpy(dtype=np.int64), customer_size),
+        "product_index": _offsets(product_ids[product_orders], positions, size),
+        "product_orders": pd.DataFrame({"order_row": product_orders}),
+    }
+
+
+# ------------------------
+# Queries
+# ------------------------
+def _category(categories):
+    return lambda code: categories[code] if code >= 0 else None
+
+
+def _date(value):
+    return None if np.isnat(value) else str(value)
+
+
+def _number(value):
+    value = value.item()
+    return None if value != value else value
+
+
+def _integer(value):
+    return None if value != value else int(value)
+
+
+class LookupIndex:
+    """Queries over the index frames (see build); `open` loads or builds them."""
+
+    def __init__(self, frames, cache_size=CACHE_SIZE):
+        self.orders = frames["orders"]
+        self.customers = frames["customers"]
+        self.products = frames["products"]
+        self._customer_index = {name: col.to_numpy() for name, col in frames["customer_index"].items()}
+        self._product_index = {name: col.to_numpy() for name, col in frames["product_index"].items()}
+        self._product_orders = frames["product_orders"]["order_row"].to_numpy()
+        self._order_dates = self.orders["order_date"].to_numpy()
+        self._customer_ids = self.customers["customer_id"].to_numpy()
+        self._product_ids = self.products["product_id"].to_numpy()
+        # Plain arrays (codes for categoricals) make a record a few array reads
+        self._customer_columns = self._columns(self.customers)
+        self._product_columns = self._columns(self.products)
+        self.profile = functools.lru_cache(maxsize=cache_size)(self._profile)
+
+    @classmethod
+    def open(cls, layer="clean", cache_size=CACHE_SIZE):
+        key = index_key(layer)
+        frames = {name: column_cache.load(os.path.join(LOOKUP_DIR, layer, name), key) for name in FRAMES}
+        if any(frame is None for frame in frames.values()):
+            for name, frame in build(layer).items():
+                column_cache.save(frame, os.path.join(LOOKUP_DIR, layer, name), key)
+            frames = {name: column_cache.load(os.path.join(LOOKUP_DIR, layer, name), key) for name in FRAMES}
+        return cls(frames, cache_size)
+
+    @staticmethod
+    def _columns(frame):
+        """Column name -> (array, converter to a JSON-ready value)."""
+        columns = {}
+        for name, col in frame.items():
+            if isinstance(col.dtype, pd.CategoricalDtype):
+                columns[name] = (col.array.codes, _category(col.cat.categories.to_numpy()))
+            elif pd.api.types.is_datetime64_any_dtype(col):
+                columns[name] = (col.to_numpy(), _date)
+            elif name in RFM_INTEGER_COLUMNS:
+                columns[name] = (col.to_numpy(), _integer)
+            else:
+                columns[name] = (col.to_numpy(), _number)
+        return columns
+
+    @staticmethod
+    def _record(columns, row):
+        return {name: convert(values[row]) for name, (values, convert) in columns.items()}
+
+    @staticmethod
+    def _entry(index, key):
+        key = int(key)
+        if not 0 <= key < len(index["row"]) or index["row"][key] < 0:
+            return None
+        return index["row"][key], index["start"][key], index["stop"][key]
+
+    @staticmethod
+    def _between_dates(dates, start, stop, first=None, last=None):
+        """Narrow the sorted `dates[start:stop]` to first <= date <= last (dates or timestamps)."""
+        if first is not None:
+            start += int(np.searchsorted(dates[start:stop], np.datetime64(pd.Timestamp(first)), side="left"))
+        if last is not None:
+            last = pd.Timestamp(last)
+            # A bare date includes the whole day
+            last = last + pd.Timedelta(days=1) if last == last.normalize() else last + pd.Timedelta(seconds=1)
+            stop = start + int(np.searchsorted(dates[start:stop], np.datetime64(last), side="left"))
+        return start, max(start, stop)
+
+    def customer(self, customer_id):
+        """Customer record with RFM metrics and segment, or None for an unknown id."""
+        entry = self._entry(self._customer_index, customer_id)
+        return None if entry is None else self._record(self._customer_columns, entry[0])
+
+    def customer_orders(self, customer_id, start=None, end=None):
+        """The customer's orders between the dates `start` and `end` (inclusive), oldest first."""
+        entry = self._entry(self._customer_index, customer_id)
+        if entry is None:
+            return self.orders.iloc[:0]
+        first, last = self._between_dates(self._order_dates, entry[1], entry[2], start, end)
+        return self.orders.iloc[first:last]
+
+    def product(self, product_id):
+        """Product record with its order count, units sold and revenue, or None for an unknown id."""
+        entry = self._entry(self._product_index, product_id)
+        return None if entry is None else self._record(self._product_columns, entry[0])
+
+    def product_orders(self, product_id, start=None, end=None):
+        entry = self._entry(self._product_index, product_id)
+        if entry is None:
+            return self.orders.iloc[:0]
+        rows = self._product_orders[entry[1]:entry[2]]
+        first, last = self._between_dates(self._order_dates[rows], 0, len(rows), start, end)
+        return self.orders.take(rows[first:last])
+
+    def customers_between(self, first, last):
+        """Customers with first <= customer_id <= last."""
+        ids = self._customer_ids
+        return self.customers.iloc[np.searchsorted(ids, first, side="left"):np.searchsorted(ids, last, side="right")]
+
+    def products_between(self, first, last):
+        ids = self._product_ids
+        return self.products.iloc[np.searchsorted(ids, first, side="left"):np.searchsorted(ids, last, side="right")]
+
+    def _profile(self, customer_id):
+        record = self.customer(customer_id)
+        if record is None:
+            return None
+        orders = self.customer_orders(customer_id)
+        return {
+            "customer": record,
+            "lifetime_spend": round(float(schema.widen(orders, "orders")["total_amount"].sum()), 2),
+            "orders": _rows_json(orders),
+        }
+
+
+# ------------------------
+# HTTP
+# ------------------------
+def _rows_json(frame):
+    frame = schema.widen(frame, "orders")
+    integers = [name for name in RFM_INTEGER_COLUMNS if name in frame]
+    return list(iter_records([frame.astype(dict.fromkeys(integers, "Int64"))]))
+
+
+# (path pattern, handler(index, id or None, query parameters))
+ROUTES = [
+    (re.compile(r"/customers/(\d+)$"), lambda index, key, q: index.profile(key)),
+    (re.compile(r"/customers/(\d+)/orders$"),
+     lambda index, key, q: index.customer(key) and _rows_json(index.customer_orders(key, q.get("start"), q.get("end")))),
+    (re.compile(r"/customers$"),
+     lambda index, key, q: _rows_json(index.customers_between(int(q["from"]), int(q["to"])))),
+    (re.compile(r"/products/(\d+)$"), lambda index, key, q: index.product(key)),
+    (re.compile(r"/products/(\d+)/orders$"),
+     lambda index, key, q: index.product(key) and _rows_json(index.product_orders(key, q.get("start"), q.get("end")))),
+    (re.compile(r"/products$"),
+     lambda index, key, q: _rows_json(index.products_between(int(q["from"]), int(q["to"])))),
+]
+
+
+def _handler(index):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlparse(self.path)
+            query = {name: values[-1] for name, values in parse_qs(url.query).items()}
+            for pattern, route in ROUTES:
+                match = pattern.match(url.path)
+                if match:
+                    try:
+                        result = route(index, int(match.group(1)) if pattern.groups else None, query)
+                    except (KeyError, ValueError) as e:
+                        return self._send(400, {"error": f"bad query: {e}"})
+                    if result is None:
+                        return self._send(404, {"error": "not found"})
+                    return self._send(200, result)
+            self._send(404, {"error": f"unknown path {url.path}"})
+
+        def _send(self, status, payload):
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    return Handler
+
+
+def serve(index, host=HOST, port=PORT):
+    """Serve `index` as JSON on http://host:port until interrupted."""
+    server = ThreadingHTTPServer((host, port), _handler(index))
+    print(f"Serving lookups on http://{host}:{server.server_port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Point lookups on the clean customers, products and orders.")
+    parser.add_argument("--layer", default="clean")
+    commands = parser.add_subparsers(dest="command", required=True)
+    for name in ("customer", "product"):
+        command = commands.add_parser(name, help=f"print one {name} and its orders as JSON")
+        command.add_argument("id", type=int)
+        command.add_argument("--start", help="first order date, YYYY-MM-DD")
+        command.add_argument("--end", help="last order date, YYYY-MM-DD")
+    command = commands.add_parser("serve", help="serve lookups over HTTP")
+    command.add_argument("--host", default=HOST)
+    command.add_argument("--port", type=int, default=PORT)
+    args = parser.parse_args(argv)
+
+    index = LookupIndex.open(args.layer)
+    if args.command == "serve":
+        serve(index, args.host, args.port)
+        return
+    record = getattr(index, args.command)(args.id)
+    if record is None:
+        parser.exit(1, f"{args.command} {args.id} not found\n")
+    orders = getattr(index, f"{args.command}_orders")(args.id, args.start, args.end)
+    print(json.dumps({args.command: record, "orders": _rows_json(orders)}, indent=1))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+"""Dependency-graph runner for the ticket scripts.
+
+Each ticket is a `Stage` declaring the files it reads (data and code) and
+the files it writes. A stage depends on the stages producing its inputs;
+stages whose dependencies are done run concurrently, each script in its
+own interpreter. A stage is skipped when the fingerprints (sha256) of its
+inputs match the last successful run and its outputs still exist. Every
+run writes a report with the status, wall time, CPU time and peak RSS of
+each stage.
+"""
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+
+import loader
+import storage
+import tracing
+
+PIPELINE_DIR = os.path.join(storage.DATA_DIR, "pipeline")
+STATE_PATH = os.path.join(PIPELINE_DIR, "state.json")
+REPORT_PATH = os.path.join(PIPELINE_DIR, "run_report.json")
+LOG_DIR = os.path.join(PIPELINE_DIR, "logs")
+
+# ru_maxrss is reported in kilobytes on Linux and in bytes on macOS
+RSS_UNIT = 1 if sys.platform == "darwin" else 1024
+
+
+@dataclass
+class Stage:
+    name: str
+    script: str                                   # python script run for this stage
+    inputs: list = field(default_factory=list)    # files read (data and imported modules)
+    outputs: list = field(default_factory=list)   # files written
+
+
+# ------------------------
+# Graph
+# ------------------------
+def build_graph(stages):
+    """{stage name: set of upstream stage names}, from matching inputs to outputs."""
+    producers = {}
+    for stage in stages:
+        for path in stage.outputs:
+            if path in producers:
+                raise ValueError(f"{path} is written by both {producers[path]} and {stage.name}")
+            producers[path] = stage.name
+
+    graph = {stage.name: {producers[path] for path in stage.inputs
+                          if path in producers and producers[path] != stage.name}
+             for stage in stages}
+
+    # Kahn's algorithm, only to reject cycles up front
+    remaining = {name: set(deps) for name, deps in graph.items()}
+    while remaining:
+        ready = [name for name, deps in remaining.items() if not deps]
+        if not ready:
+            raise ValueError(f"Dependency cycle between stages: {sorted(remaining)}")
+        for name in ready:
+            del remaining[name]
+        for deps in remaining.values():
+            deps.difference_update(ready)
+    return graph
+
+
+def with_upstream(graph, names):
+    """`names` plus every stage they transitively depend on."""
+    selected, todo = set(), list(names)
+    while todo:
+        name = todo.pop()
+        if name not in graph:
+            raise KeyError(f"Unknown stage {name!r}; stages: {sorted(graph)}")
+        if name not in selected:
+            selected.add(name)
+            todo.extend(graph[name])
+    return selected
+
+
+# ------------------------
+# Fingerprints
+# ------------------------
+def fingerprint(stage):
+    paths = [stage.script] + stage.inputs
+    return {path: loader.file_digest(path) if os.path.exists(path) else None for path in paths}
+
+
+def load_state(path=STATE_PATH):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_json(obj, path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with storage.replace_atomically(path) as tmp, open(tmp, "w") as f:
+        json.dump(obj, f, indent=2)
+
+
+def is_fresh(stage, prints, state):
+    return state.get(stage.name) == prints and all(os.path.exists(path) for path in stage.outputs)
+
+
+# ------------------------
+# Running one stage
+# ------------------------
+def run_stage(stage):
+    """Run the stage script in a child interpreter; return its resource usage."""
+    os.makedirs(LOG_DIR, exist_ok=True)
+    log_path = os.path.join(LOG_DIR, f"{stage.name}.log")
+    env = dict(os.environ, MPLBACKEND="Agg")
+    start = time.perf_counter()
+    with open(log_path, "w") as log, tracing.span(f"stage: {stage.name}"):
+        proc = subprocess.Popen([sys.executable, stage.script], stdout=log, stderr=subprocess.STDOUT, env=env)
+        if hasattr(os, "wait4"):
+            # wait4 returns the rusage of this child only, even with siblings running
+            _, status, usage = os.wait4(proc.pid, 0)
+            proc.returncode = os.waitstatus_to_exitcode(status)
+            cpu_seconds = usage.ru_utime + usage.ru_stime
+            peak_rss_mb = usage.ru_maxrss * RSS_UNIT / 2 ** 20
+        else:
+            proc.wait()
+            cpu_seconds = peak_rss_mb = None
+    return {
+        "status": "ok" if proc.returncode == 0 else "failed",
+        "returncode": proc.returncode,
+        "wall_seconds": round(time.perf_counter() - start, 3),
+        "cpu_seconds": None if cpu_seconds is None else round(cpu_seconds, 3),
+        "peak_rss_mb": None if peak_rss_mb is None else round(peak_rss_mb, 1),
+        "log": log_path,
+        "trace": tracing.trace_path(stage.script, proc.pid) if tracing.ENABLED else None,
+    }
+
+
+# ------------------------
+# Running the graph
+# ------------------------
+def run_pipeline(stages, only=None, force=False, workers=None):
+    """Run `stages` (or `only` these and their upstream stages) in dependency order.
+
+    Returns the run report: one record per stage with status ok, skipped,
+    failed or blocked (an upstream stage failed).
+    """
+    graph = build_graph(stages)
+    by_name = {stage.name: stage for stage in stages}
+    selected = with_upstream(graph, only) if only else set(graph)
+    state = load_state()
+    done, failed, running, report = set(), set(), {}, {}
+
+    def launch(pool):
+        # Repeat until nothing changes: a skipped or blocked stage may unlock others
+        progress = True
+        while progress:
+            progress = False
+            for name in sorted(selected - done - failed - set(running.values())):
+                if graph[name] & failed:
+                    failed.add(name)
+                    report[name] = {"status": "blocked"}
+                    progress = True
+                elif graph[name] <= done:
+                    stage = by_name[name]
+                    prints = fingerprint(stage)
+                    if not force and is_fresh(stage, prints, state):
+                        done.add(name)
+                        report[name] = {"status": "skipped"}
+                        progress = True
+                    else:
+                        running[pool.submit(run_stage, stage)] = name
+                        state[name] = prints
+
+    with ThreadPoolExecutor(max_workers=workers or len(selected)) as pool:
+        launch(pool)
+        while running:
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                name = running.pop(future)
+                report[name] = future.result()
+                if report[name]["status"] == "ok":
+                    done.add(name)
+                else:
+                    failed.add(name)
+                    state.pop(name, None)
+                print(f"[{name}] {report[name]['status']} in {report[name]['wall_seconds']}s")
+            launch(pool)
+
+    # Fingerprints are only kept for stages that succeeded
+    save_json({name: prints for name, prints in state.items() if name not in failed}, STATE_PATH)
+    records = [{"stage": name, **report[name]} for name in by_name if name in report]
+    save_json({"finished_at": time.strftime("%Y-%m-%dT%H:%M:%S"), "stages": records}, REPORT_PATH)
+    if tracing.ENABLED:
+        # One timeline: the runner's stage spans plus the spans of every stage process
+        runner = tracing.write()
+        tracing.merge([runner] + [r["trace"] for r in records if r.get("trace")],
+                      os.path.join(tracing.TRACE_DIR, f"pipeline-{os.getpid()}.json"))
+    return records
@@ -0,0 +1,148 @@
+"""Chart specs rendered concurrently on the headless Agg backend.
+
+Each chart is a `ChartSpec`: a data function returning the aggregated
+series to draw, plus its style. `render_charts` evaluates the data
+functions, hashes each result together with its style and only redraws
+charts whose hash differs from the previous run (or whose PNG is
+missing). Charts that need redrawing are rendered in a process pool, so
+regenerating every chart takes about as long as the slowest one.
+"""
+import hashlib
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+import seaborn as sns
+
+import storage
+from tracing import span, traced
+
+PLOT_DIR = "data/plots"
+# One file per chart holding the content hash it was last rendered from, so
+# scripts rendering into the same directory at once never overwrite each other's entries
+RENDER_CACHE = ".render_cache"
+
+
+@dataclass
+class ChartSpec:
+    name: str                      # output file name (without .png) in the plot directory
+    data: Callable                 # returns the aggregated Series/DataFrame to draw
+    kind: str                      # "bar", "barh", "line", "hist", "box", "scatter" or "heatmap"
+    title: str
+    xlabel: Optional[str] = None
+    ylabel: Optional[str] = None
+    figsize: tuple = (8, 5)
+    options: dict = field(default_factory=dict)  # x/y/hue columns, rotation, alpha...
+
+
+def histogram(series, bins):
+    """Aggregate a column into histogram bins so only the counts reach the renderer."""
+    counts, edges = np.histogram(series.dropna().to_numpy(dtype=float), bins=bins)
+    return pd.DataFrame({"left": edges[:-1], "right": edges[1:], "count": counts})
+
+
+# ------------------------
+# Rendering (runs in worker processes)
+# ------------------------
+def _draw(kind, data, options):
+    if kind == "hist":
+        edges = np.append(data["left"].to_numpy(), data["right"].to_numpy()[-1:])
+        plt.hist(data["left"], bins=edges, weights=data["count"], edgecolor="black")
+    elif kind == "box":
+        sns.boxplot(data=data, x=options["x"], y=options["y"])
+    elif kind == "scatter":
+        sns.scatterplot(data=data, x=options["x"], y=options["y"], hue=options.get("hue"),
+                        alpha=options.get("alpha"))
+    elif kind == "heatmap":
+        sns.heatmap(data, cmap=options.get("cmap", "Blues"), annot=options.get("annot", False),
+                    fmt=options.get("fmt", ".2g"))
+    elif kind == "line":
+        data.plot()
+    else:
+        data.plot(kind=kind)
+
+
+@traced()
+def render(style, data, path):
+    kind, title, xlabel, ylabel, figsize, options = style
+    plt.figure(figsize=figsize)
+    _draw(kind, data, options)
+    plt.title(title)
+    if xlabel is not None:
+        plt.xlabel(xlabel)
+    if ylabel is not None:
+        plt.ylabel(ylabel)
+    if "rotation" in options:
+        plt.xticks(rotation=options["rotation"])
+    plt.tight_layout()
+    plt.savefig(path)
+    plt.close()
+    return path
+
+
+# ------------------------
+# Orchestration
+# ------------------------
+def _style(spec):
+    return (spec.kind, spec.title, spec.xlabel, spec.ylabel, tuple(spec.figsize), spec.options)
+
+
+def _cached_hash(cache_dir, name):
+    try:
+        with open(os.path.join(cache_dir, name)) as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+def content_hash(data, style):
+    digest = hashlib.sha256(repr(style).encode())
+    digest.update(pd.util.hash_pandas_object(data, index=True).to_numpy().tobytes())
+    if isinstance(data, pd.DataFrame):
+        digest.update(repr(list(data.columns)).encode())
+    return digest.hexdigest()
+
+
+@traced()
+def render_charts(specs, plot_dir=PLOT_DIR, workers=None):
+    """Render `specs` into `plot_dir`, skipping unchanged charts.
+
+    Returns {chart name: "rendered" | "unchanged"}.
+    """
+    cache_dir = os.path.join(plot_dir, RENDER_CACHE)
+    os.makedirs(cache_dir, exist_ok=True)
+
+    status, jobs, keys = {}, [], {}
+    for spec in specs:
+        with span(f"chart data: {spec.name}") as s:
+            data, style = spec.data(), _style(spec)
+            s.set(rows=len(data))
+        path = os.path.join(plot_dir, spec.name + ".png")
+        key = content_hash(data, style)
+        if _cached_hash(cache_dir, spec.name) == key and os.path.exists(path):
+            status[spec.name] = "unchanged"
+            continue
+        status[spec.name], keys[spec.name] = "rendered", key
+        jobs.append((style, data, path))
+
+    # The ticket scripts have no __main__ guard, so worker processes must be
+    # forked; where fork is unavailable charts are rendered one after another
+    if len(jobs) > 1 and workers != 1 and "fork" in multiprocessing.get_all_start_methods():
+        with ProcessPoolExecutor(max_workers=min(len(jobs), workers or os.cpu_count() or 1),
+                                 mp_context=multiprocessing.get_context("fork")) as pool:
+            list(pool.map(render, *zip(*jobs)))
+    else:
+        for job in jobs:
+            render(*job)
+
+    for name, key in keys.items():
+        with storage.replace_atomically(os.path.join(cache_dir, name)) as tmp, open(tmp, "w") as f:
+            f.write(key)
+    return status
@@ -0,0 +1,87 @@
+"""Mergeable approximate quantile sketch (KLL style).
+
+A `KLLSketch` summarizes a stream of numbers in O(k log(n/k)) memory.
+Sketches built per chunk or per shard can be merged, and the rank error
+of `quantile` is about 1.7/k of the stream length with high probability,
+so `KLLSketch(eps=0.01)` answers quantiles within roughly one percentile.
+"""
+import math
+
+import numpy as np
+
+DEFAULT_EPS = 0.01
+SHRINK = 2 / 3
+
+
+class KLLSketch:
+    def __init__(self, eps=DEFAULT_EPS, seed=0):
+        self.eps = eps
+        self.k = max(8, math.ceil(1.7 / eps))
+        self.levels = [np.empty(0)]
+        self.n = 0
+        self._rng = np.random.default_rng(seed)
+
+    # ------------------------
+    # Building
+    # ------------------------
+    def _capacity(self, level):
+        depth = len(self.levels) - level - 1
+        return max(2, math.ceil(self.k * SHRINK ** depth))
+
+    def _compress(self):
+        # Adding a level shrinks the capacity of every level below it, so sweep until stable
+        full = True
+        while full:
+            full = False
+            for level in range(len(self.levels)):
+                items = self.levels[level]
+                if len(items) < self._capacity(level):
+                    continue
+                full = True
+                if level + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+                items = np.sort(items)
+                # Keep an odd leftover at this level so every promoted pair is complete
+                leftover = items[:len(items) % 2]
+                items = items[len(leftover):]
+                promoted = items[self._rng.integers(0, 2)::2]
+                self.levels[level] = leftover
+                self.levels[level + 1] = np.concatenate([self.levels[level + 1], promoted])
+
+    def update(self, values):
+        values = np.asarray(values, dtype=float)
+        values = values[~np.isnan(values)]
+        self.n += len(values)
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self._compress()
+        return self
+
+    def merge(self, other):
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0))
+        for level, items in enumerate(other.levels):
+            self.levels[level] = np.concatenate([self.levels[level], items])
+        self.n += other.n
+        self._compress()
+        return self
+
+    # ------------------------
+    # Queries
+    # ------------------------
+    def _weighted(self):
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(items), 2.0 ** level)
+                                  for level, items in enumerate(self.levels)])
+        order = np.argsort(items, kind="stable")
+        return items[order], np.cumsum(weights[order])
+
+    def quantile(self, q):
+        """Approximate value at quantile(s) `q` in [0, 1]."""
+        items, cum = self._weighted()
+        if len(items) == 0:
+            return np.full(np.shape(q), np.nan)
+        target = np.asarray(q, dtype=float) * cum[-1]
+        return items[np.minimum(np.searchsorted(cum, target, side="left"), len(items) - 1)]
+
+    def size(self):
+        return sum(len(items) for items in self.levels)
@@ -0,0 +1,253 @@
+"""RFM metrics, scoring and an incrementally updatable per-customer state.
+
+`RFMState` keeps, for every customer_id, the last order day, the order
+count and the spend in integer cents in dense arrays. Folding in a batch
+of new orders costs O(batch) and turning the state into the RFM table
+costs O(customers), so a daily refresh never rescans the order history.
+A full recompute is the same fold over all orders, which keeps the two
+paths bit-identical (cents are exact, float sums are not order-independent).
+The saved state records a digest of the order rows it was folded from, and
+`fold_appended` only folds new orders when those rows are still the start
+of the file; otherwise the state must be rebuilt.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+import loader
+import storage
+from quantiles import DEFAULT_EPS, KLLSketch
+from tracing import traced
+
+ORDER_COLUMNS = ["order_id", "customer_id", "order_date", "total_amount"]
+# Scored RFM table of the clean layer written by ticket-5 (read by lookup)
+SCORES_PATH = os.path.join(storage.DATA_DIR, "clean", "rfm_table.parquet")
+
+
+# ------------------------
+# Per-customer state
+# ------------------------
+class RFMState:
+    NO_ORDER = np.iinfo(np.int32).min
+
+    def __init__(self, size=0):
+        self.last_day = np.full(size, self.NO_ORDER, dtype=np.int32)
+        self.count = np.zeros(size, dtype=np.int32)
+        self.cents = np.zeros(size, dtype=np.int64)
+        self.max_order_id = 0
+        # Digest of the ORDER_COLUMNS of the order rows folded so far (see loader.row_digests)
+        self.source_digest = ""
+
+    @classmethod
+    def from_orders(cls, orders):
+        return cls().fold(orders)
+
+    @classmethod
+    def from_totals(cls, customer_ids, last_day, count, cents, max_order_id=0):
+        """State from per-customer totals already reduced elsewhere (e.g. parallel.aggregate)."""
+        customer_ids = np.asarray(customer_ids, dtype=np.int64)
+        state = cls(int(customer_ids.max()) + 1 if len(customer_ids) else 0)
+        state.last_day[customer_ids] = last_day
+        state.count[customer_ids] = count
+        state.cents[customer_ids] = cents
+        state.max_order_id = int(max_order_id)
+        return state
+
+    def _grow(self, size):
+        if size > len(self.count):
+            extra = size - len(self.count)
+            self.last_day = np.concatenate([self.last_day, np.full(extra, self.NO_ORDER, dtype=np.int32)])
+            self.count = np.concatenate([self.count, np.zeros(extra, dtype=np.int32)])
+            self.cents = np.concatenate([self.cents, np.zeros(extra, dtype=np.int64)])
+
+    def fold(self, orders):
+        """Add a batch of orders (customer_id, order_date, total_amount, order_id)."""
+        if len(orders) == 0:
+            return self
+        ids = orders["customer_id"].to_numpy(dtype=np.int64)
+        days = orders["order_date"].to_numpy(dtype="datetime64[D]").astype(np.int32)
+        cents = np.rint(orders["total_amount"].to_numpy(dtype=float) * 100).astype(np.int64)
+
+        size = int(ids.max()) + 1
+        self._grow(size)
+        np.maximum.at(self.last_day, ids, days)
+        self.count[:size] += np.bincount(ids, minlength=size).astype(np.int32)
+        np.add.at(self.cents, ids, cents)
+        self.max_order_id = max(self.max_order_id, int(orders["order_id"].max()))
+        return self
+
+    @property
+    def rows(self):
+        """Number of order rows folded in."""
+        return int(self.count.sum())
+
+    def fold_appended(self, layer="clean"):
+        """Fold the orders appended to `layer` since the state was saved; returns their count.
+
+        Returns None, leaving the state untouched, when the rows already
+        folded are no longer the first rows of the orders file or rows other
+        than new order ids were added, i.e. the file was regenerated.
+        """
+        rows, digests = loader.row_digests("orders", layer, at=[self.rows], columns=ORDER_COLUMNS)
+        if not self.source_digest or digests[self.rows] != self.source_digest:
+            return None
+        new_orders = storage.read_table("orders", layer, columns=ORDER_COLUMNS,
+                                        filters=[("order_id", ">", self.max_order_id)])
+        if self.rows + len(new_orders) != rows:
+            return None
+        self.fold(new_orders)
+        self.source_digest = digests[rows]
+        return len(new_orders)
+
+    def table(self):
+        """Recency (days before the latest order), Frequency and Monetary per customer."""
+        active = np.flatnonzero(self.count > 0)
+        latest = self.last_day[active].max() if len(active) else 0
+        return pd.DataFrame({
+            "customer_id": active,
+            "Recency": (latest - self.last_day[active]).astype(np.int64),
+            "Frequency": self.count[active].astype(np.int64),
+            "Monetary": self.cents[active] / 100,
+        })
+
+    # ------------------------
+    # Persistence
+    # ------------------------
+    def save(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = path + ".tmp.npz"
+        np.savez(tmp, last_day=self.last_day, count=self.count, cents=self.cents,
+                 max_order_id=np.array(self.max_order_id), source_digest=np.array(self.source_digest))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        state = cls()
+        with np.load(path) as data:
+            state.last_day = data["last_day"]
+            state.count = data["count"]
+            state.cents = data["cents"]
+            state.max_order_id = int(data["max_order_id"])
+            # States saved before the digest existed can only be rebuilt
+            state.source_digest = str(data["source_digest"]) if "source_digest" in data else ""
+        return state
+
+
+# ------------------------
+# Scoring
+# ------------------------
+# Segment rules, checked top to bottom; the first match wins. Each rule maps
+# a score column to an inclusive (min, max) range, None meaning unbounded.
+SEGMENT_RULES = [
+    ("Champions", {"RFM_Score": (12, None)}),
+    ("Loyal", {"RFM_Score": (9, None)}),
+    ("Potential Loyalist", {"RFM_Score": (6, None)}),
+    ("New Customer", {"R_Score": (4, None), "F_Score": (None, 2)}),
+    ("At Risk", {"R_Score": (None, 2), "F_Score": (3, None)}),
+]
+DEFAULT_SEGMENT = "Hibernating"
+
+
+def rule_mask(rfm, ranges):
+    mask = np.ones(len(rfm), dtype=bool)
+    for column, (low, high) in ranges.items():
+        values = rfm[column].to_numpy()
+        if low is not None:
+            mask &= values >= low
+        if high is not None:
+            mask &= values <= high
+    return mask
+
+
+def assign_segments(rfm, rules=SEGMENT_RULES, default=DEFAULT_SEGMENT):
+    """Segment label per row from a declarative rule table, without row-wise apply."""
+    return np.select([rule_mask(rfm, ranges) for _, ranges in rules],
+                     [label for label, _ in rules], default=default)
+
+
+def _add_segments(rfm, rules):
+    # e.g. R=5, F=3, M=4 -> 534
+    rfm["RFM_Segment"] = rfm["R_Score"] * 100 + rfm["F_Score"] * 10 + rfm["M_Score"]
+    rfm["RFM_Score"] = rfm["R_Score"] + rfm["F_Score"] + rfm["M_Score"]
+    rfm["Segment"] = assign_segments(rfm, rules)
+    return rfm
+
+
+@traced()
+def score_rfm(rfm, rules=SEGMENT_RULES):
+    """Add 1-5 R/F/M quintile scores, the RFM code/score and the segment label."""
+    rfm = rfm.copy()
+    rfm["R_Score"] = pd.qcut(rfm["Recency"], 5, labels=[5,4,3,2,1]).astype(int)
+    rfm["F_Score"] = pd.qcut(rfm["Frequency"].rank(method="first"), 5, labels=[1,2,3,4,5]).astype(int)
+    rfm["M_Score"] = pd.qcut(rfm["Monetary"], 5, labels=[1,2,3,4,5]).astype(int)
+    return _add_segments(rfm, rules)
+
+
+def save_scores(rfm, path=SCORES_PATH):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with storage.replace_atomically(path) as tmp:
+        rfm.to_parquet(tmp, index=False)
+
+
+def scores_path(path=SCORES_PATH):
+    """`path`, after checking that ticket-5 has written the scores there."""
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"{path} not found; run answers/ticket-5-RFM.py to score the customers first")
+    return path
+
+
+def load_scores(path=SCORES_PATH):
+    """The scored RFM table saved by save_scores."""
+    return pd.read_parquet(scores_path(path))
+
+
+# ------------------------
+# Approximate scoring
+# ------------------------
+# Score column -> (metric, lower metric value means a higher score)
+SCORE_METRICS = {
+    "R_Score": ("Recency", True),
+    "F_Score": ("Frequency", False),
+    "M_Score": ("Monetary", False),
+}
+QUINTILES = [0.2, 0.4, 0.6, 0.8]
+
+
+def build_sketches(rfm_chunks, eps=DEFAULT_EPS):
+    """One KLL sketch per RFM metric over an iterable of RFM table chunks.
+
+    Sketches from different chunks or shards can be combined with merge().
+    """
+    sketches = {metric: KLLSketch(eps, seed=i) for i, (metric, _) in enumerate(SCORE_METRICS.values())}
+    for chunk in rfm_chunks:
+        for metric, sketch in sketches.items():
+            sketch.update(chunk[metric].to_numpy())
+    return sketches
+
+
+@traced()
+def approx_score_rfm(rfm, eps=DEFAULT_EPS, chunk_size=1_000_000, rules=SEGMENT_RULES):
+    """score_rfm with quintile edges taken from mergeable sketches instead of a full sort.
+
+    Edges are within about `eps` of the exact quintiles in rank. Ties are
+    not broken by row order (exact F scoring ranks with method="first"),
+    so tied customers always share a score.
+    """
+    chunks = [rfm.iloc[lo:lo + chunk_size] for lo in range(0, len(rfm), chunk_size)]
+    sketches = build_sketches(chunks, eps)
+    rfm = rfm.copy()
+    for score, (metric, reverse) in SCORE_METRICS.items():
+        edges = sketches[metric].quantile(QUINTILES)
+        bins = np.searchsorted(edges, rfm[metric].to_numpy(), side="left") + 1
+        rfm[score] = 6 - bins if reverse else bins
+    return _add_segments(rfm, rules)
+
+
+def compare_scores(exact, approx):
+    """How many customers got a different score or segment from the approximation."""
+    rows = {}
+    for column in list(SCORE_METRICS) + ["Segment"]:
+        changed = int((exact[column].to_numpy() != approx[column].to_numpy()).sum())
+        rows[column] = {"changed": changed, "share": changed / max(len(exact), 1)}
+    return pd.DataFrame.from_dict(rows, orient="index")
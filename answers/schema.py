@@ -0,0 +1,160 @@
+"""Central schema of the customers, products and orders tables.
+
+Every column has its storage type (Arrow, used for Parquet), its compact
+in-memory dtype and its description, which is the data dictionary of the
+cleaning ticket. `apply` converts a frame to the in-memory dtypes and is
+called by every reader in storage: int32 ids, small unsigned integers,
+float32 amounts, categoricals for low-cardinality strings and second
+resolution dates (the coarsest unit pandas supports). Readers choose the
+money dtype once per file (see storage.money_dtypes), so every chunk of
+a table comes back with the same dtype. The constraints
+(nullability, uniqueness, bounds, allowed values, foreign keys) are
+checked by the validation module.
+"""
+import hashlib
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+DATE_DTYPE = "datetime64[s]"
+# float32 rounds back to the same cent only below 2**17 (its spacing is 1/128 there)
+FLOAT32_CENT_EXACT = 2 ** 17
+
+
+@dataclass(frozen=True)
+class Column:
+    name: str
+    arrow: pa.DataType
+    dtype: str                         # in-memory pandas dtype
+    description: str
+    nullable: bool = True
+    unique: bool = False
+    min: Optional[float] = None
+    max: Optional[float] = None
+    allowed: Optional[tuple] = None    # closed set of values for categoricals
+    decimals: Optional[int] = None     # money columns are exact to the cent
+    references: Optional[str] = None  # "table.column" this column is a foreign key to
+
+
+TABLES = {
+    "customers": [
+        Column("customer_id", pa.int32(), "int32", "Unique ID for customer", nullable=False, unique=True, min=1),
+        Column("name", pa.string(), "object", "Customer full name"),
+        Column("age", pa.int16(), "uint8", "Customer age (years)", min=0, max=120),
+        Column("gender", pa.dictionary(pa.int8(), pa.string()), "category",
+               "Customer gender (Male/Female/Other)", allowed=("Male", "Female", "Other")),
+        Column("location", pa.dictionary(pa.int32(), pa.string()), "category", "Customer location (city/state)"),
+        Column("signup_date", pa.date32(), DATE_DTYPE, "Date customer signed up"),
+    ],
+    "products": [
+        Column("product_id", pa.int32(), "int32", "Unique ID for product", nullable=False, unique=True, min=1),
+        Column("category", pa.dictionary(pa.int8(), pa.string()), "category", "Product category"),
+        Column("product_name", pa.dictionary(pa.int32(), pa.string()), "category", "Name of product"),
+        Column("price", pa.float64(), "float32", "Unit price of product ($)", min=0, decimals=2),
+    ],
+    "orders": [
+        Column("order_id", pa.int64(), "int64", "Unique ID for order", nullable=False, unique=True, min=1),
+        Column("customer_id", pa.int32(), "int32", "ID of purchasing customer", nullable=False, min=1,
+               references="customers.customer_id"),
+        Column("product_id", pa.int32(), "int32", "ID of purchased product", nullable=False, min=1,
+               references="products.product_id"),
+        Column("order_date", pa.date32(), DATE_DTYPE, "Date of order", nullable=False),
+        Column("quantity", pa.int16(), "uint8", "Units purchased", min=1),
+        Column("total_amount", pa.float64(), "float32", "Total transaction amount ($)", min=0,
+               decimals=2),
+    ],
+}
+
+COLUMNS = {table: {column.name: column for column in columns} for table, columns in TABLES.items()}
+
+
+def arrow_schema(table):
+    return pa.schema([(column.name, column.arrow) for column in TABLES[table]])
+
+
+def data_dict():
+    """{table: {column: description}}"""
+    return {table: {column.name: column.description for column in columns} for table, columns in TABLES.items()}
+
+
+def fingerprint():
+    """Short hash of the schema, for cache keys of frames built with it."""
+    return hashlib.sha256(repr(TABLES).encode()).hexdigest()[:16]
+
+
+def _columns(tables):
+    tables = [tables] if isinstance(tables, str) else tables
+    merged = {}
+    for table in tables:
+        for name, column in COLUMNS[table].items():
+            merged.setdefault(name, column)
+    return merged
+
+
+# ------------------------
+# In-memory dtypes
+# ------------------------
+def money_dtype(largest):
+    """float32 when amounts up to `largest` (in absolute value) keep their cents in it, else float64."""
+    return "float64" if largest >= FLOAT32_CENT_EXACT else "float32"
+
+
+def _convert(col, column, money=None):
+    dtype = column.dtype
+    if dtype == "category":
+        return col if isinstance(col.dtype, pd.CategoricalDtype) else col.astype("category")
+    if dtype.startswith("datetime64"):
+        return pd.to_datetime(col).astype(dtype)
+    if dtype == "object":
+        return col
+    col = pd.to_numeric(col)
+    if np.dtype(dtype).kind in "iu":
+        if col.isna().any():
+            # Missing values need a float column; cleaning drops or imputes them
+            return col.astype("float64")
+        info = np.iinfo(dtype)
+        if len(col) and (col.min() < info.min or col.max() > info.max):
+            raise ValueError(f"{column.name}: values outside the {dtype} range [{info.min}, {info.max}]")
+    elif dtype == "float32" and column.decimals is not None:
+        # Larger amounts would lose cents; keep them in float64
+        return col.astype(money or money_dtype(col.abs().max() if len(col) else 0))
+    return col.astype(dtype)
+
+
+def apply(df, tables, money=None):
+    """Convert the columns of `df` described by `tables` (a name or several) to their in-memory dtypes.
+
+    `money` maps money columns to the dtype chosen for the whole table (so
+    all chunks of it agree); without it the amounts in `df` decide.
+    Columns unknown to the schema are left as they are.
+    """
+    columns = _columns(tables)
+    money = money or {}
+    converted = {name: _convert(df[name], columns[name], money.get(name))
+                 for name in df.columns if name in columns}
+    return df.assign(**converted) if converted else df
+
+
+def widen(df, tables):
+    """Money columns of `df` back in float64, rounded to their decimals.
+
+    float32 holds amounts below FLOAT32_CENT_EXACT to the cent but not as
+    the nearest float64, and its sums drift by whole cents, so sums,
+    summary statistics and files use the widened values.
+    """
+    columns = _columns(tables)
+    widened = {name: df[name].astype("float64").round(columns[name].decimals)
+               for name in df.columns if name in columns and columns[name].decimals is not None}
+    return df.assign(**widened) if widened else df
+
+
+def csv_dtypes(table, names=None):
+    """read_csv dtype/parse_dates arguments that parse straight into compact types where safe."""
+    names = names if names is not None else list(COLUMNS[table])
+    dtypes = {name: "category" for name in names if COLUMNS[table][name].dtype == "category"}
+    dates = [name for name in names if COLUMNS[table][name].dtype.startswith("datetime64")]
+    return dtypes, dates
+
@@ -0,0 +1,110 @@
+"""Embedded SQLite backend for the SQL versions of the business questions.
+
+`load_sqlite` copies the tables of a layer into an in-process SQLite
+database and indexes the join/filter columns. `benchmark` runs every SQL
+query next to its pandas counterpart on the same raw tables, checks that
+both give the same answer and reports the time each path took, so each
+question can be routed to the faster engine for the data size at hand.
+"""
+import re
+import sqlite3
+import time
+
+import numpy as np
+import pandas as pd
+
+import schema
+import storage
+from tracing import traced
+
+INDEXES = {
+    "orders": ["customer_id", "product_id", "order_date"],
+    "customers": ["customer_id"],
+    "products": ["product_id"],
+}
+
+# The example queries are written in a generic/Postgres dialect
+SQLITE_REWRITES = [
+    (r"DATE_TRUNC\('month',\s*([\w.]+)\)", r"strftime('%Y-%m', \1)"),
+    (r"\)\s*/\s*COUNT\(\*\)", r") * 1.0 / COUNT(*)"),
+]
+
+
+# ------------------------
+# Loading
+# ------------------------
+@traced()
+def load_sqlite(layer="raw", tables=("orders", "customers", "products"), path=":memory:"):
+    """SQLite connection holding `tables` of `layer`, with INDEXES created."""
+    conn = sqlite3.connect(path)
+    for table, df in load_pandas(layer, tables).items():
+        for name in df.columns:
+            if pd.api.types.is_datetime64_any_dtype(df[name]):
+                df[name] = df[name].dt.strftime("%Y-%m-%d")
+        df.to_sql(table, conn, index=False, if_exists="replace", chunksize=100_000)
+        for column in INDEXES.get(table, []):
+            conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_{column} ON {table} ({column})")
+    conn.commit()
+    return conn
+
+
+def load_pandas(layer="raw", tables=("orders", "customers", "products")):
+    """{table: DataFrame} of `tables` of `layer`, money widened as SQLite stores it."""
+    return {table: schema.widen(storage.read_table(table, layer), table) for table in tables}
+
+
+def to_sqlite(query):
+    for pattern, replacement in SQLITE_REWRITES:
+        query = re.sub(pattern, replacement, query)
+    return query
+
+
+# ------------------------
+# Running & checking
+# ------------------------
+def _timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def results_match(sql_result, pandas_result, rtol=1e-6):
+    """Compare a SQL result (keys..., value) with a pandas Series or scalar."""
+    values = sql_result.iloc[:, -1].to_numpy(dtype=float)
+    if np.isscalar(pandas_result):
+        return len(values) == 1 and np.isclose(values[0], pandas_result, rtol=rtol)
+    if len(values) != len(pandas_result):
+        return False
+    keys = sql_result.iloc[:, 0].astype(str).to_numpy()
+    return bool((keys == pandas_result.index.astype(str).to_numpy()).all()
+                and np.allclose(values, pandas_result.to_numpy(dtype=float), rtol=rtol))
+
+
+@traced()
+def benchmark(queries, pandas_answers, layer="raw", conn=None):
+    """Run each SQL query and its pandas answer; return results, match flag and timings.
+
+    Each pandas answer is called with the {table: DataFrame} of `layer`, so
+    both engines answer from the same raw tables; the time each takes to
+    load them is in the report's attrs.
+    """
+    load_seconds = 0.0
+    if conn is None:
+        conn, load_seconds = _timed(lambda: load_sqlite(layer))
+    tables, pandas_load_seconds = _timed(lambda: load_pandas(layer))
+
+    rows = []
+    for name, query in queries.items():
+        sql_result, sql_seconds = _timed(lambda: pd.read_sql_query(to_sqlite(query), conn))
+        pandas_result, pandas_seconds = _timed(lambda: pandas_answers[name](tables))
+        rows.append({
+            "query": name,
+            "match": results_match(sql_result, pandas_result),
+            "sql_seconds": sql_seconds,
+            "pandas_seconds": pandas_seconds,
+            "faster": "sql" if sql_seconds < pandas_seconds else "pandas",
+        })
+    report = pd.DataFrame(rows).set_index("query")
+    report.attrs["sqlite_load_seconds"] = load_seconds
+    report.attrs["pandas_load_seconds"] = pandas_load_seconds
+    return report
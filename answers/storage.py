@@ -0,0 +1,327 @@
+"""Typed Parquet storage for the raw and clean datasets.
+
+Tables are written as compressed Parquet with compact Arrow types (int32
+ids, dictionary-encoded low-cardinality strings, date32 dates) and read
+back with column projection into the compact in-memory dtypes of
+`schema`. When a Parquet file is missing, reads fall back to the CSV of
+the same table so older data directories keep working, and `export_csv`
+writes the CSV files the Power BI dashboards use. Large CSVs are parsed
+in parallel byte ranges, and `read_tables` loads several tables at once.
+Unfiltered reads store the columns they decode in the memory-mapped
+column cache, and later reads map those columns instead of decoding the
+file again; filtered reads always go to the file, so Parquet filters are
+pushed down.
+"""
+import operator
+import os
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
+import pyarrow.parquet as pq
+
+import column_cache
+import schema
+from tracing import traced
+
+DATA_DIR = "data"
+COMPRESSION = "zstd"
+
+# Serve reads from memory-mapped NumPy column files under data/cache/columns/
+MMAP_CACHE = True
+COLUMN_CACHE_DIR = os.path.join(DATA_DIR, "cache", "columns")
+
+# CSV files at least this large are split into newline-aligned byte ranges
+# parsed in parallel, one per core
+PARALLEL_CSV_MIN_BYTES = 32 * 2 ** 20
+CSV_WORKERS = os.cpu_count() or 1
+
+# File name of each table inside data/<layer>/
+FILE_STEMS = {
+    "raw": "{table}",
+    "clean": "{table}_clean",
+}
+
+SCHEMAS = {table: schema.arrow_schema(table) for table in schema.TABLES}
+
+
+# ------------------------
+# Paths
+# ------------------------
+def table_path(table, layer="raw", fmt="parquet"):
+    return os.path.join(DATA_DIR, layer, FILE_STEMS[layer].format(table=table) + "." + fmt)
+
+
+def source_path(table, layer="raw"):
+    """The file `read_table` would load: Parquet if present, else the CSV."""
+    path = table_path(table, layer)
+    return path if os.path.exists(path) else table_path(table, layer, fmt="csv")
+
+
+@contextmanager
+def replace_atomically(path):
+    """Yield a temporary path that replaces `path` once written.
+
+    Readers running concurrently (pipeline stages) never see a partial file.
+    """
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        yield tmp
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+# ------------------------
+# Writing
+# ------------------------
+def to_arrow(df, table):
+    """Convert a DataFrame to an Arrow table with the storage schema of `table`."""
+    df = schema.widen(df[SCHEMAS[table].names], table)
+    return pa.Table.from_pandas(df, schema=SCHEMAS[table], preserve_index=False)
+
+
+def open_writer(path, table):
+    """ParquetWriter for appending chunks of `table` one row group at a time."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    return pq.ParquetWriter(path, SCHEMAS[table], compression=COMPRESSION)
+
+
+@traced()
+def write_table(df, table, layer="raw", path=None):
+    path = path or table_path(table, layer)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    pq.write_table(to_arrow(df, table), path, compression=COMPRESSION)
+    return path
+
+
+@traced()
+def concat_parquet(paths, out_path, table):
+    """Stream the row groups of several part files into one Parquet file."""
+    with open_writer(out_path, table) as writer:
+        for path in paths:
+            part = pq.ParquetFile(path)
+            for i in range(part.num_row_groups):
+                writer.write_table(part.read_row_group(i))
+    return out_path
+
+
+@traced()
+def export_csv(table, layer="raw", path=None):
+    """Write the Parquet table to CSV (Power BI compatibility), one row group at a time."""
+    source = pq.ParquetFile(table_path(table, layer))
+    path = path or table_path(table, layer, fmt="csv")
+    with open(path, "w", newline="") as f:
+        if source.num_row_groups == 0:
+            f.write(",".join(source.schema_arrow.names) + "\n")
+        for i in range(source.num_row_groups):
+            chunk = source.read_row_group(i).to_pandas()
+            chunk.to_csv(f, header=(i == 0), index=False)
+    return path
+
+
+# ------------------------
+# Reading
+# ------------------------
+def money_dtypes(path, table):
+    """{money column: in-memory dtype} of `table` in the file at `path`, the same for every read of it.
+
+    The largest amount comes from the Parquet column statistics, without
+    reading the data. CSV files have no statistics and neither may some
+    row groups; their money columns are float64.
+    """
+    largest = {column.name: 0.0 for column in schema.TABLES[table] if column.decimals is not None}
+    if not path.endswith(".parquet"):
+        return dict.fromkeys(largest, "float64")
+    metadata = pq.read_metadata(path)
+    for i in range(metadata.num_row_groups):
+        row_group = metadata.row_group(i)
+        for j in range(row_group.num_columns):
+            chunk = row_group.column(j)
+            if chunk.path_in_schema in largest:
+                stats = chunk.statistics
+                bound = max(abs(stats.min), abs(stats.max)) if stats is not None and stats.has_min_max else float("inf")
+                largest[chunk.path_in_schema] = max(largest[chunk.path_in_schema], bound)
+    return {name: schema.money_dtype(value) for name, value in largest.items()}
+
+
+def _to_pandas(arrow_table, table, money=None):
+    # Dictionary columns arrive as categoricals, the rest is narrowed by the schema
+    return schema.apply(arrow_table.to_pandas(date_as_object=False), table, money)
+
+
+def _read_csv(path, table, columns=None, **kwargs):
+    if not kwargs and os.path.getsize(path) >= PARALLEL_CSV_MIN_BYTES:
+        try:
+            return read_csv_parallel(path, table, columns)
+        except pa.ArrowInvalid:
+            # Values the typed parser rejects (e.g. "two" as a quantity) are left to pandas and the cleaning rules
+            pass
+    dtypes, dates = schema.csv_dtypes(table, columns)
+    return pd.read_csv(path, usecols=columns, dtype=dtypes, parse_dates=dates, **kwargs)
+
+
+def csv_ranges(path, n):
+    """Split the rows after the header of the CSV at `path` into at most `n` byte ranges.
+
+    Every range starts at the beginning of a line and ends after a newline
+    (or at the end of the file). Quoted fields must not contain newlines.
+    """
+    size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        header = f.readline()
+        bounds = [len(header)]
+        for i in range(1, n):
+            target = bounds[0] + (size - bounds[0]) * i // n
+            if target <= bounds[-1]:
+                continue
+            # Reading on from the byte before `target` lands on the next line start
+            f.seek(target - 1)
+            f.readline()
+            if bounds[-1] < f.tell() < size:
+                bounds.append(f.tell())
+    bounds.append(size)
+    return header, [(start, end) for start, end in zip(bounds[:-1], bounds[1:]) if end > start]
+
+
+def _csv_types(table, names):
+    types = {}
+    for name in names:
+        column = schema.COLUMNS[table].get(name)
+        if column is not None:
+            # Dates may carry a time of day in CSVs written by pandas; the CSV
+            # reader only builds dictionaries with int32 indices
+            if pa.types.is_date(column.arrow):
+                types[name] = pa.timestamp("s")
+            elif pa.types.is_dictionary(column.arrow):
+                types[name] = pa.dictionary(pa.int32(), column.arrow.value_type)
+            else:
+                types[name] = column.arrow
+    return types
+
+
+def _parse_csv_range(path, start, end, names, types, columns):
+    with pa.memory_map(path) as source:
+        data = source.read_at(end - start, start)
+    return pacsv.read_csv(pa.BufferReader(data),
+                          read_options=pacsv.ReadOptions(column_names=names, use_threads=False),
+                          convert_options=pacsv.ConvertOptions(column_types=types, include_columns=columns))
+
+
+@traced()
+def read_csv_parallel(path, table, columns=None, workers=None):
+    """Read a CSV of `table` by parsing newline-aligned byte ranges in parallel threads.
+
+    pyarrow's CSV parser releases the GIL, so ranges are parsed on all
+    cores at once and concatenated into one frame; dictionary columns come
+    back as categoricals.
+    """
+    workers = workers or CSV_WORKERS
+    header, ranges = csv_ranges(path, workers)
+    names = header.decode().strip().split(",")
+    types = _csv_types(table, names)
+    if not ranges:
+        return pd.DataFrame({name: pd.Series(dtype=object) for name in columns or names})
+    with ThreadPoolExecutor(max_workers=min(workers, len(ranges))) as pool:
+        parts = list(pool.map(lambda r: _parse_csv_range(path, r[0], r[1], names, types, columns), ranges))
+    return pa.concat_tables(parts).to_pandas(date_as_object=False)
+
+
+FILTER_OPS = {"==": operator.eq, "!=": operator.ne, "<": operator.lt,
+              "<=": operator.le, ">": operator.gt, ">=": operator.ge}
+
+
+def _apply_filters(df, filters):
+    for name, op, value in filters or []:
+        df = df[FILTER_OPS[op](df[name], value)]
+    return df
+
+
+def _file_columns(path):
+    if path.endswith(".parquet"):
+        return pq.read_schema(path).names
+    with open(path) as f:
+        return f.readline().strip().split(",")
+
+
+def _read_mapped(path, table, layer, columns=None):
+    """`columns` of `table` mapped from the column cache; only columns not cached yet are decoded."""
+    columns = list(columns) if columns is not None else _file_columns(path)
+    base = os.path.join(COLUMN_CACHE_DIR, f"{layer}_{table}")
+    key = column_cache.source_key(path, schema.fingerprint())
+    mapped = {}
+    for name in columns:
+        cached = column_cache.load(os.path.join(base, name), key)
+        if cached is not None:
+            mapped[name] = cached[name]
+    missing = [name for name in columns if name not in mapped]
+    if missing:
+        fresh = _read_source(path, table, missing)
+        for name in missing:
+            try:
+                column_cache.save(fresh[[name]], os.path.join(base, name), key)
+                cached = column_cache.load(os.path.join(base, name), key)
+            except OSError:
+                # Read-only data directory: serve this read from the file
+                cached = None
+            mapped[name] = cached[name] if cached is not None else fresh[name]
+    return pd.DataFrame({name: mapped[name] for name in columns}, copy=False)
+
+
+@traced()
+def read_table(table, layer="raw", columns=None, filters=None):
+    """Load `table` from data/<layer>/, reading only `columns`.
+
+    `filters` is a list of (column, op, value) tuples; on Parquet they are
+    pushed down so row groups outside the range are never read. Columns
+    come back in the in-memory dtypes of `schema` (categoricals for the
+    dictionary columns), whether the table was read from Parquet or CSV.
+    With MMAP_CACHE, unfiltered reads memory-map the columns from the
+    column cache (string columns then come back as categoricals), decoding
+    and caching only the requested columns that are not cached yet.
+    """
+    path = source_path(table, layer)
+    if MMAP_CACHE and not filters:
+        return _read_mapped(path, table, layer, columns)
+    return _read_source(path, table, columns, filters)
+
+
+def _read_source(path, table, columns=None, filters=None):
+    money = money_dtypes(path, table)
+    if path.endswith(".parquet"):
+        return _to_pandas(pq.read_table(path, columns=columns, filters=filters), table, money)
+
+    needed = None if columns is None else list(dict.fromkeys(columns + [f[0] for f in filters or []]))
+    df = _apply_filters(_read_csv(path, table, needed), filters)
+    df = schema.apply(df, table, money)
+    return df[columns] if columns is not None else df
+
+
+@traced()
+def read_tables(tables, layer="raw", columns=None):
+    """Load several tables concurrently; returns {table: DataFrame}.
+
+    `columns` maps table names to the columns to read. Parquet decoding and
+    CSV parsing release the GIL, so the reads overlap on separate cores.
+    """
+    columns = columns or {}
+    with ThreadPoolExecutor(max_workers=len(tables)) as pool:
+        futures = {table: pool.submit(read_table, table, layer, columns.get(table)) for table in tables}
+    return {table: future.result() for table, future in futures.items()}
+
+
+def iter_table(table, layer="raw", columns=None, batch_size=1_000_000):
+    """Yield `table` as DataFrames of at most `batch_size` rows, same types as read_table."""
+    path = source_path(table, layer)
+    money = money_dtypes(path, table)
+    if path.endswith(".parquet"):
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=batch_size, columns=columns):
+            yield _to_pandas(pa.Table.from_batches([batch]), table, money)
+        return
+
+    for chunk in _read_csv(path, table, columns, chunksize=batch_size):
+        chunk = schema.apply(chunk, table, money)
+        yield chunk[columns] if columns is not None else chunk
@@ -0,0 +1,73 @@
+"""Stream synthetic order events as NDJSON at a target rate.
+
+    python answers/stream_orders.py --rate 200 > events.ndjson
+    python answers/stream_orders.py --start 2025-11-20 --days 14 --output data/stream/orders.ndjson
+
+Events are generated day by day in timestamp order from the customers and
+products of data/raw, with the seasonal intensity of timeline.Seasonality
+(weekly and yearly cycles, holiday spikes, growth). `--rate` paces the
+output in events per second for replaying into downstream ingestion;
+without it events are written as fast as they are generated. Order ids
+continue after the last raw order.
+"""
+import argparse
+import os
+import sys
+
+import numpy as np
+
+import storage
+from datagen import draw_order_counts, iter_order_events
+from timeline import Seasonality, write_ndjson
+
+SEED = 42
+RECENT_DAYS = 30
+
+
+def recent_orders_per_day(orders, days=RECENT_DAYS):
+    """Average daily orders over the last `days` days of `orders`, before seasonality."""
+    dates = orders["order_date"].to_numpy(dtype="datetime64[D]")
+    last = dates.max()
+    recent = np.arange(last - days + 1, last + 1)
+    return float((dates > last - days).sum() / Seasonality().intensity(recent, today=last).sum())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Stream seasonal order events as NDJSON.")
+    parser.add_argument("--rate", type=float, help="events per second (default: as fast as possible)")
+    parser.add_argument("--start", help="first day of the stream, YYYY-MM-DD (default today)")
+    parser.add_argument("--days", type=int, help="number of days to generate (default: unbounded)")
+    parser.add_argument("--limit", type=int, help="stop after this many events")
+    parser.add_argument("--orders-per-day", type=float,
+                        help=f"average orders on a plain day (default: the last {RECENT_DAYS} days of data/raw)")
+    parser.add_argument("--output", help="NDJSON file to write (default stdout)")
+    parser.add_argument("--seed", type=int, default=SEED)
+    args = parser.parse_args(argv)
+
+    customers = storage.read_table("customers", "raw", columns=["customer_id", "age"])
+    products = storage.read_table("products", "raw")
+    orders = storage.read_table("orders", "raw", columns=["order_id", "order_date"])
+    orders_per_day = args.orders_per_day or recent_orders_per_day(orders)
+
+    rng = np.random.default_rng(args.seed)
+    active, counts = draw_order_counts(customers["customer_id"].to_numpy(), rng)
+    events = iter_order_events(customers, products, active, counts, rng, Seasonality(), orders_per_day,
+                               start=args.start, days=args.days,
+                               start_order_id=int(orders["order_id"].max()) + 1)
+
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    out = open(args.output, "w") if args.output else sys.stdout
+    try:
+        written = write_ndjson(events, out, rate=args.rate, limit=args.limit)
+    except KeyboardInterrupt:
+        written = None
+    finally:
+        if args.output:
+            out.close()
+    if written is not None:
+        print(f"{written:,} events written", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
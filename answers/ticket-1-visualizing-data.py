@@ -1,12 +1,30 @@
 import pandas as pd
 import numpy as np
 
+import cleaning
+import schema
+import storage
+import validation
+from tracing import span
+
+# Stream orders through the cleaning rules in batches instead of loading the
+# whole table (for orders files that do not fit in memory)
+STREAM_ORDERS = False
+ORDERS_BATCH_SIZE = 1_000_000
+
 # ------------------------
 # 1. Data Ingestion
 # ------------------------
-customers = pd.read_csv("data/raw/customers.csv", parse_dates=["signup_date"])
-products = pd.read_csv("data/raw/products.csv")
-orders = pd.read_csv("data/raw/orders.csv", parse_dates=["order_date"])
+with span("clean: ingestion"):
+    # The tables are read concurrently; large CSVs are parsed in parallel byte ranges
+    if STREAM_ORDERS:
+        tables = storage.read_tables(["customers", "products"], "raw")
+        orders = next(storage.iter_table("orders", "raw", batch_size=5))
+    else:
+        tables = storage.read_tables(["customers", "products", "orders"], "raw")
+        orders = tables["orders"]
+    customers = tables["customers"]
+    products = tables["products"]
 
 # ------------------------
 # 2. Initial Understanding
@@ -19,98 +37,102 @@ print("--- Products Info ---")
 print(products.info())
 print(products.head())
 
-print("--- Orders Info ---")
+print("--- Orders Info ---" + (" (first rows only, streaming mode)" if STREAM_ORDERS else ""))
 print(orders.info())
 print(orders.head())
 
 # ------------------------
 # 3. Handle Missing Values
 # ------------------------
-# Drop rows with critical nulls (e.g., customer_id, product_id, order_date)
-orders = orders.dropna(subset=["customer_id", "product_id", "order_date"])
+with span("clean: missing values"):
+    # Impute missing ages with median
+    if customers["age"].isnull().any():
+        customers["age"].fillna(customers["age"].median(), inplace=True)
 
-# Impute missing ages with median
-if customers["age"].isnull().any():
-    customers["age"].fillna(customers["age"].median(), inplace=True)
-
-# Flag missing locations
-customers["location"] = customers["location"].fillna("Unknown")
+    # Flag missing locations
+    customers["location"] = cleaning.fill_category(customers["location"], "Unknown")
 
 # ------------------------
 # 4. Normalize Categorical Values
 # ------------------------
-# Example: Normalize state/location naming (CA vs California)
-customers["location"] = customers["location"].replace({
-    "CA": "California",
-    "NY": "New York",
-    "TX": "Texas"
-})
+with span("clean: normalize categories"):
+    # Example: Normalize state/location naming (CA vs California)
+    customers["location"] = cleaning.map_categories(customers["location"], lambda c: c.replace({
+        "CA": "California",
+        "NY": "New York",
+        "TX": "Texas"
+    }))
 
-# Standardize gender values
-customers["gender"] = customers["gender"].str.strip().str.title()
+    # Standardize gender values
+    customers["gender"] = cleaning.map_categories(customers["gender"], lambda c: c.str.strip().str.title())
 
 # ------------------------
 # 5. Fix Incorrect Data Types
 # ------------------------
 # Ensure numeric fields are correct type
 products["price"] = pd.to_numeric(products["price"], errors="coerce")
-orders["quantity"] = pd.to_numeric(orders["quantity"], errors="coerce").fillna(1).astype(int)
-orders["total_amount"] = pd.to_numeric(orders["total_amount"], errors="coerce")
 
 # ------------------------
 # 6. Remove Duplicates
 # ------------------------
-customers = customers.drop_duplicates(subset="customer_id")
-products = products.drop_duplicates(subset="product_id")
-orders = orders.drop_duplicates(subset="order_id")
+with span("clean: remove duplicates"):
+    customers = customers.drop_duplicates(subset="customer_id")
+    products = products.drop_duplicates(subset="product_id")
+
+    # Orders: drop rows with critical nulls (customer_id, product_id, order_date),
+    # coerce quantity/total_amount to numbers and drop repeated order_ids.
+    # Streaming mode writes data/clean incrementally and keeps per-batch statistics.
+    if STREAM_ORDERS:
+        orders_rows_read, orders_summary = cleaning.stream_clean_orders("raw", "clean", ORDERS_BATCH_SIZE)
+    else:
+        orders = cleaning.clean_orders(orders).drop_duplicates(subset="order_id")
 
 # ------------------------
 # 7. Create Data Dictionary
 # ------------------------
-data_dict = {
-    "customers": {
-        "customer_id": "Unique ID for customer",
-        "name": "Customer full name",
-        "age": "Customer age (years)",
-        "gender": "Customer gender (Male/Female/Other)",
-        "location": "Customer location (city/state)",
-        "signup_date": "Date customer signed up"
-    },
-    "products": {
-        "product_id": "Unique ID for product",
-        "category": "Product category",
-        "product_name": "Name of product",
-        "price": "Unit price of product ($)"
-    },
-    "orders": {
-        "order_id": "Unique ID for order",
-        "customer_id": "ID of purchasing customer",
-        "product_id": "ID of purchased product",
-        "order_date": "Date of order",
-        "quantity": "Units purchased",
-        "total_amount": "Total transaction amount ($)"
-    }
-}
+# Descriptions live next to the column types in the central schema
+data_dict = schema.data_dict()
 
 # ------------------------
 # 8. Basic Summary Statistics
 # ------------------------
 def summarize(df, name):
+    # Amounts are float32 in memory; describe the float64 values rounded to the cent
+    df = schema.widen(df, name)
     print(f"\n--- {name.upper()} SUMMARY ---")
     print(f"Shape: {df.shape}")
     print(df.isnull().sum())
     print(df.describe(include="all"))
 
-summarize(customers, "customers")
-summarize(products, "products")
-summarize(orders, "orders")
+with span("clean: summary statistics"):
+    summarize(customers, "customers")
+    summarize(products, "products")
+    if STREAM_ORDERS:
+        print(f"\nStreamed {orders_rows_read} order rows in batches of {ORDERS_BATCH_SIZE}")
+        orders_summary.report("orders")
+    else:
+        summarize(orders, "orders")
+
+# ------------------------
+# 9. Validation
+# ------------------------
+# Schema constraints, foreign keys and total_amount == price * quantity;
+# streamed orders are validated batch by batch from data/clean
+with span("clean: validation"):
+    parents = {"customers": customers, "products": products}
+    clean_orders = storage.iter_table("orders", "clean", batch_size=ORDERS_BATCH_SIZE) if STREAM_ORDERS else orders
+    for table, frames in (("customers", customers), ("products", products), ("orders", clean_orders)):
+        validation.validate_table(frames, table, parents=parents).report()
 
 # ------------------------
 # Save Cleaned Data
 # ------------------------
-customers.to_csv("data/clean/customers_clean.csv", index=False)
-products.to_csv("data/clean/products_clean.csv", index=False)
-orders.to_csv("data/clean/orders_clean.csv", index=False)
+# Typed Parquet for the pipeline, plus CSV copies for Power BI
+with span("clean: save"):
+    for table, df in (("customers", customers), ("products", products), ("orders", orders)):
+        if not (table == "orders" and STREAM_ORDERS):
+            storage.write_table(df, table, "clean")
+        storage.export_csv(table, "clean")
 
 print("Data cleaning complete. Cleaned files saved to data/clean/.")
 print("Data dictionary:")
@@ -1,82 +1,105 @@
-import pandas as pd
-import matplotlib.pyplot as plt
-import os
+import cube as revenue_cube
+import loader
+import sql_engine
+import storage
+from plotting import ChartSpec, render_charts
+from topk import HeavyHitters, top_k_by
+from tracing import span
+
+# Execute the SQL equivalents on an embedded SQLite database and compare them
+# (results and timings) with pandas answering from the same raw tables; set
+# to False to skip loading every table into SQLite
+RUN_SQL = True
+# Also answer the top-N questions from fixed-memory heavy-hitter sketches fed
+# with the order table in batches, as they would be over a live order stream;
+# this reads the orders a second time to approximate answers the cube already
+# gives exactly, so it is off for regular runs
+RUN_STREAM_TOP_K = False
+TOP_K = 10
+# Space-Saving counters give every revenue estimate within eps x total revenue
+HEAVY_HITTER_EPS = 1e-3
+ORDERS_BATCH_SIZE = 1_000_000
 
 # ------------------------
 # Load Data
 # ------------------------
-customers = pd.read_csv("data/raw/customers.csv", parse_dates=["signup_date"])
-products = pd.read_csv("data/raw/products.csv")
-orders = pd.read_csv("data/raw/orders.csv", parse_dates=["order_date"])
-
-# Merge orders with customers and products for richer analysis
-orders_merged = orders.merge(customers, on="customer_id", how="left").merge(products, on="product_id", how="left")
+# Every question below is a roll-up of the pre-aggregated revenue cube
+# (year_month x category x location x customer_id); names are only needed
+# for the top customers
+with span("business: load data"):
+    cube = revenue_cube.load_cube("raw")
+    customer_names = storage.read_table("customers", "raw", columns=["customer_id", "name"])
 
 # Output directory for plots
 PLOT_DIR = "data/plots"
-os.makedirs(PLOT_DIR, exist_ok=True)
+charts = []
 
 # ------------------------
 # 1. Top 10 customers by revenue
 # ------------------------
-top_customers = orders_merged.groupby(["customer_id", "name"])["total_amount"].sum().sort_values(ascending=False).head(10)
-
-plt.figure(figsize=(10,5))
-top_customers.sort_values().plot(kind="barh")
-plt.title("Top 10 Customers by Revenue")
-plt.xlabel("Revenue ($)")
-plt.tight_layout()
-plt.savefig(os.path.join(PLOT_DIR, "top_customers_revenue.png"))
-plt.close()
+with span("business: top customers"):
+    top_customers = revenue_cube.top_customers(cube, customer_names, n=TOP_K)
+    charts.append(ChartSpec("top_customers_revenue", lambda: top_customers.sort_values(),
+                            "barh", "Top 10 Customers by Revenue", xlabel="Revenue ($)", figsize=(10,5)))
 
 # ------------------------
 # 2. Top-selling product categories
 # ------------------------
-category_revenue = orders_merged.groupby("category")["total_amount"].sum().sort_values(ascending=False)
-
-plt.figure(figsize=(8,5))
-category_revenue.plot(kind="bar")
-plt.title("Top-Selling Product Categories (Revenue)")
-plt.ylabel("Revenue ($)")
-plt.tight_layout()
-plt.savefig(os.path.join(PLOT_DIR, "top_categories_revenue.png"))
-plt.close()
+with span("business: top categories"):
+    category_revenue = revenue_cube.revenue_by(cube, "category")
+    charts.append(ChartSpec("top_categories_revenue", lambda: category_revenue,
+                            "bar", "Top-Selling Product Categories (Revenue)", ylabel="Revenue ($)"))
 
 # ------------------------
 # 3. Repeat purchase rate
 # ------------------------
-customer_order_counts = orders.groupby("customer_id").size()
-repeat_customers = (customer_order_counts > 1).sum()
-total_customers = len(customer_order_counts)
-repeat_rate = repeat_customers / total_customers
+with span("business: repeat rate"):
+    repeat_rate = revenue_cube.repeat_rate(cube)
 
 # ------------------------
 # 4. Average order value (AOV) trend
 # ------------------------
-orders["year_month"] = orders["order_date"].dt.to_period("M")
-aov_trend = orders.groupby("year_month")["total_amount"].mean()
-
-plt.figure(figsize=(10,5))
-aov_trend.plot()
-plt.title("Average Order Value (AOV) Trend")
-plt.xlabel("Month")
-plt.ylabel("AOV ($)")
-plt.tight_layout()
-plt.savefig(os.path.join(PLOT_DIR, "aov_trend.png"))
-plt.close()
+with span("business: aov trend"):
+    aov_trend = revenue_cube.aov_trend(cube)
+    charts.append(ChartSpec("aov_trend", lambda: aov_trend,
+                            "line", "Average Order Value (AOV) Trend", xlabel="Month", ylabel="AOV ($)",
+                            figsize=(10,5)))
 
 # ------------------------
 # 5. Region generating the most revenue (using location field)
 # ------------------------
-region_revenue = orders_merged.groupby("location")["total_amount"].sum().sort_values(ascending=False).head(10)
+with span("business: top regions"):
+    region_revenue = revenue_cube.top_by(cube, "location", n=TOP_K)
+    charts.append(ChartSpec("top_regions_revenue", lambda: region_revenue.sort_values(),
+                            "barh", "Top Regions by Revenue", xlabel="Revenue ($)", figsize=(10,5)))
 
-plt.figure(figsize=(10,5))
-region_revenue.sort_values().plot(kind="barh")
-plt.title("Top Regions by Revenue")
-plt.xlabel("Revenue ($)")
-plt.tight_layout()
-plt.savefig(os.path.join(PLOT_DIR, "top_regions_revenue.png"))
-plt.close()
+with span("business: render charts", charts=len(charts)):
+    render_charts(charts, PLOT_DIR)
+
+# ------------------------
+# 6. Top customers, products and regions from the order stream
+# ------------------------
+if RUN_STREAM_TOP_K:
+    with span("business: stream heavy hitters") as step:
+        customer_locations = storage.read_table("customers", "raw", columns=["customer_id", "location"])
+        customer_locations = customer_locations.drop_duplicates(subset="customer_id")
+        hitters = HeavyHitters(k=TOP_K, eps=HEAVY_HITTER_EPS)
+        for batch in storage.iter_table("orders", "raw", columns=["customer_id", "product_id", "total_amount"],
+                                        batch_size=ORDERS_BATCH_SIZE):
+            hitters.update(loader.attach(batch, customer_locations, "customer_id"))
+        step.set(rows=hitters.orders)
+
+    exact = {"customer_id": revenue_cube.top_by(cube, "customer_id", n=TOP_K),
+             "location": region_revenue}
+    for dim in hitters.space_saving:
+        stream_top = hitters.top(dim)
+        print(f"--- Top {TOP_K} by {dim} from the stream sketches ({hitters.orders:,} orders) ---")
+        print(stream_top.round(2).to_string())
+        if dim in exact:
+            same = len(set(stream_top.index.astype(str)) & set(exact[dim].index.astype(str)))
+            print(f"{same} of {TOP_K} match the exact answer")
+    print("--- Worst-case revenue error of the sketches ($) ---")
+    print(hitters.error_bounds().round(2).to_string())
 
 # ------------------------
 # SQL equivalents (examples)
@@ -120,6 +143,37 @@ sql_queries = {
     """
 }
 
+# ------------------------
+# Run SQL equivalents vs pandas
+# ------------------------
+# The pandas answers work on the same raw tables SQLite loads (not the
+# pre-built cube), so the timings compare like with like
+def _category_revenue(t):
+    orders = t["orders"].merge(t["products"][["product_id", "category"]], on="product_id")
+    return orders.groupby("category", observed=True)["total_amount"].sum().sort_values(ascending=False)
+
+
+def _region_revenue(t):
+    orders = t["orders"].merge(t["customers"][["customer_id", "location"]], on="customer_id")
+    return top_k_by(orders["location"], orders["total_amount"], 10)
+
+
+pandas_answers = {
+    "Top 10 Customers by Revenue": lambda t: top_k_by(t["orders"]["customer_id"], t["orders"]["total_amount"], 10),
+    "Top-Selling Categories": _category_revenue,
+    "Repeat Purchase Rate": lambda t: float((t["orders"]["customer_id"].value_counts() > 1).mean()),
+    "Average Order Value Trend": lambda t: t["orders"].groupby(t["orders"]["order_date"].dt.strftime("%Y-%m"))
+        ["total_amount"].mean(),
+    "Top Regions by Revenue": _region_revenue,
+}
+
+if RUN_SQL:
+    with span("business: sql vs pandas", queries=len(sql_queries)):
+        sql_report = sql_engine.benchmark(sql_queries, pandas_answers, layer="raw")
+    print(f"--- SQL (SQLite, loaded in {sql_report.attrs['sqlite_load_seconds']:.2f}s) vs pandas "
+          f"(loaded in {sql_report.attrs['pandas_load_seconds']:.2f}s) ---")
+    print(sql_report)
+
 # ------------------------
 # Markdown insights (to paste into Notion)
 # ------------------------
@@ -148,8 +202,7 @@ md_insights = f"""
 
 ---
 **Next Steps:**
-- Conduct cohort analysis by signup date to see if newer customers are more valuable.
-- Analyze customer lifetime value (CLV).
+- Compare cohorts by signup date to see if newer customers are more valuable, and track CLV (ticket-6).
 - Explore category performance within top regions to align marketing campaigns.
 """
 
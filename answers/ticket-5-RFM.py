@@ -1,90 +1,84 @@
-import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
 import os
 
-# ------------------------
-# Load Data
-# ------------------------
-customers = pd.read_csv("data/clean/customers_clean.csv", parse_dates=["signup_date"])
-products = pd.read_csv("data/clean/products_clean.csv")
-orders = pd.read_csv("data/clean/orders_clean.csv", parse_dates=["order_date"])
+import loader
+import parallel
+from plotting import ChartSpec, render_charts
+from rfm_engine import ORDER_COLUMNS, RFMState, approx_score_rfm, compare_scores, save_scores, score_rfm
+from tracing import span
+
+# Per-customer RFM state (last order date, count, spend) kept between runs
+RFM_STATE_PATH = "data/cache/rfm_state.npz"
+# Fold only orders appended since the saved state instead of recomputing from scratch
+INCREMENTAL_RFM = False
+# Score with approximate quantile sketches (rank error ~ this value) instead of
+# exact qcut, e.g. 0.01 for very large customer bases; None keeps exact scoring
+APPROX_RFM_EPS = None
+# Worker processes for a full recompute: orders are hash-partitioned by customer
+# and reduced in shared memory (identical results); None or 1 computes serially
+RFM_WORKERS = None
 
 # Output directory for plots
 PLOT_DIR = "data/plots"
-os.makedirs(PLOT_DIR, exist_ok=True)
-
-# ------------------------
-# 1. Compute RFM Metrics
-# ------------------------
-latest_date = orders["order_date"].max()
-rfm = orders.groupby("customer_id").agg({
-    "order_date": lambda x: (latest_date - x.max()).days,
-    "order_id": "count",
-    "total_amount": "sum"
-}).reset_index()
-
-rfm.rename(columns={
-    "order_date": "Recency",
-    "order_id": "Frequency",
-    "total_amount": "Monetary"
-}, inplace=True)
 
 # ------------------------
-# 2. Score RFM (1–5 scale)
+# Load Data & 1. Compute RFM Metrics
 # ------------------------
-rfm["R_Score"] = pd.qcut(rfm["Recency"], 5, labels=[5,4,3,2,1]).astype(int)
-rfm["F_Score"] = pd.qcut(rfm["Frequency"].rank(method="first"), 5, labels=[1,2,3,4,5]).astype(int)
-rfm["M_Score"] = pd.qcut(rfm["Monetary"], 5, labels=[1,2,3,4,5]).astype(int)
-
-rfm["RFM_Segment"] = rfm[["R_Score","F_Score","M_Score"]].astype(str).agg("".join, axis=1)
-rfm["RFM_Score"] = rfm[["R_Score","F_Score","M_Score"]].sum(axis=1)
+with span("rfm: metrics") as step:
+    state = None
+    if INCREMENTAL_RFM and os.path.exists(RFM_STATE_PATH):
+        # Daily refresh: only orders appended since the state was saved are read and folded in
+        state = RFMState.load(RFM_STATE_PATH)
+        folded = state.fold_appended("clean")
+        if folded is None:
+            print("Saved RFM state was not built from the current clean orders; recomputing it")
+            state = None
+        else:
+            step.set(rows=folded)
+    if state is None:
+        # RFM only needs the order facts (shared, cached star schema of the clean layer)
+        orders = loader.load_star("clean", columns=ORDER_COLUMNS)
+        if RFM_WORKERS and RFM_WORKERS > 1:
+            state = parallel.aggregate(orders, ["rfm_state"], workers=RFM_WORKERS)["rfm_state"]
+        else:
+            state = RFMState.from_orders(orders)
+        if INCREMENTAL_RFM:
+            # Lets the next refresh check that the file was only appended to
+            rows, digests = loader.row_digests("orders", "clean", columns=ORDER_COLUMNS)
+            state.source_digest = digests[rows]
+        step.set(rows=len(orders))
+    state.save(RFM_STATE_PATH)
 
 # ------------------------
-# 3. Assign Segment Labels
+# 2. Score RFM (1–5 scale) & 3. Assign Segment Labels
 # ------------------------
-def segment_customer(row):
-    if row["RFM_Score"] >= 12:
-        return "Champions"
-    elif row["RFM_Score"] >= 9:
-        return "Loyal"
-    elif row["RFM_Score"] >= 6:
-        return "Potential Loyalist"
-    elif row["R_Score"] >= 4 and row["F_Score"] <= 2:
-        return "New Customer"
-    elif row["R_Score"] <= 2 and row["F_Score"] >= 3:
-        return "At Risk"
+with span("rfm: scoring & segments") as step:
+    if APPROX_RFM_EPS:
+        rfm = approx_score_rfm(state.table(), eps=APPROX_RFM_EPS)
+        print(f"--- Approximate RFM scoring (eps={APPROX_RFM_EPS}) vs exact qcut ---")
+        print(compare_scores(score_rfm(state.table()), rfm))
     else:
-        return "Hibernating"
-
-rfm["Segment"] = rfm.apply(segment_customer, axis=1)
+        rfm = score_rfm(state.table())
+    # The customer lookups serve these scores instead of recomputing them
+    save_scores(rfm)
+    step.set(rows=len(rfm))
 
 # ------------------------
 # 4. Visualizations
 # ------------------------
-plt.figure(figsize=(8,5))
-segment_counts = rfm["Segment"].value_counts()
-segment_counts.plot(kind="bar")
-plt.title("Customer Segments Distribution")
-plt.ylabel("Number of Customers")
-plt.tight_layout()
-plt.savefig(os.path.join(PLOT_DIR, "rfm_segments_distribution.png"))
-plt.close()
-
-plt.figure(figsize=(8,6))
-sns.boxplot(data=rfm, x="Segment", y="Monetary")
-plt.title("Monetary Value by Segment")
-plt.xticks(rotation=45)
-plt.tight_layout()
-plt.savefig(os.path.join(PLOT_DIR, "rfm_monetary_by_segment.png"))
-plt.close()
-
-plt.figure(figsize=(8,6))
-sns.scatterplot(data=rfm, x="Recency", y="Frequency", hue="Segment", alpha=0.7)
-plt.title("Recency vs Frequency by Segment")
-plt.tight_layout()
-plt.savefig(os.path.join(PLOT_DIR, "rfm_recency_frequency.png"))
-plt.close()
+with span("rfm: render charts"):
+    segment_counts = rfm["Segment"].value_counts()
+    segment_points = rfm[["Segment", "Recency", "Frequency", "Monetary"]]
+
+    render_charts([
+        ChartSpec("rfm_segments_distribution", lambda: segment_counts,
+                  "bar", "Customer Segments Distribution", ylabel="Number of Customers"),
+        ChartSpec("rfm_monetary_by_segment", lambda: segment_points[["Segment", "Monetary"]],
+                  "box", "Monetary Value by Segment", figsize=(8,6),
+                  options={"x": "Segment", "y": "Monetary", "rotation": 45}),
+        ChartSpec("rfm_recency_frequency", lambda: segment_points[["Segment", "Recency", "Frequency"]],
+                  "scatter", "Recency vs Frequency by Segment", figsize=(8,6),
+                  options={"x": "Recency", "y": "Frequency", "hue": "Segment", "alpha": 0.7}),
+    ], PLOT_DIR)
 
 # ------------------------
 # 5. Insights (Markdown)
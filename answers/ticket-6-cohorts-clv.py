@@ -0,0 +1,110 @@
+import cohorts
+import storage
+from plotting import ChartSpec, histogram, render_charts
+from tracing import span
+
+# Orders are folded into the customer x month activity matrix in batches,
+# so memory depends on the number of customers, not of orders
+ORDERS_BATCH_SIZE = 1_000_000
+# Signup cohorts are grouped by this pandas frequency in the charts ("M", "Q", "Y")
+COHORT_FREQ = "Y"
+RETENTION_MONTHS = 12
+CLV_HORIZON_MONTHS = cohorts.CLV_HORIZON_MONTHS
+
+# Output directory for plots
+PLOT_DIR = "data/plots"
+
+# ------------------------
+# 1. Build Activity Matrix
+# ------------------------
+with span("cohorts: activity matrix") as step:
+    customers = storage.read_table("customers", "clean", columns=["customer_id", "signup_date"])
+    orders = storage.iter_table("orders", "clean", columns=["customer_id", "order_date", "total_amount"],
+                                batch_size=ORDERS_BATCH_SIZE)
+    activity = cohorts.ActivityMatrix.from_chunks(customers, orders)
+    step.set(rows=len(customers))
+
+# ------------------------
+# 2. Retention & Cohort Revenue
+# ------------------------
+with span("cohorts: retention & revenue"):
+    counts = activity.cohort_counts()
+    retention = activity.retention(COHORT_FREQ, max_period=RETENTION_MONTHS, counts=counts)
+    retention.index = retention.index.astype(str)
+    cohort_revenue = activity.cohort_revenue(COHORT_FREQ)
+    cohort_revenue.index = cohort_revenue.index.astype(str)
+
+print("--- Retention by signup cohort (share active n months after signup) ---")
+print(retention.round(3).to_string())
+print("\n--- Revenue by signup cohort ---")
+print(cohort_revenue.to_string())
+
+# ------------------------
+# 3. Customer Lifetime Value (BG/NBD on monthly activity)
+# ------------------------
+with span("cohorts: clv") as step:
+    clv_inputs = activity.clv_inputs()
+    params = cohorts.fit_bgnbd(clv_inputs)
+    clv = cohorts.customer_lifetime_value(clv_inputs, params, horizon=CLV_HORIZON_MONTHS)
+    step.set(rows=len(clv))
+
+print("\n--- BG/NBD parameters ---")
+print({name: round(float(params[name]), 4) for name in cohorts.BGNBD_PARAMS})
+if params["at_bound"]:
+    print(f"Degenerate fit: {', '.join(params['at_bound'])} at or near the search bounds")
+print(f"\n--- Top 10 customers by {CLV_HORIZON_MONTHS}-month CLV ---")
+print(clv.nlargest(10, "clv")[["customer_id", "x", "t_x", "T", "p_alive", "expected_purchases", "monetary", "clv"]]
+      .to_string(index=False))
+
+# ------------------------
+# 4. Visualizations
+# ------------------------
+with span("cohorts: render charts"):
+    render_status = render_charts([
+        ChartSpec("cohort_retention_heatmap", lambda: retention,
+                  "heatmap", "Retention by Signup Cohort", xlabel="Months since signup", ylabel="Signup cohort",
+                  figsize=(11, 5), options={"annot": True, "fmt": ".0%"}),
+        ChartSpec("cohort_retention_curves", lambda: retention.T,
+                  "line", "Retention Curves by Signup Cohort", xlabel="Months since signup",
+                  ylabel="Share of cohort active", figsize=(10, 5)),
+        ChartSpec("cohort_revenue_per_customer", lambda: cohort_revenue["revenue_per_customer"],
+                  "bar", "Revenue per Customer by Signup Cohort", xlabel="Signup cohort", ylabel="Revenue ($)"),
+        ChartSpec("clv_distribution", lambda: histogram(clv["clv"], bins=40),
+                  "hist", f"Distribution of {CLV_HORIZON_MONTHS}-Month Customer Lifetime Value",
+                  xlabel="CLV ($)", ylabel="Customers"),
+    ], PLOT_DIR)
+
+# ------------------------
+# 5. Insights (Markdown)
+# ------------------------
+first_month = retention[0]
+month_n = retention[RETENTION_MONTHS].dropna()
+first_year_value = (cohort_revenue["revenue_first_12_months"] / cohort_revenue["customers"]).round(2)
+clv_caveat = ""
+if params["at_bound"]:
+    clv_caveat = (f"\n- The BG/NBD fit is degenerate ({', '.join(params['at_bound'])} at or near the search bounds): "
+                  "the data shows no dropout or no spread in purchase rates, so P(alive) and CLV only "
+                  "extrapolate past spend.")
+md_insights = f"""
+# Cohort & CLV Insights
+
+## Retention
+- {len(retention)} signup cohorts; {first_month.min():.1%} to {first_month.max():.1%} of a cohort orders in its signup month.
+- {RETENTION_MONTHS} months after signup, {month_n.min():.1%} to {month_n.max():.1%} of a cohort is still ordering.
+
+## Cohort Value
+- Revenue per customer in the first 12 months after signup: {", ".join(f"{c}: ${v:,.0f}" for c, v in first_year_value.items())}.
+- Older cohorts have had more months to buy, so total revenue per customer favors them.
+
+## Customer Lifetime Value
+- Average {CLV_HORIZON_MONTHS}-month CLV: ${clv['clv'].mean():,.2f}; the top decile starts at ${clv['clv'].quantile(0.9):,.2f}.
+- Average probability of still being active: {clv['p_alive'].mean():.1%}.{clv_caveat}
+
+## Business Takeaways
+- Customers with a high CLV but a falling P(alive) are the first win-back targets.
+- Cohorts with weak early retention point to onboarding or acquisition-channel issues.
+"""
+
+print(md_insights)
+rendered = sum(state == "rendered" for state in render_status.values())
+print(f" Cohort & CLV analysis complete. Plots saved in {PLOT_DIR} ({rendered} re-rendered, {len(render_status) - rendered} unchanged)")
@@ -0,0 +1,135 @@
+"""Seasonal order timestamps and paced event streams.
+
+A `Seasonality` describes how busy every day is relative to today: a
+weekly profile, a yearly cycle, holiday spikes and a growth trend, plus an
+hour-of-day profile. The intensity is piecewise constant per day and per
+hour, so timestamps are drawn exactly by vectorized inverse-CDF sampling
+(a searchsorted of uniform draws into the cumulative intensity) instead
+of thinning, and the order dates of ticket-0 follow the same traffic
+shape as the event stream.
+
+`pace` and `write_ndjson` replay any iterable of events at a target rate
+in events per second, for feeding downstream ingestion.
+"""
+import json
+import time
+from dataclasses import dataclass
+from datetime import date
+from itertools import islice
+
+import numpy as np
+
+# Monday .. Sunday
+WEEKLY = (1.0, 0.95, 0.95, 1.0, 1.05, 1.2, 1.1)
+
+# 00:00 .. 23:00; quiet nights, a lunch bump and an evening peak
+HOURLY = (0.3, 0.2, 0.15, 0.1, 0.1, 0.15, 0.3, 0.5, 0.8, 1.0, 1.1, 1.2,
+          1.3, 1.2, 1.1, 1.1, 1.2, 1.3, 1.5, 1.7, 1.8, 1.6, 1.1, 0.6)
+
+# (month, day, multiplier at the peak, spread in days)
+HOLIDAYS = (
+    (11, 27, 3.0, 1.5),    # Black Friday
+    (11, 30, 2.2, 1.0),    # Cyber Monday
+    (12, 15, 1.6, 6.0),    # Christmas shopping
+    (7, 12, 1.5, 1.0),     # Mid-summer sale
+    (1, 1, 0.6, 1.0),      # New Year's Day lull
+)
+
+_EPOCH_WEEKDAY = 3  # 1970-01-01 was a Thursday
+
+
+@dataclass(frozen=True)
+class Seasonality:
+    weekly: tuple = WEEKLY
+    hourly: tuple = HOURLY
+    yearly_amplitude: float = 0.2      # +-20% over the year
+    yearly_peak_day: int = 330         # day of year of the yearly maximum (late November)
+    holidays: tuple = HOLIDAYS
+    growth: float = 0.3                # yearly growth of the order volume
+
+    def intensity(self, days, today=None):
+        """Relative order volume of each of `days` (datetime64[D]); 1.0 is an average day today."""
+        days = np.asarray(days, dtype="datetime64[D]")
+        today = np.datetime64(today or date.today(), "D")
+        day_number = days.astype(np.int64)
+        years = days.astype("datetime64[Y]")
+        day_of_year = (days - years.astype("datetime64[D]")).astype(np.int64)
+
+        weekly = np.asarray(self.weekly, dtype=float)
+        rate = weekly[(day_number + _EPOCH_WEEKDAY) % 7] / weekly.mean()
+        rate = rate * (1 + self.yearly_amplitude * np.cos(2 * np.pi * (day_of_year - self.yearly_peak_day) / 365.25))
+        rate = rate * (1 + self.growth) ** ((days - today).astype(np.int64) / 365.25)
+
+        for month, day, multiplier, spread in self.holidays:
+            # Distance to the holiday in the previous, same and next year
+            distance = np.full(len(days), np.inf)
+            for shift in (-1, 0, 1):
+                months = (years + shift).astype("datetime64[M]") + (month - 1)
+                holiday = months.astype("datetime64[D]") + (day - 1)
+                distance = np.minimum(distance, np.abs((days - holiday).astype(np.int64)))
+            rate = rate * (1 + (multiplier - 1) * np.exp(-0.5 * (distance / spread) ** 2))
+        return rate
+
+    def sample(self, n, rng, start, end, today=None):
+        """`n` timestamps (datetime64[s], unsorted) in the days start..end inclusive."""
+        days = np.arange(np.datetime64(start, "D"), np.datetime64(end, "D") + 1)
+        day = days[_inverse_cdf(self.intensity(days, today=today), rng.random(n))]
+        return day.astype("datetime64[s]") + self.seconds_of_day(n, rng)
+
+    def seconds_of_day(self, n, rng):
+        """`n` offsets into a day (timedelta64[s]) following the hourly profile."""
+        hour = _inverse_cdf(np.asarray(self.hourly, dtype=float), rng.random(n))
+        return (hour * 3600 + (rng.random(n) * 3600).astype(np.int64)).astype("timedelta64[s]")
+
+
+def _inverse_cdf(weights, u):
+    cdf = np.cumsum(weights)
+    cdf /= cdf[-1]
+    cdf[-1] = 1.0
+    return np.searchsorted(cdf, u, side="right")
+
+
+# ------------------------
+# Paced output
+# ------------------------
+def pace(events, rate=None):
+    """Yield `events` at about `rate` per second (as fast as possible without one).
+
+    The schedule is absolute, so short stalls are caught up instead of
+    lowering the average rate.
+    """
+    if not rate:
+        yield from events
+        return
+    interval = 1 / rate
+    start = time.perf_counter()
+    for i, event in enumerate(events):
+        delay = start + i * interval - time.perf_counter()
+        if delay > 0.001:
+            time.sleep(delay)
+        yield event
+
+
+def _ndjson_lines(frames):
+    for frame in frames:
+        yield from frame.to_json(orient="records", lines=True, date_format="iso", date_unit="s").splitlines()
+
+
+def iter_records(frames):
+    """Rows of a stream of DataFrames as dicts, with dates as ISO strings."""
+    return map(json.loads, _ndjson_lines(frames))
+
+
+def write_ndjson(frames, out, rate=None, limit=None):
+    """Write the rows of `frames` to the text stream `out` as NDJSON at `rate` events/s.
+
+    Returns the number of events written.
+    """
+    written = 0
+    for line in pace(islice(_ndjson_lines(frames), limit), rate):
+        out.write(line + "\n")
+        if rate:
+            # Consumers should see each event when it is due, not when the buffer fills
+            out.flush()
+        written += 1
+    return written
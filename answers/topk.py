@@ -0,0 +1,255 @@
+"""Top-K queries without sorting every key, for batches and streams.
+
+Batch: `top_k` picks the k largest entries of an accumulator array with
+np.argpartition, which is linear in the number of keys, and sorts only
+those k. `top_k_by` first sums the weights per key into a dense array
+(np.bincount over dense ids or category codes), so "top 10 customers by
+revenue" is two linear passes instead of a groupby plus a full sort.
+
+Streams: a `SpaceSaving` summary keeps `capacity` weighted counters and a
+`CountMinSketch` a depth x width table of totals; both have fixed memory
+whatever the number of keys, and both merge across chunks or shards.
+`HeavyHitters` feeds order chunks to one of each per dimension (customers,
+products, locations) and reports the top keys with error bounds:
+
+    SpaceSaving(eps)            every estimate within eps * total weight
+    CountMinSketch(eps, delta)  overestimate at most eps * total, with probability 1 - delta
+"""
+import math
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_K = 10
+DEFAULT_EPS = 1e-3
+DEFAULT_DELTA = 0.01
+DIMENSIONS = ("customer_id", "product_id", "location")
+
+
+# ------------------------
+# Batch
+# ------------------------
+def top_k(values, k):
+    """Positions of the `k` largest `values`, largest first (ties by position)."""
+    values = np.asarray(values)
+    k = min(k, len(values))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    picked = np.argpartition(values, len(values) - k)[len(values) - k:]
+    return picked[np.lexsort((picked, -values[picked]))]
+
+
+def _codes(keys):
+    """Dense non-negative codes of `keys` (-1 for missing) and their labels (None: the codes are the keys)."""
+    if isinstance(keys.dtype, pd.CategoricalDtype):
+        return keys.cat.codes.to_numpy(dtype=np.int64), keys.cat.categories
+    if pd.api.types.is_integer_dtype(keys.dtype):
+        values = keys.to_numpy()
+        if len(values) == 0 or values.min() >= 0:
+            return values.astype(np.intp), None
+    elif pd.api.types.is_float_dtype(keys.dtype):
+        values = keys.to_numpy(dtype=np.float64)
+        present = ~np.isnan(values)
+        if (values[present] >= 0).all() and (values[present] == np.floor(values[present])).all():
+            return np.where(present, values, -1).astype(np.int64), None
+    codes, labels = pd.factorize(keys)
+    return codes.astype(np.int64), labels
+
+
+def top_k_by(keys, weights, k):
+    """Top `k` keys by summed `weights`, largest first.
+
+    The same Series as groupby(keys).sum().sort_values(ascending=False).head(k):
+    rows with a missing key are skipped, missing weights count as 0 and only
+    keys with rows are ranked.
+    """
+    keys = pd.Series(keys)
+    name = getattr(weights, "name", None)
+    codes, labels = _codes(keys)
+    weights = np.asarray(weights, dtype=np.float64)
+    if np.isnan(weights).any():
+        weights = np.nan_to_num(weights)
+    present = codes >= 0
+    if not present.all():
+        codes, weights = codes[present], weights[present]
+    size = len(labels) if labels is not None else 0
+    observed = np.flatnonzero(np.bincount(codes, minlength=size))
+    sums = np.bincount(codes, weights=weights, minlength=size)[observed]
+
+    top = top_k(sums, k)
+    sums, positions = sums[top], observed[top]
+    index = pd.Index(positions).astype(keys.dtype) if labels is None else labels.take(positions)
+    return pd.Series(sums, index=index.rename(keys.name), name=name)
+
+
+# ------------------------
+# Streams
+# ------------------------
+class SpaceSaving:
+    """Weighted Space-Saving summary with `capacity` counters (or ceil(1/eps)).
+
+    Kept in the mergeable Misra-Gries form: a counter never exceeds its
+    key's true weight, and falls short by at most `error` =
+    (total - sum of counters) / (capacity + 1) <= total / (capacity + 1).
+    Adding `error` to every counter gives the Space-Saving overestimates.
+    Weights must be non-negative.
+    """
+
+    def __init__(self, capacity=None, eps=DEFAULT_EPS):
+        self.capacity = capacity or math.ceil(1 / eps)
+        self.keys = pd.Index([])
+        self.counts = np.empty(0)
+        self.total = 0
+
+    def _absorb(self, keys, counts):
+        index = self.keys.append(keys) if len(self.keys) else keys
+        combined = pd.Series(np.concatenate([self.counts, counts]), index=index)
+        combined = combined.groupby(level=0, sort=False).sum()
+        if len(combined) > self.capacity:
+            # Subtract the (capacity+1)-th largest counter from all and keep the positive ones
+            values = combined.to_numpy()
+            cut = np.partition(values, len(values) - self.capacity - 1)[len(values) - self.capacity - 1]
+            combined = combined[values > cut] - cut
+        self.keys, self.counts = combined.index, combined.to_numpy()
+
+    def update(self, keys, weights):
+        weights = pd.Series(np.asarray(weights), index=pd.Index(np.asarray(keys)))
+        if (weights < 0).any():
+            raise ValueError("SpaceSaving weights must be non-negative")
+        chunk = weights.groupby(level=0, sort=False).sum()
+        self.total += chunk.sum()
+        self._absorb(chunk.index, chunk.to_numpy())
+        return self
+
+    def merge(self, other):
+        self.capacity = min(self.capacity, other.capacity)
+        self.total += other.total
+        self._absorb(other.keys, other.counts)
+        return self
+
+    @property
+    def error(self):
+        return (self.total - self.counts.sum()) / (self.capacity + 1)
+
+    def top(self, n=DEFAULT_K):
+        """Top `n` keys with the bounds `lower` <= true weight <= `upper`.
+
+        `guaranteed` marks keys certain to be in the true top `n`: their lower
+        bound beats the upper bound of every key ranked below them.
+        """
+        order = top_k(self.counts, n + 1)
+        lower = self.counts[order]
+        upper = lower + self.error
+        # Upper bound of the best key outside the first n (untracked keys weigh at most `error`)
+        outside = upper[n] if len(order) > n else self.error
+        top = pd.DataFrame({"lower": lower[:n], "upper": upper[:n]}, index=self.keys.take(order[:n]))
+        top["guaranteed"] = top["lower"] >= outside
+        return top
+
+
+class CountMinSketch:
+    """Count-Min sketch of weighted keys: `depth` rows of `width` integer totals.
+
+    width = 2**ceil(log2(e / eps)) and depth = ceil(ln(1 / delta)), so an
+    estimate never undercounts and overcounts by more than eps * total only
+    with probability delta. Keys are hashed with pandas' hash_array and a
+    multiply-shift hash per row; sketches with the same parameters and
+    seed merge by adding their tables.
+    """
+
+    def __init__(self, eps=DEFAULT_EPS, delta=DEFAULT_DELTA, seed=0):
+        self.eps = eps
+        self.delta = delta
+        self.seed = seed
+        self._bits = max(1, math.ceil(math.log2(math.e / eps)))
+        depth = max(1, math.ceil(math.log(1 / delta)))
+        self.table = np.zeros((depth, 1 << self._bits), dtype=np.int64)
+        self.total = 0
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, 2 ** 63, size=depth, dtype=np.uint64) | np.uint64(1)
+        self._b = rng.integers(0, 2 ** 63, size=depth, dtype=np.uint64)
+
+    @property
+    def width(self):
+        return self.table.shape[1]
+
+    def _buckets(self, keys):
+        keys = pd.Series(keys)
+        if isinstance(keys.dtype, pd.CategoricalDtype):
+            hashes = pd.util.hash_array(keys.cat.categories.to_numpy())[keys.cat.codes.to_numpy()]
+        elif pd.api.types.is_integer_dtype(keys.dtype):
+            hashes = pd.util.hash_array(keys.to_numpy(dtype=np.int64))
+        else:
+            hashes = pd.util.hash_array(keys.to_numpy(dtype=object))
+        # uint64 products wrap around, which is what multiply-shift hashing wants
+        return (self._a[:, None] * hashes[None, :] + self._b[:, None]) >> np.uint64(64 - self._bits)
+
+    def update(self, keys, weights):
+        weights = np.asarray(weights, dtype=np.int64)
+        for row, buckets in enumerate(self._buckets(keys)):
+            self.table[row] += np.bincount(buckets.astype(np.int64), weights=weights,
+                                           minlength=self.width).round().astype(np.int64)
+        self.total += int(weights.sum())
+        return self
+
+    def merge(self, other):
+        if (other.eps, other.delta, other.seed) != (self.eps, self.delta, self.seed):
+            raise ValueError("Count-Min sketches need the same eps, delta and seed to merge")
+        self.table += other.table
+        self.total += other.total
+        return self
+
+    def estimate(self, keys):
+        buckets = self._buckets(keys).astype(np.int64)
+        return self.table[np.arange(len(self.table))[:, None], buckets].min(axis=0)
+
+
+class HeavyHitters:
+    """Top keys by revenue per dimension of an order stream, in fixed memory.
+
+    Each dimension gets a SpaceSaving summary (the candidates and their
+    bounds) and a CountMinSketch that tightens the upper bounds. Revenue is
+    counted in cents; rows with a missing key or a missing or negative
+    amount are skipped.
+    """
+
+    def __init__(self, dimensions=DIMENSIONS, k=DEFAULT_K, eps=DEFAULT_EPS, delta=DEFAULT_DELTA, seed=0):
+        self.k = k
+        # Enough counters for the top k even when eps is loose
+        capacity = max(math.ceil(1 / eps), 4 * k)
+        self.space_saving = {dim: SpaceSaving(capacity) for dim in dimensions}
+        self.count_min = {dim: CountMinSketch(eps, delta, seed) for dim in dimensions}
+        self.orders = 0
+
+    def update(self, orders, amount="total_amount"):
+        cents = np.rint(orders[amount].to_numpy(dtype=np.float64) * 100)
+        counted = ~np.isnan(cents) & (cents >= 0)
+        for dim, summary in self.space_saving.items():
+            keep = counted & orders[dim].notna().to_numpy()
+            keys, weights = orders[dim][keep], cents[keep].astype(np.int64)
+            summary.update(keys, weights)
+            self.count_min[dim].update(keys, weights)
+        self.orders += int(counted.sum())
+        return self
+
+    def merge(self, other):
+        for dim in self.space_saving:
+            self.space_saving[dim].merge(other.space_saving[dim])
+            self.count_min[dim].merge(other.count_min[dim])
+        self.orders += other.orders
+        return self
+
+    def top(self, dim, n=None):
+        """Top `n` (default k) keys of `dim`: revenue estimate, lower bound and whether the rank is certain."""
+        top = self.space_saving[dim].top(n or self.k)
+        upper = np.minimum(top["upper"].to_numpy(), self.count_min[dim].estimate(top.index.to_series()))
+        top = pd.DataFrame({"revenue": upper / 100, "min_revenue": top["lower"].to_numpy() / 100,
+                            "guaranteed": top["guaranteed"].to_numpy()}, index=top.index.rename(dim))
+        return top
+
+    def error_bounds(self):
+        """Worst-case revenue error per dimension for Space-Saving, and for Count-Min at 1 - delta."""
+        return pd.DataFrame({
+            "space_saving": {dim: s.error / 100 for dim, s in self.space_saving.items()},
+            "count_min": {dim: c.eps * c.total / 100 for dim, c in self.count_min.items()},
+        })
@@ -0,0 +1,171 @@
+"""Lightweight spans for finding slow steps, written as Chrome trace events.
+
+Tracing is off unless the ECMM_TRACE environment variable is set (to 1,
+or to the directory the trace files should go to). When off, `span`
+returns a shared no-op context manager and `traced` returns the function
+unchanged, so instrumented code pays one function call per step.
+
+When on, every span records its wall time, the thread it ran on, the
+change in resident memory and an optional row count; spans opened inside
+other spans nest. At exit the process writes
+<dir>/<script>-<pid>.json, which chrome://tracing, Perfetto or
+speedscope open as a flame graph. Spans opened in pool worker processes
+are not collected.
+
+    with span("load orders") as s:
+        orders = storage.read_table("orders")
+        s.set(rows=len(orders))
+
+    @traced()
+    def build_cube(orders): ...
+"""
+import atexit
+import functools
+import json
+import os
+import sys
+import threading
+import time
+
+TRACE_ENV = "ECMM_TRACE"
+DEFAULT_TRACE_DIR = os.path.join("data", "traces")
+
+_setting = os.environ.get(TRACE_ENV, "").strip()
+ENABLED = _setting.lower() not in ("", "0", "false", "no", "off")
+TRACE_DIR = DEFAULT_TRACE_DIR if _setting.lower() in ("1", "true", "yes", "on") else _setting
+
+# Timestamps are microseconds since the epoch so traces of several processes line up
+_EPOCH_US = time.time_ns() // 1000
+_START_NS = time.perf_counter_ns()
+_PAGE_MB = os.sysconf("SC_PAGE_SIZE") / 2 ** 20 if hasattr(os, "sysconf") else None
+
+
+def _now_us():
+    return _EPOCH_US + (time.perf_counter_ns() - _START_NS) / 1000
+
+
+def _rss_mb():
+    # Second field of statm is the resident set size in pages (Linux)
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _PAGE_MB
+    except (OSError, TypeError):
+        return None
+
+
+# ------------------------
+# Spans
+# ------------------------
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **args):
+        pass
+
+
+NULL_SPAN = _NullSpan()
+_events = []
+
+
+class Span:
+    def __init__(self, name, args):
+        self.name = name
+        self.args = args
+
+    def set(self, **args):
+        """Attach values (e.g. rows=...) to the span."""
+        self.args.update(args)
+
+    def __enter__(self):
+        self._rss = _rss_mb()
+        self._start = _now_us()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end = _now_us()
+        rss = _rss_mb()
+        if rss is not None and self._rss is not None:
+            self.args["rss_delta_mb"] = round(rss - self._rss, 2)
+            self.args["rss_mb"] = round(rss, 1)
+        if exc_type is not None:
+            self.args["error"] = exc_type.__name__
+        _events.append({"name": self.name, "ph": "X", "ts": self._start, "dur": end - self._start,
+                        "pid": os.getpid(), "tid": threading.get_ident(), "args": self.args})
+        return False
+
+
+def span(name, rows=None, **args):
+    """Context manager timing the enclosed block as `name`."""
+    if not ENABLED:
+        return NULL_SPAN
+    if rows is not None:
+        args["rows"] = rows
+    return Span(name, args)
+
+
+def _rows(result):
+    try:
+        return len(result) if hasattr(result, "shape") else None
+    except TypeError:
+        return None
+
+
+def traced(name=None):
+    """Decorator timing every call; DataFrame/array results record their row count."""
+    def decorate(fn):
+        if not ENABLED:
+            return fn
+        label = name or f"{fn.__module__}.{fn.__qualname__}"
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(label) as s:
+                result = fn(*args, **kwargs)
+                rows = _rows(result)
+                if rows is not None:
+                    s.set(rows=rows)
+                return result
+        return wrapper
+    return decorate
+
+
+# ------------------------
+# Output
+# ------------------------
+def trace_path(script, pid):
+    stem = os.path.splitext(os.path.basename(script))[0] or "python"
+    return os.path.join(TRACE_DIR, f"{stem}-{pid}.json")
+
+
+def write(path=None):
+    """Write the spans recorded so far as a Chrome trace-event file; returns its path."""
+    path = path or trace_path(sys.argv[0], os.getpid())
+    process = {"name": "process_name", "ph": "M", "pid": os.getpid(),
+               "args": {"name": os.path.basename(sys.argv[0]) or "python"}}
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w") as f:
+        json.dump({"traceEvents": [process] + _events, "displayTimeUnit": "ms"}, f)
+    return path
+
+
+def merge(paths, out_path):
+    """Combine trace files (e.g. one per pipeline stage) into one timeline."""
+    events = []
+    for path in paths:
+        if os.path.exists(path):
+            with open(path) as f:
+                events += json.load(f)["traceEvents"]
+    os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+    with open(out_path, "w") as f:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+    return out_path
+
+
+if ENABLED:
+    atexit.register(write)
@@ -0,0 +1,215 @@
+"""Referential-integrity and data-quality checks in one vectorized pass.
+
+A `Validator` checks a table chunk by chunk, so whole frames, Parquet
+batches from storage.iter_table and streamed events are validated the
+same way. Rules come from the schema plus the parent tables given:
+
+    not_null     non-nullable columns
+    unique       unique columns, across chunks, with a bitmap of ids seen
+    below_min    numeric minimum; dates before their lower bound
+    above_max    numeric maximum; dates after their upper bound (default: today)
+    not_allowed  values outside a closed set of categories
+    foreign_key  ids missing from the referenced table's id bitmap
+    amount       orders.total_amount != products.price * quantity, to the cent
+
+Memory is one bit per id for each unique or referenced column plus a
+dense price array, whatever the number of rows checked. Every rule keeps
+its violation count and the first `sample_size` offending rows.
+"""
+from datetime import date
+from functools import partial
+
+import numpy as np
+import pandas as pd
+
+import schema
+from cleaning import SeenIds
+from tracing import traced
+
+SAMPLE_SIZE = 5
+AMOUNT_TOLERANCE_CENTS = 0
+
+
+def id_bitmap(ids):
+    """SeenIds holding the non-null integer `ids`."""
+    ids = pd.Series(ids).dropna().to_numpy(dtype=np.int64)
+    bitmap = SeenIds(int(ids.max()) + 1 if len(ids) else 0)
+    bitmap.first_seen(ids)
+    return bitmap
+
+
+def price_cents_by_id(products):
+    """Dense product_id -> unit price in cents (-1 for unknown ids)."""
+    ids = products["product_id"].to_numpy(dtype=np.int64)
+    cents = np.full(int(ids.max()) + 1 if len(ids) else 0, -1, dtype=np.int64)
+    cents[ids] = np.rint(products["price"].to_numpy(dtype=np.float64) * 100)
+    return cents
+
+
+# ------------------------
+# Rules
+# ------------------------
+# Each rule takes a chunk and returns the mask of its violating rows
+def _nulls(name, chunk):
+    return chunk[name].isna().to_numpy()
+
+
+def _duplicates(name, seen, chunk):
+    col = chunk[name]
+    return ~seen.first_seen(col) & col.notna().to_numpy()
+
+
+def _below(name, bound, chunk):
+    return (chunk[name] < bound).to_numpy()
+
+
+def _above(name, bound, chunk):
+    return (chunk[name] > bound).to_numpy()
+
+
+def _not_allowed(name, allowed, chunk):
+    col = chunk[name]
+    return (~col.isin(allowed) & col.notna()).to_numpy()
+
+
+def _missing_parent(name, parent_ids, chunk):
+    col = chunk[name]
+    present = col.notna().to_numpy()
+    missing = np.zeros(len(col), dtype=bool)
+    missing[present] = ~parent_ids.contains(col.to_numpy()[present])
+    return missing
+
+
+def _amount_mismatch(price_cents, tolerance, chunk):
+    product_ids = chunk["product_id"].to_numpy(dtype=np.float64)
+    quantity = chunk["quantity"].to_numpy(dtype=np.float64)
+    total = chunk["total_amount"].to_numpy(dtype=np.float64)
+    known = (product_ids >= 0) & (product_ids < len(price_cents)) & ~np.isnan(quantity) & ~np.isnan(total)
+    known[known] = price_cents[product_ids[known].astype(np.int64)] >= 0
+
+    mismatch = np.zeros(len(chunk), dtype=bool)
+    expected = price_cents[product_ids[known].astype(np.int64)] * quantity[known]
+    mismatch[known] = np.abs(np.rint(total[known] * 100) - expected) > tolerance
+    return mismatch
+
+
+# ------------------------
+# Validator
+# ------------------------
+class Validator:
+    """Violation counts and sample rows of `table`, built from chunks.
+
+    `parents` maps table names to frames holding the referenced ids (and
+    products' prices for the amount rule); foreign keys to tables not
+    given are not checked. `date_bounds` maps date columns to (min, max),
+    either of which may be None; dates default to no later than today.
+    """
+
+    def __init__(self, table, parents=None, date_bounds=None, sample_size=SAMPLE_SIZE,
+                 amount_tolerance=AMOUNT_TOLERANCE_CENTS):
+        self.table = table
+        self.sample_size = sample_size
+        self.rows = 0
+        self.rules = self._rules(parents or {}, date_bounds or {}, amount_tolerance)
+        self.counts = {key: 0 for key in self.rules}
+        self.samples = {key: [] for key in self.rules}
+        self.missing_columns = None
+
+    def _rules(self, parents, date_bounds, amount_tolerance):
+        rules = {}
+        for column in schema.TABLES[self.table]:
+            name = column.name
+            if not column.nullable:
+                rules["not_null", name] = partial(_nulls, name)
+            if column.unique:
+                rules["unique", name] = partial(_duplicates, name, SeenIds())
+            if column.dtype.startswith("datetime64"):
+                low, high = date_bounds.get(name, (None, date.today()))
+                if low is not None:
+                    rules["below_min", name] = partial(_below, name, pd.Timestamp(low))
+                if high is not None:
+                    rules["above_max", name] = partial(_above, name, pd.Timestamp(high))
+            else:
+                if column.min is not None:
+                    rules["below_min", name] = partial(_below, name, column.min)
+                if column.max is not None:
+                    rules["above_max", name] = partial(_above, name, column.max)
+            if column.allowed is not None:
+                rules["not_allowed", name] = partial(_not_allowed, name, list(column.allowed))
+            if column.references is not None:
+                parent, parent_column = column.references.split(".")
+                if parent in parents:
+                    rules["foreign_key", name] = partial(_missing_parent, name, id_bitmap(parents[parent][parent_column]))
+        if self.table == "orders" and "products" in parents:
+            rules["amount", "total_amount"] = partial(_amount_mismatch, price_cents_by_id(parents["products"]),
+                                                      amount_tolerance)
+        return rules
+
+    def update(self, chunk):
+        if self.missing_columns is None:
+            self.missing_columns = [name for name in schema.COLUMNS[self.table] if name not in chunk.columns]
+            # Rules on absent columns cannot run; the summary lists the columns instead
+            for key in list(self.rules):
+                names = [key[1]] + (["product_id", "quantity"] if key[0] == "amount" else [])
+                if any(name not in chunk.columns for name in names):
+                    del self.rules[key], self.counts[key], self.samples[key]
+
+        for key, rule in self.rules.items():
+            mask = rule(chunk)
+            n = int(np.count_nonzero(mask))
+            if not n:
+                continue
+            self.counts[key] += n
+            have = sum(len(sample) for sample in self.samples[key])
+            if have < self.sample_size:
+                self.samples[key].append(chunk[mask].head(self.sample_size - have))
+        self.rows += len(chunk)
+        return self
+
+    @property
+    def ok(self):
+        return not self.missing_columns and not any(self.counts.values())
+
+    def summary(self):
+        """One row per rule: rule, column, violations and their share of the rows."""
+        records = [{"rule": "missing_column", "column": name, "violations": self.rows}
+                   for name in self.missing_columns or []]
+        records += [{"rule": rule, "column": name, "violations": n} for (rule, name), n in self.counts.items()]
+        summary = pd.DataFrame(records, columns=["rule", "column", "violations"])
+        summary.insert(0, "table", self.table)
+        summary["share"] = (summary["violations"] / self.rows).round(6) if self.rows else 0.0
+        return summary
+
+    def sample_rows(self, rule, column):
+        """The first offending rows of one rule."""
+        samples = self.samples.get((rule, column)) or []
+        return pd.concat(samples) if samples else pd.DataFrame()
+
+    def messages(self):
+        """Violated rules as short messages (empty when valid)."""
+        summary = self.summary()
+        return [f"{self.table}.{r.column}: {r.violations} rows fail {r.rule}"
+                for r in summary[summary["violations"] > 0].itertuples()]
+
+    def report(self):
+        print(f"\n--- {self.table.upper()} VALIDATION ({self.rows} rows) ---")
+        if self.ok:
+            print("all rules pass")
+            return
+        summary = self.summary()
+        print(summary[summary["violations"] > 0].to_string(index=False))
+        for key, samples in self.samples.items():
+            if samples:
+                print(f"\nSample rows failing {key[0]} on {key[1]}:")
+                print(self.sample_rows(*key).to_string())
+
+
+@traced()
+def validate_table(frames, table, parents=None, **kwargs):
+    """Validator of `table` run over a DataFrame or an iterable of chunks."""
+    validator = Validator(table, parents, **kwargs)
+    for chunk in [frames] if isinstance(frames, pd.DataFrame) else frames:
+        validator.update(chunk)
+    if validator.missing_columns is None:
+        validator.missing_columns = []
+    return validator
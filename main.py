@@ -1,5 +1,87 @@
+"""Run the ticket scripts as one pipeline.
+
+    python main.py                 # every stage whose inputs changed
+    python main.py rfm --force     # rfm and its upstream stages, ignoring fingerprints
+
+Stages run as soon as the stages producing their inputs are done, so the
+EDA charts, business questions and cleaning -> RFM chain run concurrently
+after generation. Logs, fingerprints and the run report (wall time, CPU
+time, peak RSS per stage) are written to data/pipeline/; with ECMM_TRACE=1
+the stage traces are also merged into one data/traces/pipeline-<pid>.json.
+Column-cache keys superseded by newer data are removed before the run.
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "answers"))
+
+import pandas as pd
+
+import column_cache
+import storage
+from pipeline import REPORT_PATH, Stage, run_pipeline
+
+TABLES = ("customers", "products", "orders")
+RAW = [storage.table_path(table, "raw") for table in TABLES]
+CLEAN = [storage.table_path(table, "clean") for table in TABLES]
+PLOT_DIR = os.path.join(storage.DATA_DIR, "plots")
+
+
+def code(*modules):
+    return [os.path.join("answers", module + ".py") for module in modules]
+
+
+def plots(*names):
+    return [os.path.join(PLOT_DIR, name + ".png") for name in names]
+
+
+# ticket-1-visualizing-data.py is the cleaning script and ticket-2-3-eda.py draws the EDA charts
+STAGES = [
+    Stage("generate", "answers/ticket-0-generate-data.py",
+          inputs=code("datagen", "timeline", "validation", "cleaning", "column_cache", "schema", "storage",
+                      "tracing"),
+          outputs=RAW + [storage.table_path(table, "raw", fmt="csv") for table in TABLES]),
+    Stage("clean", "answers/ticket-1-visualizing-data.py",
+          inputs=RAW + code("cleaning", "validation", "column_cache", "schema", "storage", "tracing"),
+          outputs=CLEAN + [storage.table_path(table, "clean", fmt="csv") for table in TABLES]),
+    Stage("eda", "answers/ticket-2-3-eda.py",
+          inputs=RAW + code("cube", "loader", "plotting", "column_cache", "schema", "storage", "topk", "tracing"),
+          outputs=plots("order_amount_distribution", "orders_per_customer", "customer_age_distribution",
+                        "customer_gender_distribution", "category_revenue", "monthly_revenue_trend")),
+    Stage("business", "answers/ticket-4-business.py",
+          inputs=RAW + code("cube", "loader", "plotting", "column_cache", "schema", "sql_engine", "storage", "topk",
+                            "tracing"),
+          outputs=plots("top_customers_revenue", "top_categories_revenue", "aov_trend", "top_regions_revenue")),
+    Stage("rfm", "answers/ticket-5-RFM.py",
+          inputs=CLEAN + code("loader", "parallel", "plotting", "quantiles", "rfm_engine", "column_cache", "schema", "storage", "tracing"),
+          outputs=plots("rfm_segments_distribution", "rfm_monetary_by_segment", "rfm_recency_frequency")
+          + ["data/clean/rfm_table.parquet"]),
+    Stage("cohorts", "answers/ticket-6-cohorts-clv.py",
+          inputs=CLEAN + code("cohorts", "plotting", "column_cache", "schema", "storage", "tracing"),
+          outputs=plots("cohort_retention_heatmap", "cohort_retention_curves", "cohort_revenue_per_customer",
+                        "clv_distribution")),
+    Stage("affinity", "answers/ticket-7-product-affinity.py",
+          inputs=CLEAN + code("affinity", "datagen", "plotting", "column_cache", "schema", "storage", "tracing"),
+          outputs=plots("category_lift_heatmap", "top_product_pairs_lift") + ["data/cache/product_neighbours.npz"]),
+]
+
+
 def main():
-    print("Hello from ecmm-data!")
+    parser = argparse.ArgumentParser(description="Run the ticket pipeline.")
+    parser.add_argument("stages", nargs="*", help="stages to run (with their upstream stages); default all")
+    parser.add_argument("--force", action="store_true", help="run stages even if their inputs are unchanged")
+    parser.add_argument("--workers", type=int, default=None, help="maximum number of concurrent stages")
+    args = parser.parse_args()
+
+    # No stage is running yet, so superseded cache keys can go
+    column_cache.prune(os.path.join(storage.DATA_DIR, "cache"))
+    records = run_pipeline(STAGES, only=args.stages, force=args.force, workers=args.workers)
+    report = pd.DataFrame(records).set_index("stage")
+    print(report.drop(columns=["log", "trace"], errors="ignore").to_string())
+    print(f"Run report saved to {REPORT_PATH}")
+    if (report["status"].isin(["failed", "blocked"])).any():
+        sys.exit(1)
 
 
 if __name__ == "__main__":
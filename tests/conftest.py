@@ -0,0 +1,45 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "answers"))
+
+from datagen import CATEGORIES  # noqa: E402
+
+
+def make_products(n=40, seed=0):
+    rng = np.random.default_rng(seed)
+    categories = rng.choice(list(CATEGORIES), size=n)
+    return pd.DataFrame({
+        "product_id": np.arange(1, n + 1),
+        "category": categories,
+        "product_name": [f"{CATEGORIES[c][0]} {i}" for i, c in enumerate(categories, 1)],
+        "price": np.round(rng.uniform(5, 2000, size=n), 2),
+    })
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """Run in an empty directory, so the modules' relative data/ paths point into it."""
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+@pytest.fixture
+def products():
+    return make_products()
+
+
+@pytest.fixture
+def raw_data(workdir, products):
+    """A small generated raw layer in data/raw/ of the working directory."""
+    import datagen
+    import storage
+
+    storage.write_table(products, "products", "raw")
+    datagen.generate_sharded(80, products, 1500, "data/raw", seed=5, n_shards=2, chunk_size=256,
+                             cache_dir="data/cache")
+    return workdir
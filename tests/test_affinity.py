@@ -0,0 +1,44 @@
+import numpy as np
+import pandas as pd
+
+import affinity
+
+
+def _orders(n=3000, customers=200, products=30, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({"customer_id": rng.integers(1, customers, n), "product_id": rng.integers(1, products, n)})
+
+
+def test_measures_match_a_dense_brute_force():
+    orders = _orders()
+    bought = affinity.incidence([orders.iloc[i:i + 500] for i in range(0, len(orders), 500)])
+    pairs = affinity.co_occurrence(bought, block_rows=37)
+
+    dense = np.zeros(bought.shape, dtype=np.int64)
+    dense[orders["customer_id"], orders["product_id"]] = 1
+    assert (bought.toarray() == dense).all()
+    expected = dense.T @ dense
+    assert (pairs.toarray() == expected).all()
+
+    customers = int(dense.any(axis=1).sum())
+    measures = affinity.affinity(pairs, customers, min_count=3)
+    support = np.diag(expected).astype(float)
+    counts = np.where(expected >= 3, expected, 0).astype(float)
+    np.fill_diagonal(counts, 0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        brute = {
+            "co_occurrence": counts,
+            "confidence": counts / support[:, None],
+            "lift": counts * customers / np.outer(support, support),
+            "cosine": counts / np.sqrt(np.outer(support, support)),
+        }
+    for name, matrix in brute.items():
+        assert np.allclose(measures[name].toarray(), np.nan_to_num(matrix)), name
+
+    neighbours, values = affinity.top_neighbours(measures["lift"], n=5, block_rows=7)
+    for product in range(1, pairs.shape[0]):
+        row = np.nan_to_num(brute["lift"][product])
+        best = np.lexsort((np.arange(len(row)), -row))[:5]
+        best = best[row[best] > 0]
+        assert neighbours[product][:len(best)].tolist() == best.tolist()
+        assert np.allclose(values[product][:len(best)], row[best])
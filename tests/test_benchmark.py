@@ -0,0 +1,37 @@
+import json
+import os
+
+import benchmark
+
+
+def test_every_stage_runs_on_a_small_dataset(workdir):
+    results = benchmark.run_size(2000, str(workdir / "work"))
+    assert [r["stage"] for r in results] == list(benchmark.STAGES)
+    assert all(r["rows"] > 0 and r["seconds"] >= 0 for r in results)
+    assert os.getcwd() == str(workdir) and not os.path.exists(workdir / "work")
+
+
+def test_compare_flags_stages_slower_than_the_tolerance():
+    baseline = {"results": [
+        {"n_orders": 100, "stage": "clean", "seconds": 1.0, "peak_rss_mb": 50.0},
+        {"n_orders": 100, "stage": "merge", "seconds": 1.0, "peak_rss_mb": 50.0},
+        {"n_orders": 100, "stage": "rfm", "seconds": 1.0, "peak_rss_mb": 50.0},
+    ]}
+    results = [
+        {"n_orders": 100, "stage": "clean", "seconds": 1.1, "peak_rss_mb": 50.0},
+        {"n_orders": 100, "stage": "merge", "seconds": 1.5, "peak_rss_mb": 50.0},
+        {"n_orders": 1000, "stage": "rfm", "seconds": 9.0, "peak_rss_mb": 50.0},
+    ]
+    report = benchmark.compare(results, baseline, tolerance=0.2)
+    assert list(report.index) == [(100, "clean"), (100, "merge")]
+    assert report["regression"].tolist() == [False, True]
+
+
+def test_main_fails_on_regressions(workdir):
+    with open("baseline.json", "w") as f:
+        json.dump({"results": [{"n_orders": 2000, "stage": "generate", "seconds": 1e-9, "peak_rss_mb": 1.0}]}, f)
+    code = benchmark.main(["--orders", "2000", "--stages", "generate", "--output", "results.json",
+                           "--baseline", "baseline.json"])
+    assert code == 1
+    with open("results.json") as f:
+        assert [r["stage"] for r in json.load(f)["results"]] == ["generate"]
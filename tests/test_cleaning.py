@@ -0,0 +1,56 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+import cleaning
+import schema
+import storage
+
+
+def _dirty_orders(n=1000, seed=0):
+    rng = np.random.default_rng(seed)
+    orders = pd.DataFrame({
+        "order_id": rng.integers(1, 800, size=n),           # repeats across batches
+        "customer_id": rng.integers(1, 60, size=n).astype(float),
+        "product_id": rng.integers(1, 30, size=n),
+        "order_date": pd.Timestamp("2024-01-01") + pd.to_timedelta(rng.integers(0, 365, size=n), unit="D"),
+        "quantity": rng.integers(1, 6, size=n).astype(float),
+        "total_amount": np.round(rng.uniform(5, 500, size=n), 2),
+    })
+    orders.loc[rng.random(n) < 0.05, "customer_id"] = np.nan
+    orders.loc[rng.random(n) < 0.05, "quantity"] = np.nan
+    orders.loc[rng.random(n) < 0.05, "total_amount"] = np.nan
+    return orders
+
+
+def test_streaming_clean_matches_in_memory_clean(workdir, monkeypatch):
+    monkeypatch.setattr(storage, "MMAP_CACHE", False)
+    os.makedirs("data/raw")
+    _dirty_orders().to_csv(storage.table_path("orders", "raw", fmt="csv"), index=False)
+
+    expected = cleaning.clean_orders(storage.read_table("orders", "raw")).drop_duplicates(subset="order_id")
+    rows_read, summary = cleaning.stream_clean_orders("raw", "clean", batch_size=97)
+    streamed = storage.read_table("orders", "clean")
+
+    assert rows_read == 1000
+    pd.testing.assert_frame_equal(streamed, expected.reset_index(drop=True))
+    assert summary.rows == len(expected)
+    assert summary.null_counts()["total_amount"] == expected["total_amount"].isna().sum()
+
+
+def test_merged_summaries_equal_the_summary_of_the_whole_frame():
+    orders = schema.widen(cleaning.clean_orders(_dirty_orders(n=3000, seed=1)), "orders")
+    bounds = [0, 700, 1900, len(orders)]
+    parts = [cleaning.SummaryAccumulator().update(orders.iloc[start:end])
+             for start, end in zip(bounds[:-1], bounds[1:])]
+    merged = parts[0].merge(parts[1]).merge(parts[2])
+    whole = cleaning.SummaryAccumulator().update(orders)
+
+    assert merged.rows == len(orders)
+    pd.testing.assert_series_equal(merged.null_counts(), whole.null_counts())
+    expected = orders.describe()
+    stats = merged.describe()
+    for name in ["quantity", "total_amount"]:
+        for stat in ["count", "mean", "std", "min", "max"]:
+            assert np.isclose(float(stats.loc[stat, name]), float(expected.loc[stat, name]), rtol=1e-9), (name, stat)
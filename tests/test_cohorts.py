@@ -0,0 +1,49 @@
+import warnings
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import cohorts
+
+
+def _simulate_bgnbd(r, alpha, a, b, n, rng):
+    """Repeat counts, recency and age (whole days) of BG/NBD customers observed 200-400 days."""
+    rates = rng.gamma(r, 1 / alpha, n)
+    dropout = rng.beta(a, b, n)
+    T = rng.integers(200, 401, n)
+    x, t_x = np.zeros(n, dtype=np.int64), np.zeros(n)
+    for i in range(n):
+        t = 0.0
+        while True:
+            t += rng.exponential(1 / rates[i])
+            if t > T[i]:
+                break
+            x[i], t_x[i] = x[i] + 1, t
+            if rng.random() < dropout[i]:
+                break
+    return pd.DataFrame({"x": x, "t_x": np.floor(t_x).astype(np.int64), "T": T})
+
+
+def test_fit_bgnbd_recovers_the_parameters_of_simulated_customers():
+    truth = {"r": 0.5, "alpha": 10.0, "a": 0.8, "b": 2.5}
+    inputs = _simulate_bgnbd(**truth, n=8000, rng=np.random.default_rng(0))
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        params = cohorts.fit_bgnbd(inputs)
+    assert params["converged"] and params["at_bound"] == []
+    for name, value in truth.items():
+        assert params[name] == pytest.approx(value, rel=0.25), name
+    assert params["r"] / params["alpha"] == pytest.approx(truth["r"] / truth["alpha"], rel=0.1)
+
+    alive = cohorts.p_alive(params, inputs["x"], inputs["t_x"], inputs["T"])
+    assert ((alive > 0) & (alive <= 1)).all() and alive.min() < 0.5
+
+
+def test_fit_bgnbd_warns_when_nobody_drops_out():
+    # Everyone buys every month up to now: no dropout and identical rates
+    inputs = pd.DataFrame({"x": np.arange(10, 40), "t_x": np.arange(10, 40), "T": np.arange(10, 40)})
+    with pytest.warns(RuntimeWarning, match="degenerate"):
+        params = cohorts.fit_bgnbd(inputs)
+    assert "a" in params["at_bound"]
@@ -0,0 +1,62 @@
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+import column_cache
+import storage
+
+
+def _frame():
+    return pd.DataFrame({
+        "id": np.arange(5, dtype="int32"),
+        "amount": np.array([1.5, 2.25, 3.0, 4.75, 5.5], dtype="float32"),
+        "city": pd.Categorical(["a", "b", "a", "c", "b"]),
+        "name": ["x", "y", "z", "x", "y"],
+        "day": pd.to_datetime(["2024-01-01"] * 5).astype("datetime64[s]"),
+    })
+
+
+def test_saved_frames_map_back_with_their_values_and_dtypes(tmp_path):
+    df = _frame()
+    column_cache.save(df, str(tmp_path), "k1")
+    loaded = column_cache.load(str(tmp_path), "k1")
+
+    pd.testing.assert_frame_equal(loaded.drop(columns="name"), df.drop(columns="name"), check_categorical=False)
+    assert loaded["name"].astype(str).tolist() == df["name"].tolist()
+    assert list(column_cache.load(str(tmp_path), "k1", columns=["day", "id"]).columns) == ["day", "id"]
+    assert column_cache.load(str(tmp_path), "k1", columns=["missing"]) is None
+    assert column_cache.load(str(tmp_path), "other") is None
+
+
+def test_prune_keeps_the_newest_key_and_removed_files_read_as_a_miss(tmp_path):
+    base = str(tmp_path / "orders")
+    column_cache.save(_frame(), base, "old")
+    time.sleep(0.01)
+    column_cache.save(_frame(), base, "new")
+    os.makedirs(os.path.join(base, "new.123.tmp"))
+
+    assert column_cache.prune(str(tmp_path)) == 2
+    assert sorted(os.listdir(base)) == ["new"]
+
+    os.remove(os.path.join(base, "new", "c0.npy"))
+    assert column_cache.load(base, "new") is None
+
+
+def test_read_table_caches_only_the_requested_columns(raw_data, monkeypatch):
+    monkeypatch.setattr(storage, "MMAP_CACHE", True)
+    columns = ["order_date", "customer_id", "total_amount"]
+    mapped = storage.read_table("orders", "raw", columns=columns)
+    base = os.path.join(storage.COLUMN_CACHE_DIR, "raw_orders")
+    assert sorted(os.listdir(base)) == sorted(columns)
+
+    monkeypatch.setattr(storage, "MMAP_CACHE", False)
+    pd.testing.assert_frame_equal(mapped, storage.read_table("orders", "raw", columns=columns),
+                                  check_categorical=False)
+
+    monkeypatch.setattr(storage, "MMAP_CACHE", True)
+    filtered = storage.read_table("orders", "raw", columns=["order_id", "quantity"],
+                                  filters=[("quantity", ">", 2)])
+    assert (filtered["quantity"] > 2).all()
+    assert sorted(os.listdir(base)) == sorted(columns)
@@ -0,0 +1,72 @@
+import numpy as np
+import pandas as pd
+
+import cube as revenue_cube
+import loader
+import storage
+
+
+def test_load_cube_folds_appended_orders_like_a_full_rebuild(raw_data, monkeypatch):
+    orders = storage.read_table("orders", "raw").sort_values("order_id", ignore_index=True)
+    storage.write_table(orders.iloc[:1000], "orders", "raw")
+    revenue_cube.load_cube("raw")
+
+    storage.write_table(orders, "orders", "raw")
+    load_star = loader.load_star
+
+    def no_star(*args, **kwargs):
+        raise AssertionError("cube rebuilt from the star schema")
+
+    monkeypatch.setattr(loader, "load_star", no_star)
+    appended = revenue_cube.load_cube("raw")
+    monkeypatch.setattr(loader, "load_star", load_star)
+    rebuilt = revenue_cube.build_cube(loader.load_star("raw", columns=revenue_cube.STAR_COLUMNS))
+
+    keys = revenue_cube.CUBE_KEYS
+    appended = appended.set_index(keys).sort_index()
+    rebuilt = rebuilt.set_index(keys).sort_index()
+    assert appended.index.equals(rebuilt.index)
+    assert np.allclose(appended["revenue"], rebuilt["revenue"])
+    assert (appended[["orders", "quantity"]] == rebuilt[["orders", "quantity"]]).all().all()
+
+    # Roll-ups of the cube answer the same as the order table
+    star = loader.load_star("raw")
+    by_category = revenue_cube.revenue_by(appended.reset_index(), "category")
+    expected = star.assign(total_amount=star["total_amount"].astype("float64").round(2)) \
+        .groupby("category", observed=True)["total_amount"].sum()
+    pd.testing.assert_series_equal(by_category.sort_index(), expected.sort_index(), check_names=False)
+
+
+def test_load_cube_rebuilds_when_orders_are_rewritten(raw_data, monkeypatch):
+    revenue_cube.load_cube("raw")
+    orders = storage.read_table("orders", "raw")
+    storage.write_table(orders.iloc[::2], "orders", "raw")
+
+    calls = []
+    load_star = loader.load_star
+    monkeypatch.setattr(loader, "load_star", lambda *a, **k: calls.append(a) or load_star(*a, **k))
+    cube = revenue_cube.load_cube("raw")
+    assert calls and cube["orders"].sum() == len(orders.iloc[::2])
+
+
+def test_load_cube_rebuilds_when_earlier_orders_change(raw_data, monkeypatch):
+    orders = storage.read_table("orders", "raw").sort_values("order_id", ignore_index=True)
+    storage.write_table(orders.iloc[:1000], "orders", "raw")
+    revenue_cube.load_cube("raw")
+
+    calls = []
+    load_star = loader.load_star
+    monkeypatch.setattr(loader, "load_star", lambda *a, **k: calls.append(a) or load_star(*a, **k))
+
+    # Same count, same dimensions, different amounts
+    regenerated = orders.iloc[:1000].assign(total_amount=orders["total_amount"].iloc[:1000] + 1)
+    storage.write_table(regenerated, "orders", "raw")
+    cube = revenue_cube.load_cube("raw")
+    assert len(calls) == 1
+    assert np.isclose(cube["revenue"].sum(), regenerated["total_amount"].astype("float64").sum())
+
+    # Earlier rows changed and new order ids appended
+    changed = pd.concat([orders.iloc[:1000].iloc[::-1], orders.iloc[1000:]], ignore_index=True)
+    storage.write_table(changed, "orders", "raw")
+    cube = revenue_cube.load_cube("raw")
+    assert len(calls) == 2 and cube["orders"].sum() == len(changed)
@@ -0,0 +1,79 @@
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+import datagen
+
+TODAY = date(2025, 6, 30)
+
+
+def _plan(products, n_customers=50, seed=0):
+    rng = np.random.default_rng(seed)
+    pools = {"first_names": np.array(["Ann", "Bob"]), "last_names": np.array(["Lee", "Kim"]),
+             "cities": np.array(["Austin", "Boston", "Denver"])}
+    customers = datagen.generate_customers(np.arange(1, n_customers + 1), rng, pools, today=TODAY)
+    active, counts = datagen.draw_order_counts(customers["customer_id"], rng)
+    return customers, active, counts, rng
+
+
+def test_iter_orders_emits_bounded_chunks_of_consistent_orders(products):
+    customers, active, counts, rng = _plan(products)
+    n_orders = int(counts.sum()) - 17
+    chunks = list(datagen.iter_orders(customers, products, active, counts, rng, n_orders=n_orders,
+                                      chunk_size=100, start_order_id=11, today=TODAY))
+
+    assert all(len(chunk) <= 100 for chunk in chunks)
+    orders = pd.concat(chunks, ignore_index=True)
+    assert len(orders) == n_orders
+    assert (orders["order_id"].to_numpy() == np.arange(11, 11 + n_orders)).all()
+    # Customers are expanded in plan order, each with its drawn count (the last one truncated)
+    expected_owners = np.repeat(active, counts)[:n_orders]
+    assert (orders["customer_id"].to_numpy() == expected_owners).all()
+    prices = products.set_index("product_id")["price"]
+    assert np.allclose(orders["total_amount"], (prices[orders["product_id"]].to_numpy() * orders["quantity"]).round(2))
+    window_start = np.datetime64(TODAY) - datagen.DATE_WINDOW_DAYS
+    assert orders["order_date"].between(pd.Timestamp(window_start), pd.Timestamp(TODAY)).all()
+
+
+def _generate(products, out, seed, n_shards, n_workers, tmp_path):
+    manifest = datagen.generate_sharded(60, products, 900, str(out), seed, n_shards=n_shards,
+                                        n_workers=n_workers, chunk_size=128, cache_dir=str(tmp_path / "pools"))
+    customers = pd.read_parquet(out / "customers.parquet")
+    orders = pd.read_parquet(out / "orders.parquet")
+    # Dates are relative to today; compare everything else
+    return manifest, customers.drop(columns="signup_date"), orders.drop(columns="order_date")
+
+
+def test_sharded_output_depends_on_seed_and_shards_not_workers(products, tmp_path):
+    manifest, customers, orders = _generate(products, tmp_path / "serial", 7, 3, 1, tmp_path)
+    _, customers_pool, orders_pool = _generate(products, tmp_path / "pool", 7, 3, 3, tmp_path)
+    _, _, orders_other_seed = _generate(products, tmp_path / "seed", 8, 3, 1, tmp_path)
+
+    pd.testing.assert_frame_equal(customers, customers_pool)
+    pd.testing.assert_frame_equal(orders, orders_pool)
+    assert not orders.equals(orders_other_seed)
+    # Order ids are global, contiguous and capped at n_orders across shards
+    assert manifest["orders"] == len(orders) == 900
+    assert (orders["order_id"].to_numpy() == np.arange(1, 901)).all()
+    ranges = [shard["customer_id_range"] for shard in manifest["shards"]]
+    assert ranges[0][0] == 1 and ranges[-1][1] == 60
+    assert all(a[1] + 1 == b[0] for a, b in zip(ranges, ranges[1:]))
+
+
+def test_faker_pools_are_cached_and_customers_sample_from_them(tmp_path, monkeypatch):
+    pools = datagen.build_faker_pools(3, size=200, cache_dir=str(tmp_path))
+
+    def no_faker(*args, **kwargs):
+        raise AssertionError("Faker called although the pools are cached")
+
+    monkeypatch.setattr(datagen, "Faker", no_faker)
+    cached = datagen.build_faker_pools(3, size=200, cache_dir=str(tmp_path))
+    assert all((pools[key] == cached[key]).all() for key in pools)
+
+    customers = datagen.generate_customers(np.arange(1, 501), np.random.default_rng(0), cached, city_skew=1.0)
+    names = customers["name"].str.split(" ", n=1, expand=True)
+    assert names[0].isin(pools["first_names"]).all() and names[1].isin(pools["last_names"]).all()
+    assert customers["location"].isin(pools["cities"]).all()
+    # Zipf skew: the first city of the shuffled pool is the most common
+    assert customers["location"].value_counts().index[0] == pools["cities"][0]
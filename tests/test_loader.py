@@ -0,0 +1,30 @@
+import pandas as pd
+import pytest
+
+import loader
+import storage
+
+
+def test_load_star_matches_merge_and_is_served_from_the_cache(raw_data, monkeypatch):
+    star = loader.load_star("raw")
+
+    orders = pd.read_parquet("data/raw/orders.parquet")
+    customers = pd.read_parquet("data/raw/customers.parquet")
+    products = pd.read_parquet("data/raw/products.parquet")
+    expected = orders.merge(customers, on="customer_id", how="left").merge(products, on="product_id", how="left")
+    assert list(star.columns) == list(expected.columns)
+    for name in expected.columns:
+        assert (star[name].astype(str).to_numpy() == expected[name].astype(str).to_numpy()).all(), name
+
+    def no_rebuild(layer):
+        raise AssertionError("star rebuilt although its sources are unchanged")
+
+    monkeypatch.setattr(loader, "build_star", no_rebuild)
+    cached = loader.load_star("raw", columns=["order_id", "category"])
+    assert list(cached.columns) == ["order_id", "category"]
+    assert (cached["category"].astype(str) == star["category"].astype(str)).all()
+
+    # A changed source file changes the key and forces a rebuild
+    storage.write_table(orders.head(10), "orders", "raw")
+    with pytest.raises(AssertionError, match="rebuilt"):
+        loader.load_star("raw")
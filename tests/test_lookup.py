@@ -0,0 +1,74 @@
+import json
+import threading
+from http.server import ThreadingHTTPServer
+from urllib.error import HTTPError
+from urllib.request import urlopen
+
+import pytest
+
+import lookup
+import storage
+from rfm_engine import RFMState, save_scores, score_rfm
+
+
+@pytest.fixture
+def index(raw_data, monkeypatch):
+    monkeypatch.setattr(storage, "MMAP_CACHE", False)
+    for table in ("customers", "products", "orders"):
+        storage.write_table(storage.read_table(table, "raw"), table, "clean")
+    save_scores(score_rfm(RFMState.from_orders(storage.read_table("orders", "clean")).table()))
+    return lookup.LookupIndex.open("clean")
+
+
+@pytest.fixture
+def server(index):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), lookup._handler(index))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+    server.server_close()
+
+
+def _get(url):
+    try:
+        with urlopen(url) as response:
+            return response.status, json.load(response)
+    except HTTPError as e:
+        return e.code, json.load(e)
+
+
+def test_lookups_match_the_order_table(index):
+    orders = storage.read_table("orders", "clean")
+    customer_id = int(orders["customer_id"].mode()[0])
+    expected = orders[orders["customer_id"] == customer_id].sort_values(["order_date", "order_id"])
+
+    found = index.customer_orders(customer_id)
+    assert sorted(found["order_id"]) == sorted(expected["order_id"])
+    assert found["order_date"].is_monotonic_increasing
+    start = str(expected["order_date"].iloc[len(expected) // 2].date())
+    assert (index.customer_orders(customer_id, start=start)["order_date"] >= start).all()
+    assert index.profile(customer_id)["lifetime_spend"] == round(float(expected["total_amount"].astype("float64")
+                                                                         .round(2).sum()), 2)
+    assert index.customer(10 ** 9) is None and index.customer_orders(10 ** 9).empty
+
+    # Reopening maps the saved index instead of rebuilding it
+    assert len(lookup.LookupIndex.open("clean").orders) == len(orders)
+
+
+def test_http_routes_answer_200_400_and_404(index, server):
+    customer_id = int(index.customers["customer_id"].iloc[0])
+    status, body = _get(f"{server}/customers/{customer_id}")
+    assert status == 200 and body["customer"]["customer_id"] == customer_id
+    assert all(type(body["customer"][name]) is int for name in ("R_Score", "RFM_Segment", "Frequency"))
+    status, body = _get(f"{server}/customers?from={customer_id}&to={customer_id}")
+    assert status == 200 and type(body[0]["R_Score"]) is int
+
+    status, body = _get(f"{server}/products?from=1&to=5")
+    assert status == 200 and [p["product_id"] for p in body] == [1, 2, 3, 4, 5]
+
+    assert _get(f"{server}/customers?from=1")[0] == 400
+    assert _get(f"{server}/products?from=a&to=5")[0] == 400
+    assert _get(f"{server}/customers/999999999")[0] == 404
+    assert _get(f"{server}/products/999999/orders")[0] == 404
+    assert _get(f"{server}/nowhere")[0] == 404
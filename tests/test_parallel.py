@@ -0,0 +1,36 @@
+import numpy as np
+import pandas as pd
+
+import loader
+import parallel
+import storage
+
+
+def test_parallel_aggregation_equals_the_serial_path_and_pandas(raw_data, monkeypatch):
+    monkeypatch.setattr(storage, "MMAP_CACHE", False)
+    star = loader.build_star("raw")
+    names = list(parallel.AGGREGATIONS)
+
+    serial = parallel.aggregate(star, names, workers=1)
+    sharded = parallel.aggregate(star, names, workers=3, partitions=7)
+    serial["rfm_state"], sharded["rfm_state"] = serial["rfm_state"].table(), sharded["rfm_state"].table()
+    for name in names:
+        if isinstance(serial[name], (pd.Series, pd.DataFrame)):
+            assert serial[name].equals(sharded[name]), name
+        else:
+            assert serial[name] == sharded[name], name
+
+    amounts = star["total_amount"].astype("float64").round(2)
+    expected = amounts.groupby(star["category"].astype(str)).sum()
+    revenue = serial["category_revenue"]
+    assert np.allclose(revenue, expected.reindex(revenue.index.astype(str)))
+    assert serial["max_order_id"] == star["order_id"].max()
+    assert serial["orders_per_customer"].sum() == len(star)
+
+
+def test_partitions_hold_every_row_once_and_every_customer_in_one_partition():
+    customer_ids = np.random.default_rng(0).integers(1, 500, 10_000)
+    rows, offsets = parallel.partition_rows(customer_ids, 8)
+    assert np.array_equal(np.sort(rows), np.arange(len(customer_ids)))
+    owner = np.repeat(np.arange(8), np.diff(offsets))
+    assert (pd.Series(owner).groupby(customer_ids[rows]).nunique() == 1).all()
@@ -0,0 +1,48 @@
+import pytest
+
+import pipeline
+from pipeline import Stage
+
+
+def _script(path, body):
+    path.write_text(body)
+    return str(path)
+
+
+@pytest.fixture
+def stages(workdir):
+    a = _script(workdir / "a.py", "open('a.txt', 'w').write('a')\n")
+    b = _script(workdir / "b.py", "open('b.txt', 'w').write(open('a.txt').read() + 'b')\n")
+    c = _script(workdir / "c.py", "raise SystemExit(1)\n")
+    d = _script(workdir / "d.py", "open('d.txt', 'w').write('d')\n")
+    return [
+        Stage("b", b, inputs=["a.txt"], outputs=["b.txt"]),
+        Stage("a", a, outputs=["a.txt"]),
+        Stage("c", c, inputs=["a.txt"], outputs=["c.txt"]),
+        Stage("d", d, inputs=["c.txt"], outputs=["d.txt"]),
+    ]
+
+
+def _statuses(records):
+    return {record["stage"]: record["status"] for record in records}
+
+
+def test_pipeline_runs_in_order_skips_fresh_stages_and_blocks_after_failures(stages, workdir):
+    assert pipeline.build_graph(stages) == {"a": set(), "b": {"a"}, "c": {"a"}, "d": {"c"}}
+
+    first = _statuses(pipeline.run_pipeline(stages))
+    assert first == {"a": "ok", "b": "ok", "c": "failed", "d": "blocked"}
+    assert (workdir / "b.txt").read_text() == "ab"
+
+    assert _statuses(pipeline.run_pipeline(stages, only=["b"])) == {"a": "skipped", "b": "skipped"}
+    (workdir / "b.txt").unlink()
+    assert _statuses(pipeline.run_pipeline(stages, only=["b"])) == {"a": "skipped", "b": "ok"}
+    assert _statuses(pipeline.run_pipeline(stages, only=["b"], force=True)) == {"a": "ok", "b": "ok"}
+
+
+def test_build_graph_rejects_cycles_and_shared_outputs():
+    with pytest.raises(ValueError, match="cycle"):
+        pipeline.build_graph([Stage("x", "x.py", inputs=["y"], outputs=["x"]),
+                              Stage("y", "y.py", inputs=["x"], outputs=["y"])])
+    with pytest.raises(ValueError, match="written by both"):
+        pipeline.build_graph([Stage("x", "x.py", outputs=["out"]), Stage("y", "y.py", outputs=["out"])])
@@ -0,0 +1,21 @@
+import os
+
+import pandas as pd
+
+from plotting import ChartSpec, histogram, render_charts
+
+
+def test_render_charts_only_redraws_changed_charts(workdir):
+    values = {"bar": pd.Series([3, 1, 2], index=["a", "b", "c"])}
+    specs = [
+        ChartSpec("bars", lambda: values["bar"], "bar", "Bars"),
+        ChartSpec("hist", lambda: histogram(pd.Series(range(100)), bins=10), "hist", "Histogram"),
+    ]
+
+    assert render_charts(specs, "plots", workers=1) == {"bars": "rendered", "hist": "rendered"}
+    assert os.path.exists("plots/bars.png") and os.path.exists("plots/hist.png")
+    assert render_charts(specs, "plots", workers=1) == {"bars": "unchanged", "hist": "unchanged"}
+
+    values["bar"] = pd.Series([3, 1, 5], index=["a", "b", "c"])
+    os.remove("plots/hist.png")
+    assert render_charts(specs, "plots", workers=1) == {"bars": "rendered", "hist": "rendered"}
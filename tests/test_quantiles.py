@@ -0,0 +1,26 @@
+import numpy as np
+
+from quantiles import KLLSketch
+
+
+def test_merged_sketches_answer_quantiles_within_the_rank_error():
+    eps = 0.01
+    rng = np.random.default_rng(0)
+    values = rng.lognormal(mean=4, sigma=1.2, size=200_000)
+
+    shards = []
+    for i, shard in enumerate(np.array_split(values, 4)):
+        sketch = KLLSketch(eps, seed=i)
+        for chunk in np.array_split(shard, 10):
+            sketch.update(chunk)
+        shards.append(sketch)
+    merged = shards[0]
+    for other in shards[1:]:
+        merged.merge(other)
+
+    qs = np.linspace(0.05, 0.95, 19)
+    estimates = merged.quantile(qs)
+    ranks = np.searchsorted(np.sort(values), estimates) / len(values)
+    assert merged.n == len(values)
+    assert merged.size() < len(values) / 50
+    assert np.abs(ranks - qs).max() < 2 * eps
@@ -0,0 +1,93 @@
+import numpy as np
+import pandas as pd
+
+import loader
+import rfm_engine
+import storage
+from rfm_engine import RFMState
+
+
+def _orders(n=3000, customers=200, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "order_id": np.arange(1, n + 1),
+        "customer_id": rng.integers(1, customers + 1, size=n).astype(np.int32),
+        "order_date": pd.Timestamp("2023-01-01") + pd.to_timedelta(np.sort(rng.integers(0, 700, size=n)), unit="D"),
+        "total_amount": np.round(rng.uniform(5, 2000, size=n), 2).astype(np.float32),
+    })
+
+
+def test_incremental_rfm_equals_full_rebuild(tmp_path):
+    orders = _orders()
+    # The last delta brings customers the state has never seen
+    orders.loc[orders["order_id"] > 2700, "customer_id"] += 150
+    path = str(tmp_path / "rfm_state.npz")
+    RFMState.from_orders(orders[orders["order_id"] <= 1000]).save(path)
+
+    # Daily deltas: reload the saved state and fold only the orders after its max_order_id
+    for day_end in (1700, 2400, 3000):
+        state = RFMState.load(path)
+        delta = orders[(orders["order_id"] > state.max_order_id) & (orders["order_id"] <= day_end)]
+        state.fold(delta).save(path)
+
+    incremental = RFMState.load(path)
+    full = RFMState.from_orders(orders)
+    assert incremental.max_order_id == full.max_order_id == 3000
+    pd.testing.assert_frame_equal(incremental.table(), full.table())
+
+
+def _segment_row(row):
+    # The original row-wise rules of ticket-5
+    if row["RFM_Score"] >= 12:
+        return "Champions"
+    elif row["RFM_Score"] >= 9:
+        return "Loyal"
+    elif row["RFM_Score"] >= 6:
+        return "Potential Loyalist"
+    elif row["R_Score"] >= 4 and row["F_Score"] <= 2:
+        return "New Customer"
+    elif row["R_Score"] <= 2 and row["F_Score"] >= 3:
+        return "At Risk"
+    return "Hibernating"
+
+
+def test_vectorized_segments_match_row_wise_rules():
+    # Every combination of 1-5 scores
+    r, f, m = np.meshgrid(*[np.arange(1, 6)] * 3, indexing="ij")
+    rfm = pd.DataFrame({"R_Score": r.ravel(), "F_Score": f.ravel(), "M_Score": m.ravel()})
+    scored = rfm_engine._add_segments(rfm.copy(), rfm_engine.SEGMENT_RULES)
+
+    expected_code = rfm[["R_Score", "F_Score", "M_Score"]].astype(str).agg("".join, axis=1).astype(int)
+    assert (scored["RFM_Segment"] == expected_code).all()
+    assert (scored["Segment"] == scored.apply(_segment_row, axis=1)).all()
+
+
+def test_saved_state_only_folds_orders_appended_to_the_same_file(workdir, monkeypatch):
+    monkeypatch.setattr(storage, "MMAP_CACHE", False)
+    orders = _orders()
+
+    def write(frame):
+        storage.write_table(frame.assign(product_id=1, quantity=1), "orders", "clean")
+
+    def saved_state(first):
+        write(orders.iloc[:first])
+        state = RFMState.from_orders(orders.iloc[:first])
+        rows, digests = loader.row_digests("orders", "clean", columns=rfm_engine.ORDER_COLUMNS)
+        state.source_digest = digests[rows]
+        state.save("rfm_state.npz")
+        return RFMState.load("rfm_state.npz")
+
+    state = saved_state(2000)
+    write(orders)
+    assert state.fold_appended("clean") == 1000
+    pd.testing.assert_frame_equal(state.table(), RFMState.from_orders(orders).table())
+    assert state.fold_appended("clean") == 0
+
+    # Regenerated with the same row count, or with earlier rows changed and new ids appended
+    changed = orders.copy()
+    changed.loc[5, "total_amount"] += 1
+    for regenerated in (changed.iloc[:2000], changed):
+        state = saved_state(2000)
+        write(regenerated)
+        assert state.fold_appended("clean") is None
+        pd.testing.assert_frame_equal(state.table(), RFMState.from_orders(orders.iloc[:2000]).table())
@@ -0,0 +1,46 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import schema
+
+
+def _orders(amounts):
+    n = len(amounts)
+    return pd.DataFrame({
+        "order_id": np.arange(1, n + 1),
+        "customer_id": np.arange(1, n + 1),
+        "product_id": np.ones(n, dtype=int),
+        "order_date": ["2024-01-31"] * n,
+        "quantity": np.ones(n, dtype=int),
+        "total_amount": amounts,
+        "note": ["x"] * n,
+    })
+
+
+def test_apply_converts_to_the_compact_dtypes_and_widen_restores_the_cents():
+    rng = np.random.default_rng(0)
+    amounts = np.round(rng.uniform(0, schema.FLOAT32_CENT_EXACT - 1, 10_000), 2)
+    orders = schema.apply(_orders(amounts), "orders")
+
+    assert orders.dtypes.astype(str).to_dict() == {
+        "order_id": "int64", "customer_id": "int32", "product_id": "int32", "order_date": "datetime64[s]",
+        "quantity": "uint8", "total_amount": "float32", "note": "object",
+    }
+    widened = schema.widen(orders, "orders")["total_amount"]
+    assert widened.dtype == "float64"
+    assert np.array_equal(widened.to_numpy(), amounts)
+    assert round(widened.sum(), 2) == round(amounts.sum(), 2)
+
+
+def test_apply_keeps_float64_for_amounts_float32_cannot_hold_to_the_cent():
+    orders = schema.apply(_orders([12.34, schema.FLOAT32_CENT_EXACT + 0.01]), "orders")
+    assert orders["total_amount"].dtype == "float64"
+    assert orders["total_amount"].iloc[1] == schema.FLOAT32_CENT_EXACT + 0.01
+
+
+def test_apply_rejects_ids_outside_their_dtype():
+    orders = _orders([1.0])
+    orders["customer_id"] = 2 ** 31
+    with pytest.raises(ValueError, match="customer_id"):
+        schema.apply(orders, "orders")
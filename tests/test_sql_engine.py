@@ -0,0 +1,42 @@
+import pandas as pd
+
+import sql_engine
+import storage
+
+
+QUERIES = {
+    "monthly_aov": """
+        SELECT DATE_TRUNC('month', order_date) AS month, AVG(total_amount) AS avg_order_value
+        FROM orders
+        GROUP BY month
+        ORDER BY month;
+    """,
+    "repeat_rate": """
+        SELECT SUM(CASE WHEN n > 1 THEN 1 ELSE 0 END) / COUNT(*) AS repeat_rate
+        FROM (SELECT customer_id, COUNT(*) AS n FROM orders GROUP BY customer_id) t;
+    """,
+}
+
+
+def test_sql_answers_match_the_pandas_answers(raw_data, monkeypatch):
+    monkeypatch.setattr(storage, "MMAP_CACHE", False)
+    answers = {
+        "monthly_aov": lambda t: t["orders"]["total_amount"].groupby(t["orders"]["order_date"].dt.strftime("%Y-%m")).mean(),
+        "repeat_rate": lambda t: float((t["orders"]["customer_id"].value_counts() > 1).mean()),
+    }
+
+    conn = sql_engine.load_sqlite("raw")
+    indexes = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    assert "idx_orders_customer_id" in indexes
+
+    report = sql_engine.benchmark(QUERIES, answers, conn=conn)
+    assert report["match"].all()
+    assert report.attrs["pandas_load_seconds"] > 0
+    assert set(report["faster"]) <= {"sql", "pandas"}
+
+
+def test_results_match_rejects_different_answers():
+    sql_result = pd.DataFrame({"month": ["2024-01", "2024-02"], "value": [1.0, 2.0]})
+    assert sql_engine.results_match(sql_result, pd.Series([1.0, 2.0], index=["2024-01", "2024-02"]))
+    assert not sql_engine.results_match(sql_result, pd.Series([1.0, 2.5], index=["2024-01", "2024-02"]))
+    assert not sql_engine.results_match(sql_result, pd.Series([1.0, 2.0], index=["2024-01", "2024-03"]))
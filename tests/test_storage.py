@@ -0,0 +1,76 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import schema
+import storage
+
+
+@pytest.fixture
+def orders():
+    n = 500
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({
+        "order_id": np.arange(1, n + 1),
+        "customer_id": rng.integers(1, 50, size=n),
+        "product_id": rng.integers(1, 30, size=n),
+        "order_date": pd.Timestamp("2024-01-01") + pd.to_timedelta(rng.integers(0, 365, size=n), unit="D"),
+        "quantity": rng.integers(1, 6, size=n),
+        "total_amount": np.round(rng.uniform(5, 5000, size=n), 2),
+    })
+
+
+def test_parquet_round_trip_with_projection_filters_and_csv_fallback(workdir, orders, monkeypatch):
+    monkeypatch.setattr(storage, "MMAP_CACHE", False)
+    storage.write_table(orders, "orders", "raw")
+
+    read = storage.read_table("orders", "raw", columns=["order_id", "total_amount"],
+                              filters=[("order_id", ">", 400)])
+    assert list(read.columns) == ["order_id", "total_amount"]
+    assert read["order_id"].dtype == np.int64 and read["total_amount"].dtype == np.float32
+    assert (read["order_id"].to_numpy() == np.arange(401, 501)).all()
+    assert np.allclose(read["total_amount"].astype("float64").round(2), orders["total_amount"][400:])
+
+    parquet = storage.read_table("orders", "raw")
+    assert parquet["customer_id"].dtype == np.int32 and parquet["quantity"].dtype == np.uint8
+    storage.export_csv("orders", "raw")
+    os.remove(storage.table_path("orders", "raw"))
+    assert storage.source_path("orders", "raw").endswith(".csv")
+    # CSV files have no statistics to narrow the amounts with
+    csv = storage.read_table("orders", "raw")
+    assert csv["total_amount"].dtype == np.float64
+    pd.testing.assert_frame_equal(csv, schema.widen(parquet, "orders"))
+
+
+def test_parallel_csv_ranges_parse_to_the_same_rows_as_read_csv(workdir, orders, monkeypatch):
+    monkeypatch.setattr(storage, "MMAP_CACHE", False)
+    storage.write_table(orders, "orders", "raw")
+    storage.export_csv("orders", "raw")
+    path = storage.table_path("orders", "raw", fmt="csv")
+
+    expected = pd.read_csv(path, parse_dates=["order_date"])
+    parallel = storage.read_csv_parallel(path, "orders", workers=4)
+    assert len(storage.csv_ranges(path, 4)[1]) > 1
+    assert list(parallel.columns) == list(expected.columns)
+    for name in expected.columns:
+        assert np.array_equal(parallel[name].to_numpy(dtype=expected[name].dtype), expected[name].to_numpy()), name
+
+    os.remove(storage.table_path("orders", "raw"))
+    tables = storage.read_tables(["orders"], "raw", columns={"orders": ["order_id", "quantity"]})
+    assert list(tables["orders"].columns) == ["order_id", "quantity"]
+    assert (tables["orders"]["order_id"].to_numpy() == expected["order_id"].to_numpy()).all()
+
+
+def test_every_chunk_gets_the_money_dtype_of_the_whole_file(workdir, orders, monkeypatch):
+    monkeypatch.setattr(storage, "MMAP_CACHE", False)
+    orders.loc[499, "total_amount"] = 2 ** 17 + 0.01
+    storage.write_table(orders, "orders", "raw")
+
+    assert storage.money_dtypes(storage.table_path("orders", "raw"), "orders") == {"total_amount": "float64"}
+    chunks = list(storage.iter_table("orders", "raw", batch_size=100))
+    assert all(chunk["total_amount"].dtype == np.float64 for chunk in chunks)
+    small = storage.read_table("orders", "raw", filters=[("order_id", "<", 100)])
+    assert small["total_amount"].dtype == np.float64
+    assert pd.concat(chunks)["total_amount"].iloc[-1] == 2 ** 17 + 0.01
@@ -0,0 +1,44 @@
+import io
+import json
+import time
+
+import numpy as np
+import pandas as pd
+
+from timeline import HOURLY, Seasonality, pace, write_ndjson
+
+
+def test_sampled_timestamps_follow_the_daily_and_hourly_intensity():
+    season = Seasonality()
+    rng = np.random.default_rng(0)
+    n = 400_000
+    stamps = season.sample(n, rng, "2024-01-01", "2024-12-31", today="2024-12-31")
+    assert stamps.dtype == np.dtype("datetime64[s]")
+
+    days = np.arange(np.datetime64("2024-01-01"), np.datetime64("2025-01-01"))
+    expected = season.intensity(days, today="2024-12-31")
+    expected = expected / expected.sum()
+    observed = np.bincount((stamps.astype("datetime64[D]") - days[0]).astype(np.int64), minlength=len(days)) / n
+    assert np.abs(observed - expected).max() < 5 * np.sqrt(expected.max() / n)
+
+    # The busiest day is around Black Friday, and the year grows towards its end
+    assert np.datetime64("2024-11-25") <= days[observed.argmax()] <= np.datetime64("2024-12-02")
+    assert observed[-60:].mean() > observed[:60].mean()
+
+    hours = pd.DatetimeIndex(stamps).hour
+    hourly = np.asarray(HOURLY) / sum(HOURLY)
+    assert np.abs(np.bincount(hours, minlength=24) / n - hourly).max() < 0.005
+
+
+def test_write_ndjson_paces_events_at_the_requested_rate():
+    frames = [pd.DataFrame({"order_id": [1, 2], "order_date": pd.to_datetime(["2024-01-01", "2024-01-02"])}),
+              pd.DataFrame({"order_id": [3, 4, 5], "order_date": pd.to_datetime(["2024-01-03"] * 3)})]
+    out = io.StringIO()
+    start = time.perf_counter()
+    assert write_ndjson(frames, out, rate=100, limit=4) == 4
+    assert time.perf_counter() - start >= 0.025
+
+    records = [json.loads(line) for line in out.getvalue().splitlines()]
+    assert [r["order_id"] for r in records] == [1, 2, 3, 4]
+    assert records[0]["order_date"].startswith("2024-01-01")
+    assert list(pace(range(5))) == list(range(5))
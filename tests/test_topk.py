@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+
+from topk import CountMinSketch, SpaceSaving, top_k_by
+
+
+def _stream(n=200_000, seed=0):
+    rng = np.random.default_rng(seed)
+    keys = rng.zipf(1.3, n) % 50_000
+    weights = rng.integers(1, 10_000, n)
+    return keys, weights
+
+
+def test_top_k_by_matches_groupby():
+    keys, weights = _stream(20_000)
+    expected = pd.Series(weights).groupby(keys).sum().sort_values(ascending=False, kind="stable").head(10)
+    top = top_k_by(keys, weights.astype(float), 10)
+    assert top.index.tolist() == expected.index.tolist()
+    assert np.allclose(top.to_numpy(), expected.to_numpy())
+
+
+def test_merged_space_saving_and_count_min_stay_within_their_error_bounds():
+    keys, weights = _stream()
+    truth = pd.Series(weights).groupby(keys).sum()
+    shards = np.array_split(np.arange(len(keys)), 4)
+
+    summary, sketch = SpaceSaving(eps=1e-3), CountMinSketch(eps=1e-3, delta=0.01)
+    for i, shard in enumerate(shards):
+        part_summary, part_sketch = SpaceSaving(eps=1e-3), CountMinSketch(eps=1e-3, delta=0.01)
+        for chunk in np.array_split(shard, 5):
+            part_summary.update(keys[chunk], weights[chunk])
+            part_sketch.update(keys[chunk], weights[chunk])
+        summary, sketch = (part_summary, part_sketch) if i == 0 else (summary.merge(part_summary),
+                                                                       sketch.merge(part_sketch))
+
+    total = weights.sum()
+    assert summary.total == total and sketch.total == total
+    assert len(summary.counts) <= summary.capacity
+    assert summary.error <= total / (summary.capacity + 1)
+
+    # Counters never exceed the true weight and fall short by at most `error`
+    tracked = truth.reindex(summary.keys).to_numpy()
+    assert (summary.counts <= tracked).all() and (tracked - summary.counts <= summary.error).all()
+    top = summary.top(10)
+    exact = truth.reindex(top.index).to_numpy()
+    assert ((top["lower"] <= exact) & (exact <= top["upper"])).all()
+    assert set(top.index[top["guaranteed"]]) <= set(truth.nlargest(10).index)
+
+    # Count-Min never undercounts; overcounts beyond eps * total for at most a delta share of keys
+    over = sketch.estimate(truth.index.to_numpy()) - truth.to_numpy()
+    assert (over >= 0).all()
+    assert (over > sketch.eps * total).mean() <= sketch.delta
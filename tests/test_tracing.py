@@ -0,0 +1,58 @@
+import json
+import os
+import subprocess
+import sys
+
+import tracing
+
+ANSWERS = os.path.dirname(os.path.abspath(tracing.__file__))
+
+SCRIPT = """
+import numpy as np
+from tracing import span, traced
+
+@traced()
+def build(n):
+    return np.zeros(n)
+
+with span("outer") as s:
+    build(7)
+    s.set(rows=3)
+"""
+
+
+def test_enabled_tracing_writes_nested_chrome_trace_events(workdir):
+    (workdir / "job.py").write_text(SCRIPT)
+    env = dict(os.environ, ECMM_TRACE=str(workdir / "traces"), PYTHONPATH=ANSWERS)
+    subprocess.run([sys.executable, "job.py"], env=env, check=True)
+
+    [trace] = os.listdir(workdir / "traces")
+    assert trace.startswith("job-") and trace.endswith(".json")
+    with open(workdir / "traces" / trace) as f:
+        events = {e["name"]: e for e in json.load(f)["traceEvents"] if e["ph"] == "X"}
+
+    outer, inner = events["outer"], events["__main__.build"]
+    assert outer["args"]["rows"] == 3 and inner["args"]["rows"] == 7
+    assert outer["ts"] <= inner["ts"] and inner["ts"] + inner["dur"] <= outer["ts"] + outer["dur"]
+
+
+def test_disabled_tracing_is_a_no_op(monkeypatch):
+    monkeypatch.setattr(tracing, "ENABLED", False)
+
+    def fn():
+        return 1
+
+    assert tracing.traced()(fn) is fn
+    assert tracing.span("anything", rows=5) is tracing.NULL_SPAN
+
+
+def test_merge_combines_trace_files(workdir):
+    paths = []
+    for pid in (1, 2):
+        path = str(workdir / f"t{pid}.json")
+        with open(path, "w") as f:
+            json.dump({"traceEvents": [{"name": "s", "ph": "X", "ts": 0, "dur": 1, "pid": pid}]}, f)
+        paths.append(path)
+    out = tracing.merge(paths + [str(workdir / "missing.json")], str(workdir / "all" / "merged.json"))
+    with open(out) as f:
+        assert sorted(e["pid"] for e in json.load(f)["traceEvents"]) == [1, 2]
@@ -0,0 +1,40 @@
+import numpy as np
+import pandas as pd
+
+import storage
+from validation import validate_table
+
+
+def _chunks(df, n=3):
+    bounds = np.linspace(0, len(df), n + 1).astype(int)
+    return [df.iloc[start:end] for start, end in zip(bounds[:-1], bounds[1:])]
+
+
+def test_generated_data_passes_and_injected_violations_are_counted(raw_data, monkeypatch):
+    monkeypatch.setattr(storage, "MMAP_CACHE", False)
+    parents = {name: storage.read_table(name, "raw") for name in ("customers", "products")}
+    orders = storage.read_table("orders", "raw")
+    assert validate_table(_chunks(orders), "orders", parents).ok
+
+    bad = orders.copy()
+    bad["customer_id"] = bad["customer_id"].astype("int64")
+    bad["total_amount"] = bad["total_amount"].astype("float64")
+    bad.loc[10, "order_id"] = bad.loc[1400, "order_id"]              # duplicate across chunks
+    bad.loc[[20, 21], "customer_id"] = parents["customers"]["customer_id"].max() + 1
+    bad.loc[30, "total_amount"] += 0.01
+    bad.loc[40, "order_date"] = pd.Timestamp.today() + pd.Timedelta(days=30)
+
+    validator = validate_table(_chunks(bad), "orders", parents)
+    counts = validator.summary().set_index(["rule", "column"])["violations"]
+    assert counts[("unique", "order_id")] == 1
+    assert counts[("foreign_key", "customer_id")] == 2
+    assert counts[("amount", "total_amount")] == 1
+    assert counts[("above_max", "order_date")] == 1
+    assert counts.sum() == 5
+    assert validator.sample_rows("foreign_key", "customer_id").index.tolist() == [20, 21]
+
+
+def test_missing_columns_fail_validation():
+    validator = validate_table(pd.DataFrame({"customer_id": [1, 2]}), "customers")
+    assert not validator.ok
+    assert "name" in validator.missing_columns